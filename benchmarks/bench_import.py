@@ -0,0 +1,58 @@
+"""Measures the cold import time of brfinance in fresh interpreters and fails
+when it exceeds a budget or when a heavy dependency is loaded at import.
+
+    python benchmarks/bench_import.py [--module brfinance.backend] [--max-ms 400]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Loaded on first use only, never by `import brfinance`
+LAZY_MODULES = ("pandas", "numpy", "lxml.etree", "aiohttp", "bs4")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def import_once(module):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(module=module, lazy=LAZY_MODULES)],
+        check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="brfinance")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=400)
+    args = parser.parse_args(argv)
+
+    runs = [import_once(args.module) for _ in range(args.repeat)]
+    elapsed = statistics.median(run["elapsed"] for run in runs) * 1000
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+
+    print(f"import {args.module}: {elapsed:.1f} ms (median of {args.repeat}, budget {args.max_ms:.0f} ms)")
+    failures = []
+    if elapsed > args.max_ms:
+        failures.append(f"import took {elapsed:.1f} ms")
+    if loaded:
+        failures.append(f"loaded at import: {', '.join(loaded)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
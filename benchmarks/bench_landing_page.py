@@ -0,0 +1,70 @@
+"""Compares the single pass FRE landing page extractor with the previous
+BeautifulSoup implementation of BaseCVMHttpClient._report_urls.
+
+    python benchmarks/bench_landing_page.py [padding_kb]
+"""
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from synthetic import landing_page
+from brfinance.http_client import BaseCVMHttpClient
+from brfinance.utils import extract_substring
+
+
+def beautifulsoup_report_urls(html, reports_list=None):
+    # BaseCVMHttpClient._report_urls before parsers.parse_report_landing
+    soup = BeautifulSoup(html, features="lxml")
+    hdnNumeroSequencialDocumento = soup.find(
+        id='hdnNumeroSequencialDocumento').attrs["value"]
+    hdnCodigoTipoDocumento = soup.find(
+        id='hdnCodigoTipoDocumento').attrs["value"]
+    hdnCodigoInstituicao = soup.find(
+        id='hdnCodigoInstituicao').attrs["value"]
+    hdnHash = soup.find(id='hdnHash').attrs["value"]
+
+    NumeroSequencialRegistroCvm = extract_substring(
+        "NumeroSequencialRegistroCvm=", "&", html)
+
+    end_of_report_url = f"&CodTipoDocumento={hdnCodigoTipoDocumento}&NumeroSequencialDocumento={hdnNumeroSequencialDocumento}&NumeroSequencialRegistroCvm={NumeroSequencialRegistroCvm}&CodigoTipoInstituicao={hdnCodigoInstituicao}&Hash={hdnHash}"
+
+    opt = str(BeautifulSoup(html,
+              features="lxml").find(id='cmbQuadro'))
+    reports_options = BeautifulSoup(opt, features="lxml")
+    reports_options = reports_options.find_all('option')
+
+    if (reports_list is None):
+        reports_list = [item.getText() for item in reports_options]
+
+    report_urls = {}
+    for item in reports_options:
+        if (item.getText() in reports_list):
+            report_urls[item.getText()] = BaseCVMHttpClient.ENETCONSULTA_URL + \
+                item.attrs["value"] + end_of_report_url
+
+    return report_urls
+
+
+def padded_landing_page(padding_kb):
+    # Real landing pages carry tens of KB of menus and scripts around the form
+    filler = "<div class='menu'><a href='#'>Item do menu</a></div>\n" * (padding_kb * 20)
+    return landing_page().replace("<body>", f"<body>{filler}", 1).replace(
+        "</body>", f"{filler}</body>", 1)
+
+
+def main(padding_kb=60, number=200):
+    html = padded_landing_page(padding_kb)
+    client = BaseCVMHttpClient()
+    assert beautifulsoup_report_urls(html) == client._report_urls(html)
+
+    print(f"{len(html) / 1024:.0f} KB landing page, mean of {number} runs")
+    for name, parser in [
+            ("BeautifulSoup", beautifulsoup_report_urls),
+            ("single pass", client._parse_report_urls)]:
+        elapsed = timeit.timeit(lambda: parser(html), number=number) / number
+        print(f"{name:>14}: {elapsed * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
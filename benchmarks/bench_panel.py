@@ -0,0 +1,54 @@
+"""Compares building a multi-company table by concatenating the report frames
+of every document with the FinancialPanel long format table.
+
+    python benchmarks/bench_panel.py [documents] [rows_per_statement]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from synthetic import STATEMENT_CODES, STATEMENTS, statement_page
+from brfinance.panel import FinancialPanel
+from brfinance.parsers import DMPL_STATEMENT, parse_statement_html
+
+REF_DATES = ["2021-03-31", "2021-06-30", "2021-09-30", "2021-12-31"]
+
+
+def concat_frames(reports, documents):
+    # What callers did before the panel: one small object frame per statement
+    frames = []
+    for document in range(documents):
+        for statement, df in reports.items():
+            frames.append(df.assign(
+                cod_cvm=str(document // len(REF_DATES)).zfill(6),
+                ref_date=pd.Timestamp(REF_DATES[document % len(REF_DATES)]),
+                statement=statement))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_panel(reports, documents):
+    panel = FinancialPanel()
+    for document in range(documents):
+        panel.add_document(
+            reports, document // len(REF_DATES), REF_DATES[document % len(REF_DATES)], document)
+    return panel.data()
+
+
+def main(documents=2000, rows=100):
+    reports = {
+        statement: parse_statement_html(statement_page(statement, rows, code), statement)
+        for statement, code in zip(STATEMENTS, STATEMENT_CODES)
+        if statement != DMPL_STATEMENT}
+
+    print(f"{documents} documents, {len(reports)} statements of {rows} rows")
+    for name, build in [("concat", concat_frames), ("panel", build_panel)]:
+        started = time.perf_counter()
+        frame = build(reports, documents)
+        elapsed = time.perf_counter() - started
+        memory = frame.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f"{name:>7}: {elapsed:7.2f} s {memory:8.1f} MB {len(frame):>10} rows")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
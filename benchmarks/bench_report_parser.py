@@ -0,0 +1,77 @@
+"""Compares the lxml statement parser with the previous pd.read_html path.
+
+    python benchmarks/bench_report_parser.py [rows]
+"""
+import io
+import sys
+import timeit
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from synthetic import STATEMENTS, statement_page
+from brfinance.parsers import parse_statement_html
+
+
+def read_html_parser(html, statement, previous_results=False):
+    # Parser used by GetReportResponse before brfinance.parsers, except for
+    # the thousands separator: it used str.replace(".", "", regex=True),
+    # which removes every character and turned all values into NaN. With
+    # regex=False the two parsers can be compared.
+    soup = BeautifulSoup(html, features="lxml")
+    currency_unit = soup.find(id='TituloTabelaSemBorda').getText()
+
+    index_moeda = -1
+    if statement == "Demonstração do Fluxo de Caixa":
+        index_moeda = -2
+
+    currency_unit = currency_unit.split(
+        " - ")[index_moeda].replace("(", "").replace(")", "")
+
+    table_index = 0
+    if statement == "Demonstração das Mutações do Patrimônio Líquido":
+        table_index = 1
+
+    df = pd.read_html(io.StringIO(html), header=0, decimal=',')[table_index]
+    converters = {c: lambda x: str(x) for c in df.columns}
+    df = pd.read_html(io.StringIO(html), header=0, decimal=',',
+                      converters=converters)[table_index]
+
+    for column in df.columns:
+        if column.strip() != "Conta" and column.strip() != "Descrição":
+            df[column] = df[column].astype(
+                str).str.strip().str.replace(".", "", regex=False)
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        else:
+            df[column] = df[column].astype(str).str.strip().astype(str)
+
+    if statement != "Demonstração das Mutações do Patrimônio Líquido":
+        if not previous_results:
+            df = df.iloc[:, 0:3]
+            df = df.set_axis([*df.columns[:-1], 'Valor'], axis=1)
+
+    df["currency_unit"] = currency_unit
+
+    return df
+
+
+def main(rows=200, repeat=5):
+    pages = [(statement, statement_page(statement, rows=rows, seed=seed))
+             for seed, statement in enumerate(STATEMENTS)]
+
+    for statement, html in pages:
+        pd.testing.assert_frame_equal(
+            read_html_parser(html, statement),
+            parse_statement_html(html, statement),
+            check_dtype=False)
+
+    print(f"{len(pages)} statements x {rows} rows, best of {repeat}")
+    for name, parser in [("pd.read_html", read_html_parser), ("lxml", parse_statement_html)]:
+        elapsed = min(timeit.repeat(
+            lambda: [parser(html, statement) for statement, html in pages],
+            number=1, repeat=repeat))
+        print(f"{name:>14}: {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
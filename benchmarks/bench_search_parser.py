@@ -0,0 +1,95 @@
+"""Compares the single pass ListarDocumentos parser with the previous
+str.extract based implementation.
+
+    python benchmarks/bench_search_parser.py [records]
+"""
+import sys
+import timeit
+
+import pandas as pd
+
+from synthetic import search_payload
+from brfinance.constants import ENET_URL
+from brfinance.responses import GetSearchResponse
+
+
+def str_extract_parser(reponse_json):
+    # Parser used by GetSearchResponse before the single pass rewrite, with
+    # DataFrame.append replaced by pd.concat so it runs on pandas 2.
+    columns = ['cod_cvm', 'empresa', 'categoria', 'tipo', 'especie', 'ref_date',
+               'data_entrega', 'status', 'version', 'modalidade', "acoes", "outros"]
+    addtional_columns = ['view_url',
+                         'numero_seq_documento', 'codigo_tipo_instituicao']
+
+    download_columns = ["numSequencia",
+                        "numVersao", "numProtocolo", "descTipo"]
+
+    response_df = pd.DataFrame(
+        columns=columns+addtional_columns+download_columns)
+
+    dados = reponse_json["d"]["dados"]
+
+    if dados:
+        data = dados.replace("<spanOrder>", "")
+
+        search_results_df = pd.DataFrame(
+            [x.split('$&') for x in data.split('$&&*')], columns=columns).iloc[:, :11]
+
+        search_results_df = search_results_df[pd.notnull(
+            search_results_df['acoes'])]
+
+        if not search_results_df.empty:
+            search_results_df.loc[
+                search_results_df['acoes'].str.contains(r"OpenPopUpVer\('"),
+                'view_url'] = ENET_URL + search_results_df['acoes'].str.extract(r'OpenPopUpVer\(\'(.*?)\'\)', expand=False)
+
+            search_results_df[download_columns] = search_results_df['acoes'].str.extract(
+                r'OpenDownloadDocumentos\(\'(.*?)\'\)', expand=False).str.replace("'", "", regex=True).str.split(",", expand=True)
+
+            search_results_df.loc[
+                search_results_df['acoes'].str.contains(r"OpenPopUpVer\('"),
+                'numero_seq_documento'] = search_results_df['acoes'].str.extract(r'NumeroSequencialDocumento\=(.*?)\&', expand=False)
+
+            search_results_df.loc[
+                search_results_df['acoes'].str.contains(r"OpenPopUpVer\('"),
+                'codigo_tipo_instituicao'] = search_results_df['acoes'].str.extract(r"CodigoTipoInstituicao\=(.*?)\'\)", expand=False)
+
+            new = search_results_df['data_entrega'].str.split(
+                "</spanOrder>", n=-1, expand=True)
+            search_results_df['data_entrega'] = pd.to_datetime(
+                new[1].str.strip(), format="%d/%m/%Y %H:%M")
+
+            new = search_results_df['ref_date'].str.split(
+                "</spanOrder>", n=-1, expand=True)
+            search_results_df['ref_date'] = pd.to_datetime(
+                new[0].str.strip(), format="%Y%m%d")
+
+            search_results_df['cod_cvm'] = search_results_df['cod_cvm'].str.replace(
+                r'\D+', '', regex=True)
+
+            search_results_df = search_results_df.replace(
+                {'</spanOrder>': ''}, regex=True).sort_values('data_entrega', ascending=False)
+
+            response_df = pd.concat([response_df, search_results_df])
+
+    return response_df
+
+
+def main(records=50000, repeat=3):
+    payload = search_payload(records)
+
+    pd.testing.assert_frame_equal(
+        str_extract_parser(payload),
+        GetSearchResponse(None)._parse_get_search(payload),
+        check_dtype=False)
+
+    print(f"{records} records, best of {repeat}")
+    for name, parser in [
+            ("str.extract", str_extract_parser),
+            ("single pass", GetSearchResponse(None)._parse_get_search)]:
+        elapsed = min(timeit.repeat(lambda: parser(payload), number=1, repeat=repeat))
+        print(f"{name:>12}: {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
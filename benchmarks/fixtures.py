@@ -0,0 +1,64 @@
+"""Response fixtures for the offline benchmarks.
+
+Recorded responses are read from benchmarks/fixtures/ (see
+record_fixtures.py). Missing fixtures, and every scale above 1, are
+generated by synthetic.py with the same shape as the real pages.
+
+No recorded responses are committed: record_fixtures.py needs access to
+the CVM and B3 sites, so until it is run every benchmark is synthetic.
+"""
+import json
+import os
+
+import synthetic
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+FIXTURE_FILES = {
+    "search": "search.json",
+    "report_landing": "report_landing.html",
+    "consulta_externa": "consulta_externa.html",
+    "cadastro_instrumentos": "cadastro_instrumentos.csv",
+    "emissor": "emissor.zip",
+    "pesquisa_cia_aberta": "pesquisa_cia_aberta.html",
+    "document_package": "document_package.zip",
+    **{f"statement_{index}": f"statement_{index}.html"
+       for index in range(len(synthetic.STATEMENTS))},
+}
+
+# Size of each synthetic fixture at scale 1, close to a typical response
+SYNTHETIC = {
+    "search": lambda scale: json.dumps(
+        synthetic.search_payload(1000 * scale)).encode("utf-8"),
+    "report_landing": lambda scale: synthetic.landing_page().encode("utf-8"),
+    "consulta_externa": lambda scale: synthetic.consulta_externa_page(2000 * scale).encode("utf-8"),
+    "cadastro_instrumentos": lambda scale: synthetic.instruments_csv(10_000 * scale),
+    "emissor": lambda scale: synthetic.emissor_zip(5000 * scale),
+    "pesquisa_cia_aberta": lambda scale: synthetic.pesquisa_cia_aberta_page(2000 * scale).encode("utf-8"),
+    # Same accounts and values as the synthetic statement pages
+    "document_package": lambda scale: synthetic.document_package(
+        rows=100 * scale, seeds=[0] * len(synthetic.STATEMENTS)),
+    **{f"statement_{index}": (lambda scale, statement=statement:
+                              synthetic.statement_page(statement, 100 * scale).encode("utf-8"))
+       for index, statement in enumerate(synthetic.STATEMENTS)},
+}
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIR, FIXTURE_FILES[name])
+
+
+def load_fixture(name, scale=1):
+    """Returns (content, source), source being "recorded" or "synthetic"."""
+    path = fixture_path(name)
+    if scale == 1 and os.path.exists(path):
+        with open(path, "rb") as fixture_file:
+            return fixture_file.read(), "recorded"
+
+    return SYNTHETIC[name](scale), "synthetic"
+
+
+def save_fixture(name, content):
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(fixture_path(name), "wb") as fixture_file:
+        fixture_file.write(content)
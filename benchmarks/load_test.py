@@ -0,0 +1,132 @@
+"""Load test of the sync and async clients against the mock CVM server.
+Downloads every statement of `--documents` documents and reports the
+requests per second, the latency percentiles and the status of every
+request.
+
+    python benchmarks/load_test.py --documents 200 --latency 0.02 --error-rate 0.01
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --mode async
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from collections import Counter
+
+from mock_server import MockConfig, MockServer
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class RequestRecorder():
+    """Metrics hook keeping every request duration and status."""
+
+    def __init__(self) -> None:
+        self.durations = []
+        self.statuses = Counter()
+        self.retries = 0
+
+    def __call__(self, kind, name, value, labels):
+        if name == "http_request_duration_seconds":
+            self.durations.append(value)
+            self.statuses[labels["status"]] += 1
+        elif name == "http_retries_total":
+            self.retries += value
+
+
+def run_sync(backend, documents, workers):
+    results = backend.get_reports_bulk(documents, max_workers=workers)
+    return sum(result.ok for result in results)
+
+
+def run_async(backend, documents):
+    async def download():
+        async with backend:
+            return sum([result.ok async for result in backend.get_reports_bulk_async(documents)])
+
+    return asyncio.run(download())
+
+
+def report(mode, elapsed, documents, succeeded, recorder):
+    requests = len(recorder.durations)
+    print(f"\n{mode}: {succeeded}/{documents} documents in {elapsed:.2f} s")
+    print(f"  {requests} requests, {requests / elapsed:,.1f} requests/s, {recorder.retries} retries")
+    print("  latency ms:" + "".join(
+        f" p{int(fraction * 100)} {percentile(recorder.durations, fraction) * 1000:.1f}"
+        for fraction in (0.5, 0.9, 0.99)) + f" max {max(recorder.durations, default=0) * 1000:.1f}")
+    print("  statuses: " + ", ".join(f"{status} {count}" for status, count in sorted(recorder.statuses.items())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="a mock server already running, one is started otherwise")
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=16, help="sync threads and pool size")
+    parser.add_argument("--concurrency", type=int, default=20, help="async requests in flight")
+    parser.add_argument("--attempts", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, help="server side requests per second before 429")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url is None:
+        server = MockServer(MockConfig(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            rate=args.rate)).start()
+
+    # brfinance reads its base URLs when imported
+    os.environ["BRFINANCE_BASE_URL"] = args.url or server.url
+    from brfinance.backend import CVMAsyncBackend
+    from brfinance.connector import CVMHttpClientConnector
+    from brfinance.metrics import METRICS
+    from brfinance.retry import CircuitBreaker, RetryPolicy
+    from brfinance.throttling import HostLimits
+
+    # Retries are counted in the report instead of logged one by one
+    logging.getLogger("brfinance").setLevel(logging.ERROR)
+
+    documents = [(str(100000 + document), "1") for document in range(args.documents)]
+    modes = ["sync", "async"] if args.mode == "both" else [args.mode]
+    try:
+        for mode in modes:
+            connector = CVMHttpClientConnector(
+                default_limits=HostLimits(), pool_maxsize=args.workers)
+            backend = CVMAsyncBackend(
+                max_concurrency=args.concurrency,
+                limit_per_host=args.concurrency,
+                report_workers=args.workers,
+                retry_policy=RetryPolicy(max_attempts=args.attempts, backoff_factor=0.1),
+                # The load test measures the retries, not the circuit breaker
+                circuit_breaker=CircuitBreaker(failure_threshold=sys.maxsize),
+                connector=connector)
+
+            recorder = RequestRecorder()
+            METRICS.add_hook(recorder)
+            start = time.perf_counter()
+            try:
+                if mode == "sync":
+                    succeeded = run_sync(backend, documents, args.workers)
+                else:
+                    succeeded = run_async(backend, documents)
+            finally:
+                METRICS.remove_hook(recorder)
+                connector.close()
+
+            report(mode, time.perf_counter() - start, len(documents), succeeded, recorder)
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
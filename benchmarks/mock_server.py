@@ -0,0 +1,282 @@
+"""Local stand-in for the CVM and B3 endpoints used by brfinance, serving
+synthetic pages with configurable latency, errors and throttling.
+
+    python benchmarks/mock_server.py --port 8080 --latency 0.05 --error-rate 0.01 --rate 200
+    BRFINANCE_BASE_URL=http://127.0.0.1:8080 python my_script.py
+
+Every base URL in brfinance.constants falls back to BRFINANCE_BASE_URL, so
+the library talks to the mock when the variable is set before import.
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import random
+import threading
+import time
+
+from collections import Counter
+
+from aiohttp import web
+
+import synthetic
+
+
+class MockConfig():
+    """`latency` seconds (plus up to `jitter`) are added to every response.
+    A fraction `error_rate` of the requests fail with `error_status`, and
+    above `rate` requests per second (bursts of `burst`) the server answers
+    429 with a Retry-After of `retry_after` seconds."""
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            rate: float = None,
+            burst: int = None,
+            retry_after: int = 1,
+            search_records: int = 100,
+            statement_rows: int = 100,
+            instruments_rows: int = 10_000,
+            emissor_rows: int = 5000,
+            companies: int = 2000,
+            seed: int = 0) -> None:
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate = rate
+        self.burst = burst or (max(1, int(rate)) if rate else None)
+        self.retry_after = retry_after
+        self.search_records = search_records
+        self.statement_rows = statement_rows
+        self.instruments_rows = instruments_rows
+        self.emissor_rows = emissor_rows
+        self.companies = companies
+        self.seed = seed
+
+
+class MockCVM():
+
+    def __init__(self, config: MockConfig = None) -> None:
+        self.config = config or MockConfig()
+        self.stats = Counter()
+        self._random = random.Random(self.config.seed)
+        self._tokens = self.config.burst
+        self._updated_at = time.monotonic()
+
+    def _throttled(self):
+        if self.config.rate is None:
+            return False
+
+        now = time.monotonic()
+        self._tokens = min(
+            self.config.burst, self._tokens + (now - self._updated_at) * self.config.rate)
+        self._updated_at = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if request.path == "/_stats":
+            return await handler(request)
+
+        self.stats["requests"] += 1
+        if self._throttled():
+            self.stats["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.config.retry_after)})
+
+        delay = self.config.latency + self._random.uniform(0, self.config.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self._random.random() < self.config.error_rate:
+            self.stats[str(self.config.error_status)] += 1
+            return web.Response(status=self.config.error_status)
+
+        response = await handler(request)
+        self.stats[str(response.status)] += 1
+        return response
+
+    @functools.lru_cache(maxsize=None)
+    def _page(self, name, *args):
+        # Pages are built once, so the server is never the bottleneck
+        if name == "search":
+            return json.dumps(synthetic.search_payload(*args)).encode("utf-8")
+        if name == "landing":
+            return synthetic.landing_page(*args).encode("utf-8")
+        if name == "statement":
+            return synthetic.statement_page(*args).encode("utf-8")
+        if name == "consulta_externa":
+            return synthetic.consulta_externa_page(*args).encode("utf-8")
+        if name == "instruments":
+            return synthetic.instruments_csv(*args)
+        if name == "emissor":
+            return synthetic.emissor_zip(*args)
+        if name == "package":
+            return synthetic.document_package(*args)
+        if name == "pesquisa":
+            return synthetic.pesquisa_cia_aberta_page(*args).encode("utf-8")
+        raise KeyError(name)
+
+    async def search(self, request):
+        await request.read()
+        return web.Response(
+            body=self._page("search", self.config.search_records, self.config.seed),
+            content_type="application/json", charset="utf-8")
+
+    async def document_package(self, request):
+        return web.Response(
+            body=self._page(
+                "package", request.query.get("numSequencia", "0"), self.config.statement_rows),
+            content_type="application/zip")
+
+    async def consulta_externa(self, request):
+        return web.Response(
+            body=self._page("consulta_externa", self.config.companies, self.config.seed),
+            content_type="text/html", charset="utf-8")
+
+    async def landing(self, request):
+        return web.Response(
+            body=self._page("landing", request.query.get("NumeroSequencialDocumento", "0")),
+            content_type="text/html", charset="utf-8")
+
+    async def statement(self, request):
+        code = int(request.query.get("Demonstracao", synthetic.STATEMENT_CODES[0]))
+        if code not in synthetic.STATEMENT_CODES:
+            raise web.HTTPNotFound()
+
+        statement = synthetic.STATEMENTS[synthetic.STATEMENT_CODES.index(code)]
+        return web.Response(
+            body=self._page("statement", statement, self.config.statement_rows, code),
+            content_type="text/html", charset="utf-8")
+
+    async def instruments_token(self, request):
+        return web.json_response({"token": f"{request.query.get('date', '')}-token"})
+
+    def _conditional(self, request, body, **kwargs):
+        # The reference files answer conditional requests, as B3 may
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        headers = {"ETag": etag, "Last-Modified": "Mon, 03 Jan 2022 08:00:00 GMT"}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, headers=headers, **kwargs)
+
+    async def instruments(self, request):
+        return self._conditional(
+            request, self._page("instruments", self.config.instruments_rows, self.config.seed),
+            content_type="text/csv", charset="latin-1")
+
+    async def emissor(self, request):
+        return self._conditional(
+            request, self._page("emissor", self.config.emissor_rows), content_type="application/zip")
+
+    async def pesquisa_cia_aberta(self, request):
+        return web.Response(
+            body=self._page("pesquisa", self.config.companies, self.config.seed),
+            content_type="text/html", charset="utf-8")
+
+    async def stats_view(self, request):
+        return web.json_response(dict(self.stats))
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_post("/ENET/frmConsultaExternaCVM.aspx/ListarDocumentos", self.search)
+        app.router.add_get("/ENET/frmConsultaExternaCVM.aspx", self.consulta_externa)
+        app.router.add_get("/ENET/frmDownloadDocumento.aspx", self.document_package)
+        app.router.add_get("/ENETCONSULTA/frmGerenciaPaginaFRE.aspx", self.landing)
+        app.router.add_get("/ENETCONSULTA/frmDemonstracaoFinanceiraITR.aspx", self.statement)
+        app.router.add_get("/ENETCONSULTA/frmDemonstracaoFinanceiraDFP.aspx", self.statement)
+        app.router.add_get("/api/download/requestname", self.instruments_token)
+        app.router.add_get("/api/download/", self.instruments)
+        app.router.add_get("/isinProxy/IsinCall/GetFileDownload/{file}", self.emissor)
+        app.router.add_get(
+            "/SWB/Sistemas/SCW/CPublica/CiaAb/ResultBuscaParticCiaAb.aspx", self.pesquisa_cia_aberta)
+        app.router.add_get("/_stats", self.stats_view)
+        return app
+
+
+class MockServer():
+    """Runs a MockCVM on a background thread, for scripts that drive the
+    client from the main thread:
+
+        with MockServer(MockConfig(latency=0.02)) as server:
+            os.environ["BRFINANCE_BASE_URL"] = server.url
+    """
+
+    def __init__(self, config: MockConfig = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.mock = MockCVM(config)
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def start(self):
+        started = threading.Event()
+
+        async def serve():
+            self._runner = web.AppRunner(self.mock.app(), access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            host, port = self._runner.addresses[0][:2]
+            self.url = f"http://{host}:{port}/"
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(serve())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate", type=float, help="requests per second before answering 429")
+    parser.add_argument("--burst", type=int)
+    parser.add_argument("--search-records", type=int, default=100)
+    parser.add_argument("--statement-rows", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, rate=args.rate, burst=args.burst,
+        search_records=args.search_records, statement_rows=args.statement_rows)
+    web.run_app(MockCVM(config).app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
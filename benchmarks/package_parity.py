@@ -0,0 +1,76 @@
+"""Checks that get_report_package returns the same statements as get_report,
+comparing the package fixture with the statement pages of the same document
+(recorded by record_fixtures.py, or synthetic when they are missing).
+
+    python benchmarks/package_parity.py
+"""
+import io
+import sys
+import zipfile
+
+import numpy as np
+
+from fixtures import load_fixture
+from synthetic import STATEMENTS
+from brfinance.parsers import DMPL_STATEMENT, parse_package_statements, parse_statement_html
+
+
+def _values(df):
+    return [column for column in df.columns
+            if column not in ("Conta", "Descrição", "currency_unit")]
+
+
+def compare_statement(statement, html, package, previous_results):
+    """Differences between the statement parsed from its page and from the
+    package. Value columns are compared by position, as the package names
+    them "Valor 1", "Valor 2", ... instead of the period headers."""
+
+    expected = parse_statement_html(html, statement, previous_results)
+    if statement not in package:
+        return ["missing from the package"]
+    actual = package[statement]
+
+    if len(expected) != len(actual):
+        return [f"{len(expected)} rows in the page, {len(actual)} in the package"]
+
+    failures = []
+    for column in ("Conta", "Descrição", "currency_unit"):
+        mismatches = int((expected[column].str.strip().to_numpy()
+                          != actual[column].str.strip().to_numpy()).sum())
+        if mismatches:
+            failures.append(f"{column}: {mismatches} rows differ")
+
+    for expected_column, actual_column in zip(_values(expected), _values(actual)):
+        if not np.allclose(expected[expected_column].to_numpy(), actual[actual_column].to_numpy(),
+                           equal_nan=True):
+            failures.append(f"'{expected_column}' differs from '{actual_column}'")
+
+    return failures
+
+
+def main():
+    package_content, package_source = load_fixture("document_package")
+    pages = {statement: load_fixture(f"statement_{index}")
+             for index, statement in enumerate(STATEMENTS) if statement != DMPL_STATEMENT}
+    if any(source != package_source for _, source in pages.values()):
+        print("The package and the statement pages must both be recorded, or both synthetic")
+        return 1
+
+    print(f"Comparing the {package_source} package with the {package_source} statement pages")
+    failed = False
+    for previous_results in (False, True):
+        with zipfile.ZipFile(io.BytesIO(package_content)) as archive:
+            package = parse_package_statements(archive, previous_results=previous_results)
+
+        for statement, (content, _) in pages.items():
+            html = content.decode("utf-8", errors="replace")
+            failures = compare_statement(statement, html, package, previous_results)
+            failed = failed or bool(failures)
+            print(f"{statement:>48} previous_results={previous_results!s:<5}"
+                  f" {'; '.join(failures) or 'OK'}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Records live CVM and B3 responses as fixtures for the offline benchmarks.
+Needs network access; the files are written to benchmarks/fixtures/.
+
+    python benchmarks/record_fixtures.py [cod_cvm]
+"""
+import sys
+
+from datetime import date, timedelta
+
+from fixtures import save_fixture
+from synthetic import STATEMENTS
+from brfinance.backend import DEFAULT_PARTICIPANT_TYPE, pool_connector
+from brfinance.http_client import CVMHttpClient
+from brfinance.responses import (
+    SEARCH_DOWNLOAD_COLUMNS,
+    GetCadastroInstrumentosTokenResponse,
+    GetSearchResponse
+)
+
+
+def record_reports(client, search):
+    # The ITR/DFP landing page of the most recent document with statements
+    documents = GetSearchResponse(None)._parse_get_search(search)
+    documents = documents[documents["categoria"].str.startswith(("ITR", "DFP"))
+                          & documents["numero_seq_documento"].notnull()]
+    if documents.empty:
+        print("No ITR/DFP document found, statements not recorded")
+        return
+
+    document = documents.iloc[0]
+    landing = client.get_report_landing_page(
+        document["numero_seq_documento"], document["codigo_tipo_instituicao"])
+    save_fixture("report_landing", landing.content)
+
+    for statement, url in client._report_urls(landing.text).items():
+        if statement in STATEMENTS:
+            save_fixture(f"statement_{STATEMENTS.index(statement)}",
+                         client.get_report_page(url).content)
+
+    # The package of the same document, compared with the statement pages
+    # by package_parity.py
+    if document[SEARCH_DOWNLOAD_COLUMNS].notnull().all():
+        save_fixture("document_package", client.get_document_package(
+            *document[SEARCH_DOWNLOAD_COLUMNS]).content)
+    else:
+        print("No download link for the document, package not recorded")
+
+
+def main(cod_cvm="21610"):
+    client = CVMHttpClient(session=pool_connector())
+
+    search = client.get_search_results(
+        cod_cvm=[cod_cvm],
+        start_date=date.today() - timedelta(days=365),
+        end_date=date.today(),
+        participant_type=",".join(DEFAULT_PARTICIPANT_TYPE),
+        category="EST_-1",
+        last_ref_date=False)
+    save_fixture("search", search.content)
+    record_reports(client, search.json())
+
+    save_fixture("consulta_externa", client.get_enet_consulta_externa().content)
+
+    # The instruments file of the last weekday
+    ref_date = date.today() - timedelta(days=1)
+    while ref_date.weekday() >= 5:
+        ref_date -= timedelta(days=1)
+    token = GetCadastroInstrumentosTokenResponse(
+        client.get_cadastro_de_instrumentos_token(ref_date)).data()
+    save_fixture("cadastro_instrumentos", client.get_cadastro_de_instrumentos(token).content)
+
+    save_fixture("emissor", client.get_emissor().content)
+    save_fixture("pesquisa_cia_aberta", client.get_pesquisa_cia_aberta().content)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,191 @@
+"""Offline benchmark suite for the response parsers.
+
+Each parser runs over its recorded fixture (or a synthetic one, see
+fixtures.py) at every requested scale. Throughput is the best of
+`--repeat` runs, peak memory is measured with tracemalloc on a separate
+run. Results are written to benchmarks/results/<label>.json so runs of
+different versions can be compared:
+
+    python benchmarks/run.py --scale 1 10 --label before
+    python benchmarks/run.py --scale 1 10 --compare benchmarks/results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import timeit
+import tracemalloc
+
+from datetime import datetime
+
+import pandas as pd
+
+from fixtures import load_fixture
+from synthetic import STATEMENTS
+from brfinance.http_client import BaseCVMHttpClient
+from brfinance.http_response import BufferedResponse
+from brfinance.metrics import METRICS
+from brfinance.responses import (
+    GetCadastroInstrumentosResponse,
+    GetConsultaExternaMetadataResponse,
+    GetCVMCodesResponse,
+    GetEmissorResponse,
+    GetPesquisaCiaAbertaResponse,
+    GetReportResponse,
+    GetSearchResponse
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+STATEMENT_CODES = ["bpa", "bpp", "dre", "dra", "dfc", "dmpl", "dva"]
+
+
+def _response(content, encoding=None):
+    return BufferedResponse("http://fixture", 200, {}, content, encoding)
+
+
+def _statement_benchmark(index):
+    statement = STATEMENTS[index]
+
+    def setup(content):
+        html = _response(content).text
+        return lambda: GetReportResponse(None, False)._parse_get_reports(html, statement)
+
+    return f"statement_{index}", setup
+
+
+# name -> (fixture, setup), setup returns the function to time
+BENCHMARKS = {
+    "search": ("search", lambda content: GetSearchResponse(_response(content)).data),
+    "report_landing": ("report_landing", lambda content: (
+        lambda html=_response(content).text: BaseCVMHttpClient()._report_urls(html))),
+    "cvm_codes": ("consulta_externa", lambda content: GetCVMCodesResponse(_response(content)).data),
+    "consulta_externa_metadata": (
+        "consulta_externa", lambda content: GetConsultaExternaMetadataResponse(_response(content)).data),
+    "cadastro_instrumentos": ("cadastro_instrumentos", lambda content: (
+        lambda: GetCadastroInstrumentosResponse(_response(content, "latin-1")).data())),
+    "emissor": ("emissor", lambda content: lambda: GetEmissorResponse(_response(content)).data()),
+    "pesquisa_cia_aberta": (
+        "pesquisa_cia_aberta", lambda content: GetPesquisaCiaAbertaResponse(_response(content)).data),
+    **{f"report_{code}": _statement_benchmark(index) for index, code in enumerate(STATEMENT_CODES)},
+}
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, dict, list)):
+        return len(result)
+    if hasattr(result, "cvm_codes"):
+        return len(result.cvm_codes)
+    return None
+
+
+def run_benchmark(name, scale, repeat):
+    fixture, setup = BENCHMARKS[name]
+    content, source = load_fixture(fixture, scale)
+    func = setup(content)
+
+    rows = _rows(func())
+    timings = timeit.repeat(func, number=1, repeat=repeat)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "name": name,
+        "scale": scale,
+        "source": source,
+        "bytes": len(content),
+        "rows": rows,
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "rows_per_s": rows / best if rows else None,
+        "mb_per_s": len(content) / best / 1024 ** 2,
+        "peak_memory_mb": peak / 1024 ** 2,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = {(result["name"], result["scale"]): result
+                    for result in json.load(baseline_file)["results"]}
+
+    print(f"\nCompared with {baseline_path} (time and memory ratios, < 1 is better)")
+    for result in results:
+        previous = baseline.get((result["name"], result["scale"]))
+        if previous is None:
+            continue
+        print(f"{result['name']:>28} x{result['scale']:<4}"
+              f" time {result['best_s'] / previous['best_s']:6.2f}"
+              f" memory {result['peak_memory_mb'] / max(previous['peak_memory_mb'], 1e-9):6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, nargs="+", default=[1],
+                        help="size multipliers of the synthetic fixtures")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="regular expression selecting the benchmarks")
+    parser.add_argument("--label", help="results file name, the git revision by default")
+    parser.add_argument("--compare", help="results file of a previous run")
+    args = parser.parse_args(argv)
+
+    # The metrics hooks would be timed along with the parsers
+    METRICS.enabled = False
+
+    names = [name for name in BENCHMARKS if not args.only or re.search(args.only, name)]
+    results = []
+    for scale in args.scale:
+        for name in names:
+            result = run_benchmark(name, scale, args.repeat)
+            results.append(result)
+            print(f"{name:>28} x{scale:<4} {result['source']:>9}"
+                  f" {result['best_s'] * 1000:9.1f} ms"
+                  f" {result['rows_per_s'] or 0:12,.0f} rows/s"
+                  f" {result['mb_per_s']:8.1f} MB/s"
+                  f" {result['peak_memory_mb']:8.1f} MB peak")
+
+    revision = _git_revision()
+    label = args.label or revision or datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w", encoding="utf-8") as results_file:
+        json.dump({
+            "label": label,
+            "revision": revision,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "results": results,
+        }, results_file, indent=2)
+    print(f"\nResults written to {path}")
+
+    synthetic = sorted({result["name"] for result in results
+                        if result["scale"] == 1 and result["source"] == "synthetic"})
+    if synthetic:
+        print(f"\nNo recorded fixture for {', '.join(synthetic)}, synthetic pages were used"
+              " (see record_fixtures.py)")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,253 @@
+import io
+import random
+import zipfile
+
+STATEMENTS = [
+    'Balanço Patrimonial Ativo',
+    'Balanço Patrimonial Passivo',
+    'Demonstração do Resultado',
+    'Demonstração do Resultado Abrangente',
+    'Demonstração do Fluxo de Caixa',
+    'Demonstração das Mutações do Patrimônio Líquido',
+    'Demonstração de Valor Adicionado']
+
+DMPL_COLUMNS = [
+    'Capital Social Integralizado',
+    'Reservas de Capital, Opções Outorgadas e Ações em Tesouraria',
+    'Reservas de Lucro',
+    'Lucros ou Prejuízos Acumulados',
+    'Outros Resultados Abrangentes',
+    'Patrimônio Líquido']
+
+
+def brazilian_number(value):
+    formatted = f"{abs(value):,}".replace(",", ".")
+    return ("-" if value < 0 else "") + formatted
+
+
+def statement_rows(columns, rows=100, seed=0):
+    # (conta, descrição, values) of a statement, a tenth of the values empty
+    rnd = random.Random(seed)
+
+    for row in range(rows):
+        values = [None if rnd.random() < 0.1 else rnd.randint(-10 ** 7, 10 ** 8)
+                  for _ in range(columns)]
+        yield f"{1 + row // 100}.{row % 100:02d}", f"Conta número {row}", values
+
+
+def statement_page(statement, rows=100, seed=0):
+
+    title = f"DFs Consolidadas - {statement} - (Reais Mil)"
+    prefix = ""
+    if statement == 'Demonstração do Fluxo de Caixa':
+        title = f"DFs Consolidadas - {statement} - (Reais Mil) - Método Indireto"
+
+    if statement == 'Demonstração das Mutações do Patrimônio Líquido':
+        columns = DMPL_COLUMNS
+        prefix = "<table><tr><td>DMPL - 01/01/2021 à 30/09/2021</td></tr></table>"
+    else:
+        columns = ['01/07/2021 à 30/09/2021', '01/01/2021 à 30/09/2021']
+
+    header = "".join(
+        f'<td class="ColunaTitulo">{column}</td>' for column in ['Conta', 'Descrição'] + columns)
+
+    body = []
+    for conta, descricao, values in statement_rows(len(columns), rows, seed):
+        values = "".join(
+            '<td align="right"></td>' if value is None else
+            f'<td align="right">{brazilian_number(value)}</td>'
+            for value in values)
+        body.append(f"<tr><td>{conta}</td><td>{descricao}</td>{values}</tr>")
+
+    return (
+        f'<html><body><div id="TituloTabelaSemBorda">{title}</div>{prefix}'
+        f'<table id="ctl00_cphPopUp_tbDados"><tr>{header}</tr>{"".join(body)}</table>'
+        '</body></html>')
+
+
+SEARCH_CATEGORIES = [
+    'ITR - Informações Trimestrais',
+    'DFP - Demonstrações Financeiras Padronizadas',
+    'Fato Relevante']
+
+
+def search_payload(records=1000, seed=0):
+    # ListarDocumentos JSON body with `records` documents
+    rnd = random.Random(seed)
+
+    rows = []
+    for record in range(records):
+        numero_seq = 100000 + record
+        month = rnd.randint(1, 12)
+        day = rnd.randint(1, 28)
+
+        acoes = (
+            "<i class='fi-page-search' id='VisualizarDocumento' onclick=\"OpenPopUpVer("
+            f"'frmGerenciaPaginaFRE.aspx?NumeroSequencialDocumento={numero_seq}&CodigoTipoInstituicao=1')\""
+            " title='Visualizar Documento' style='cursor:pointer;'></i>"
+            "<i class='fi-download' id='Download' onclick=\"OpenDownloadDocumentos("
+            f"'{numero_seq}','1','{numero_seq}0','IPE')\" title='Download' style='cursor:pointer;'></i>")
+
+        fields = [
+            f"0{rnd.randint(1000, 99999):05d}",
+            "B3 S.A. - BRASIL, BOLSA, BALCÃO",
+            rnd.choice(SEARCH_CATEGORIES),
+            "-",
+            "-",
+            f"<spanOrder>2021{month:02d}{day:02d}</spanOrder> {day:02d}/{month:02d}/2021",
+            f"<spanOrder>2021{month:02d}{day:02d}{rnd.randint(0, 23):02d}{rnd.randint(0, 59):02d}</spanOrder>"
+            f" {day:02d}/{month:02d}/2021 {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}",
+            "Ativo",
+            str(rnd.randint(1, 3)),
+            "AP",
+            acoes,
+            ""]
+        rows.append("$&".join(fields))
+
+    return {"d": {"dados": "$&&*".join(rows) + "$&&*"}}
+
+
+STATEMENT_CODES = [2, 3, 4, 5, 99, 8, 9]
+
+
+def landing_page(numero_seq=100000, statements=STATEMENTS):
+    # frmGerenciaPaginaFRE.aspx, with the hidden fields and the statement combo
+    options = "".join(
+        '<option value="frmDemonstracaoFinanceiraITR.aspx?Informacao=2&amp;'
+        f'Demonstracao={code}&amp;Periodo=0">{statement}</option>'
+        for statement, code in zip(statements, STATEMENT_CODES))
+
+    return (
+        "<html><head><script>var url = 'frmExibirArquivoFRE.aspx?NumeroSequencialRegistroCvm=1850"
+        "&CodigoTipoInstituicao=1';</script></head><body>"
+        f'<input type="hidden" name="hdnNumeroSequencialDocumento" id="hdnNumeroSequencialDocumento" value="{numero_seq}" />'
+        '<input type="hidden" name="hdnCodigoTipoDocumento" id="hdnCodigoTipoDocumento" value="3" />'
+        '<input type="hidden" name="hdnCodigoCvm" id="hdnCodigoCvm" value="21610" />'
+        '<input type="hidden" name="hdnCodigoInstituicao" id="hdnCodigoInstituicao" value="1" />'
+        f'<input type="hidden" name="hdnHash" id="hdnHash" value="A1B2C3{numero_seq}" />'
+        f'<select name="cmbQuadro" id="cmbQuadro">{options}</select>'
+        "</body></html>")
+
+
+def consulta_externa_page(companies=2000, seed=0):
+    # frmConsultaExternaCVM.aspx, with the company list and the category combo
+    rnd = random.Random(seed)
+
+    empresas = ",".join(
+        f"{{ key:'{cod_cvm:06d}', value:'{cod_cvm:06d} - EMPRESA {cod_cvm} S.A. (REGISTRO "
+        f"{rnd.choice(['ATIVO', 'CANCELADO'])})'}}"
+        for cod_cvm in range(1000, 1000 + companies))
+    categories = "".join(
+        f"&lt;option value='EST_{code}'&gt;&amp;nbsp;{category}&lt;/option&gt;"
+        for code, category in enumerate(SEARCH_CATEGORIES))
+
+    return (
+        "<html><body>"
+        f'<input type="hidden" name="hdnEmpresas" id="hdnEmpresas" value="[{empresas}]" />'
+        f'<input type="hidden" name="hdnComboCategoriaTipoEspecie" id="hdnComboCategoriaTipoEspecie" value="{categories}" />'
+        '<select name="cboTipoParticipante" id="cboTipoParticipante">'
+        '<option value="-1">Todos</option><option value="1">Companhia Aberta</option>'
+        '<option value="2">Companhia Estrangeira</option></select>'
+        "</body></html>")
+
+
+INSTRUMENTS_COLUMNS = [
+    'RptDt', 'TckrSymb', 'Asst', 'AsstDesc', 'SgmtNm', 'MktNm', 'SctyCtgyNm', 'XprtnDt',
+    'ISIN', 'ExrcPric', 'AllcnRndLot', 'CrpnNm', 'CorpGovnLvlNm', 'MktCptlstn']
+
+
+def instruments_csv(rows=10000, seed=0):
+    # InstrumentsConsolidated file, latin-1 encoded and ";" separated
+    rnd = random.Random(seed)
+
+    lines = [";".join(INSTRUMENTS_COLUMNS)]
+    for row in range(rows):
+        asst = f"A{row % 500:03d}"
+        option = row % 3 == 0
+        lines.append(";".join([
+            "2022-01-03",
+            f"{asst}{'C' if option else ''}{row}",
+            asst,
+            f"Descrição {asst}",
+            "EQUITY DERIVATIVE" if option else "CASH",
+            "OPTIONS" if option else "EQUITY-CASH",
+            "OPTION ON EQUITIES" if option else "SHARES",
+            f"2022-{1 + row % 12:02d}-17" if option else "",
+            f"BR{asst}ACNOR{row % 10}",
+            f"{rnd.uniform(1, 100):.2f}".replace(".", ",") if option else "",
+            "100",
+            f"Companhia {asst} S.A.",
+            rnd.choice(["NOVO MERCADO", "NÍVEL 1", "NÍVEL 2", ""]),
+            f"{rnd.randint(10 ** 6, 10 ** 10)}" if not option else ""]))
+
+    return ("\n".join(lines) + "\n").encode("latin-1")
+
+
+def emissor_zip(rows=5000):
+    # IsinCall download, a ZIP with EMISSOR.TXT and other registers
+    emissor = "".join(
+        f'"A{row:03d}","EMPRESA {row}","{row * 1000191:014d}","2016{row % 10000:04d}"\n'
+        for row in range(rows))
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("EMISSOR.TXT", emissor.encode("latin-1"))
+        zip_file.writestr("NUMERACA.TXT", b"")
+    return archive.getvalue()
+
+
+def pesquisa_cia_aberta_page(rows=2000, seed=0):
+    # ResultBuscaParticCiaAb.aspx results table
+    rnd = random.Random(seed)
+
+    header = "".join(f"<td>{column}</td>" for column in [
+        "CNPJ", "NOME", "TIPO DE PARTICIPANTE", "CÓDIGO CVM", "SITUAÇÃO REGISTRO"])
+    body = "".join(
+        f"<tr><td>{row:02d}.{row % 1000:03d}.{row % 997:03d}/0001-{row % 100:02d}</td>"
+        f"<td>EMPRESA {row} S.A.</td><td>CIA ABERTA</td><td>{1000 + row}</td>"
+        f"<td>{rnd.choice(['ATIVO', 'CANCELADA'])}</td></tr>"
+        for row in range(rows))
+
+    return f"<html><body><table><tr>{header}</tr>{body}</table></body></html>"
+
+
+# CodigoTipoDemonstracaoFinanceira of each statement in the package XML
+PACKAGE_STATEMENT_CODES = [2, 3, 4, 5, 7, 8, 9]
+
+
+def document_package(numero_seq=100000, rows=100, seeds=STATEMENT_CODES):
+    # frmDownloadDocumento.aspx ZIP, holding the .itr package with the
+    # consolidated statements (DMPL excluded) in InfoFinaDFin.xml
+    records = []
+    for statement, code, seed in zip(STATEMENTS, PACKAGE_STATEMENT_CODES, seeds):
+        if statement == 'Demonstração das Mutações do Patrimônio Líquido':
+            continue
+        for conta, descricao, values in statement_rows(2, rows, seed):
+            amounts = "".join(
+                f"<ValorConta{index}>{'' if value is None else f'{value}.00'}</ValorConta{index}>"
+                for index, value in enumerate(values, start=1))
+            records.append(
+                "<InfoFinaDFin><PlanoConta><VersaoPlanoConta>"
+                "<CodigoTipoInformacaoFinanceira>2</CodigoTipoInformacaoFinanceira>"
+                f"<CodigoTipoDemonstracaoFinanceira>{code}</CodigoTipoDemonstracaoFinanceira>"
+                f"</VersaoPlanoConta><NumeroConta>{conta}</NumeroConta></PlanoConta>"
+                f"<DescricaoConta1>{descricao}</DescricaoConta1>{amounts}</InfoFinaDFin>")
+
+    info = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<ArrayOfInfoFinaDFin xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'{"".join(records)}</ArrayOfInfoFinaDFin>')
+
+    package = io.BytesIO()
+    with zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED) as package_file:
+        package_file.writestr("InfoFinaDFin.xml", info.encode("utf-8"))
+        package_file.writestr(
+            "FormularioDemonstracaoFinanceiraITR.xml",
+            '<?xml version="1.0" encoding="utf-8"?><FormularioDemonstracaoFinanceiraITR>'
+            '<CodigoEscalaMoedaNacional>2</CodigoEscalaMoedaNacional>'
+            '</FormularioDemonstracaoFinanceiraITR>')
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as archive_file:
+        archive_file.writestr(f"{numero_seq}.itr", package.getvalue())
+    return archive.getvalue()
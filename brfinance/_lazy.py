@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule():
+    """Stands in for module `name` and imports it on first attribute
+    access, so heavy dependencies are only loaded when they are used.
+    importlib already serializes concurrent imports of the same module."""
+
+    def __init__(self, name) -> None:
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attribute):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
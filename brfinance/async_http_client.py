@@ -0,0 +1,231 @@
+import asyncio
+import logging
+import time
+
+from datetime import date
+
+from brfinance._lazy import lazy_import
+from brfinance.cache import ResponseCache
+from brfinance.connector import CVMAsyncHttpClientConnector
+from brfinance.exceptions import ConnectionFailedError
+from brfinance.http_client import (
+    BaseCVMHttpClient,
+    SEARCH_HEADERS,
+    CADASTRO_INSTRUMENTOS_HEADERS
+)
+from brfinance.http_response import BufferedResponse
+from brfinance.retry import NO_RETRY, CircuitBreaker, RetryPolicy, error_for_response, request_host
+from brfinance.throttling import RequestGovernor, TokenBucket
+from brfinance.utils import get_enet_download_url
+
+aiohttp = lazy_import("aiohttp")
+
+logger = logging.getLogger(__name__)
+
+
+class CVMAsyncHttpClient(BaseCVMHttpClient):
+
+    def __init__(
+            self,
+            session: CVMAsyncHttpClientConnector,
+            rate_limiter: TokenBucket = None,
+            cache: ResponseCache = None,
+            retry_policy: RetryPolicy = None,
+            circuit_breaker: CircuitBreaker = None,
+            governor: RequestGovernor = None):
+
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.retry_policy = retry_policy or NO_RETRY
+        self.circuit_breaker = circuit_breaker
+        self.governor = governor
+
+    async def _timed_request(self, client_session, method, url, endpoint, **kwargs):
+        # Timed after any throttling wait, so it only measures the network
+        start = time.perf_counter()
+        status = "error"
+        content = None
+        try:
+            async with client_session.request(method, url, **kwargs) as resp:
+                status = resp.status
+                content = await resp.read()
+            return resp, content
+        finally:
+            self._record_request(
+                method, endpoint, status, time.perf_counter() - start,
+                len(content) if content is not None else None)
+
+    async def _send(self, method, url, host, endpoint=None, **kwargs):
+        client_session = await self.session.get_connector()
+
+        async with self.session.semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+
+            if self.governor is None:
+                resp, content = await self._timed_request(
+                    client_session, method, url, endpoint, **kwargs)
+            else:
+                async with self.governor.limit_async(host):
+                    resp, content = await self._timed_request(
+                        client_session, method, url, endpoint, **kwargs)
+
+        return BufferedResponse(
+            url=str(resp.url),
+            status_code=resp.status,
+            headers=resp.headers,
+            content=content,
+            encoding=resp.charset)
+
+    async def _attempt(self, method, url, host, endpoint, **kwargs):
+        try:
+            response = await self._send(method, url, host, endpoint, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            error = ConnectionFailedError(
+                f"Request to {url} failed: {exc!r}", url=url, endpoint=endpoint)
+            error.__cause__ = exc
+            return None, error
+
+        return response, error_for_response(response, endpoint)
+
+    async def _request(self, method, url, endpoint=None, idempotent=None, **kwargs):
+        cache_key = None
+        if self.cache is not None and self.cache.is_cacheable(endpoint, kwargs.get("headers")):
+            cache_key = self.cache.key(method, url, kwargs.get("data"))
+            cached_response = self.cache.get(cache_key)
+            self._record_cache(endpoint, cached_response is not None)
+            if cached_response is not None:
+                return cached_response
+
+        host = request_host(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            trial = self.circuit_breaker is not None and self.circuit_breaker.before_request(host)
+            try:
+                response, error = await self._attempt(method, url, host, endpoint, **kwargs)
+            except BaseException:
+                # Cancelled, or any other error: the circuit must not stay
+                # half-open forever
+                if trial:
+                    self.circuit_breaker.release_trial(host)
+                raise
+
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record(host, error)
+
+            if error is None:
+                break
+
+            error.attempts = attempt
+            delay = self.retry_policy.retry_delay(method, attempt, error, idempotent)
+            if delay is None:
+                raise error
+
+            self._record_retry(endpoint, error)
+            logger.warning(f"{error}, retrying in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+        # 304 answers to conditional requests carry no body to cache
+        if cache_key is not None and response.status_code != 304:
+            self.cache.set(cache_key, endpoint, response)
+
+        return response
+
+    async def get_search_results(
+            self,
+            cod_cvm: list,
+            start_date: date,
+            end_date: date,
+            participant_type: str,
+            category: str,
+            last_ref_date
+    ):
+        data = self._search_results_payload(
+            cod_cvm=cod_cvm,
+            start_date=start_date,
+            end_date=end_date,
+            participant_type=participant_type,
+            category=category,
+            last_ref_date=last_ref_date)
+
+        # ListarDocumentos is a read-only query, safe to retry despite the POST
+        resp = await self._request(
+            "POST", self.LISTAR_DOCUMENTOS_URL, endpoint="search", idempotent=True,
+            data=data, headers=SEARCH_HEADERS)
+        return resp
+
+    async def get_report_landing_page(self, NumeroSequencialDocumento, CodigoTipoInstituicao):
+        url = self._report_landing_url(
+            NumeroSequencialDocumento, CodigoTipoInstituicao)
+        return await self._request("GET", url, endpoint="report_landing")
+
+    async def get_report_page(self, report_url):
+        return await self._request("GET", report_url, endpoint="report")
+
+    async def get_reports(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
+        return (await self.get_report_pages(
+            NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list))[0]
+
+    async def get_report_pages(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
+        response = await self.get_report_landing_page(
+            NumeroSequencialDocumento, CodigoTipoInstituicao)
+        report_urls = self._report_urls(response.text, reports_list)
+
+        results = await asyncio.gather(
+            *[self.get_report_page(report_url) for report_url in report_urls.values()],
+            return_exceptions=True)
+
+        reports = {}
+        errors = {}
+        for report, result in zip(report_urls, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Failed to download '{report}' for document {NumeroSequencialDocumento}",
+                    exc_info=result)
+                errors[report] = result
+            else:
+                reports[report] = result
+
+        return reports, errors
+
+    async def get_document_package(self, numSequencia, numVersao, numProtocolo, descTipo):
+        url = get_enet_download_url(numSequencia, numVersao, numProtocolo, descTipo)
+        return await self._request("GET", url, endpoint="document_package")
+
+    async def get_enet_consulta_externa(self):
+        consulta_enet_response = await self._request(
+            "GET", self.ENET_CONSULTA_EXTERNA, endpoint="consulta_externa")
+        return consulta_enet_response
+
+    async def get_cadastro_de_instrumentos_token(self, ref_date: date):
+        ref_date = ref_date.strftime("%Y-%m-%d")
+
+        token_url = self.CADASTRO_INSTRUMENTOS_TOKEN_URL.format(ref_date=ref_date)
+        response = await self._request(
+            "GET", token_url, endpoint="cadastro_instrumentos_token")
+
+        return response
+
+    async def get_cadastro_de_instrumentos(self, token: str, headers: dict = None):
+        download_url = self.CADASTRO_INSTRUMENTOS_URL.format(token=token)
+
+        response = await self._request(
+            "GET",
+            download_url,
+            endpoint="cadastro_instrumentos",
+            headers={**CADASTRO_INSTRUMENTOS_HEADERS, **(headers or {})})
+
+        return response
+
+    async def get_emissor(self, headers: dict = None):
+        response = await self._request("GET", self.EMISSOR_URL, endpoint="emissor", headers=headers)
+
+        return response
+
+    async def get_pesquisa_cia_aberta(self):
+        response = await self._request(
+            "GET", self.PESQUISA_CIA_ABERTA_URL, endpoint="pesquisa_cia_aberta")
+
+        return response
@@ -1,50 +1,238 @@
-from datetime import date
+import asyncio
+import atexit
+import logging
+import multiprocessing
+import threading
+import time
 
-from brfinance.connector import CVMHttpClientConnector
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from brfinance._lazy import lazy_import
+from brfinance.async_http_client import CVMAsyncHttpClient
+from brfinance.cache import ResponseCache, ParsedReportCache
+from brfinance.company_index import CompanyIndex
+from brfinance.connector import CVMHttpClientConnector, CVMAsyncHttpClientConnector
 from brfinance.http_client import CVMHttpClient
+from brfinance.metrics import METRICS
+from brfinance.panel import FinancialPanel
 from brfinance.responses import (
-    GetCVMCodesResponse,
-    GetCategoriesResponse,
+    GetConsultaExternaMetadataResponse,
     GetSearchResponse,
     GetReportResponse,
-    GetTipoParticipanteResponse,
+    GetDocumentPackageResponse,
     GetCadastroInstrumentosTokenResponse,
     GetCadastroInstrumentosResponse,
     GetEmissorResponse,
-    GetPesquisaCiaAbertaResponse
+    GetPesquisaCiaAbertaResponse,
+    parse_reports
 )
+from brfinance.retry import CircuitBreaker, RetryPolicy
+from brfinance.snapshots import ReferenceSnapshotStore, response_validators
+from brfinance.sync import WatermarkStore, sync_scope
+from brfinance.throttling import TokenBucket
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+_pool_connector = None
+_pool_connector_lock = threading.Lock()
+
+DEFAULT_SEARCH_CATEGORY = ['EST_-1', 'IPE_-1_-1_-1']
+DEFAULT_PARTICIPANT_TYPE = ['-1']
+
+# Marks the pending futures of get_reports_bulk that are parsing a document
+_PARSING = object()
+
+
+def pool_connector():
+    """Connector shared by the backends built without one, created on the
+    first call and closed at exit."""
+    global _pool_connector
+    with _pool_connector_lock:
+        if _pool_connector is None:
+            _pool_connector = CVMHttpClientConnector()
+            atexit.register(_pool_connector.close)
+    return _pool_connector
 
-POOL_CONNECTOR = CVMHttpClientConnector()
+
+def __getattr__(name):
+    # POOL_CONNECTOR used to be built at import time
+    if name == "POOL_CONNECTOR":
+        return pool_connector()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class BulkReportResult(NamedTuple):
+    NumeroSequencialDocumento: str
+    CodigoTipoInstituicao: str
+    data: dict
+    errors: dict
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class SyncResult(NamedTuple):
+    documents: "pd.DataFrame"
+    reports: list
 
 
 class CVMAsyncBackend():
 
-    def __init__(self) -> None:
+    def __init__(
+            self,
+            max_concurrency: int = 20,
+            limit_per_host: int = 10,
+            report_workers: int = 8,
+            cache: ResponseCache = None,
+            report_cache: ParsedReportCache = None,
+            metadata_ttl: float = 60 * 60,
+            company_index: CompanyIndex = None,
+            retry_policy: RetryPolicy = None,
+            circuit_breaker: CircuitBreaker = None,
+            connector: CVMHttpClientConnector = None,
+            parse_workers: int = None,
+            snapshot_store: ReferenceSnapshotStore = None) -> None:
+
+        # Sessions are resolved per request by the connector, according to
+        # its session scope, so one client can be shared by every thread.
+        self._connector = connector or pool_connector()
+        self._governor = self._connector.governor
+        self._report_workers = report_workers
+        self._cache = cache
+        self._report_cache = report_cache
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._metadata_ttl = metadata_ttl
+        self._metadata = None
+        self._metadata_expires = 0
+        self._metadata_lock = threading.Lock()
+        self._metadata_async_lock = None
+        self._company_index = company_index
+        self._company_index_lock = threading.Lock()
+        self._parse_workers = parse_workers
+        self._parse_executor = None
+        self._parse_executor_lock = threading.Lock()
+        self._snapshot_store = snapshot_store
+        self._async_connector = CVMAsyncHttpClientConnector(
+            max_concurrency=max_concurrency,
+            limit_per_host=limit_per_host,
+            timeout=self._connector.timeout,
+            keep_alive=self._connector.keep_alive,
+            compression=self._connector.compression)
 
-        self._connector = POOL_CONNECTOR.get_connector()
+        self._client = self._http_client()
+        self._async_client = self._async_http_client()
 
-    def _http_client(self):
+    def _http_client(self, rate_limiter=None):
         return CVMHttpClient(
-            session=self._connector
+            session=self._connector,
+            max_workers=self._report_workers,
+            rate_limiter=rate_limiter,
+            cache=self._cache,
+            retry_policy=self._retry_policy,
+            circuit_breaker=self._circuit_breaker,
+            governor=self._governor
         )
 
-    def get_consulta_externa_cvm_results(
+    def _async_http_client(self, rate_limiter=None):
+        return CVMAsyncHttpClient(
+            session=self._async_connector,
+            rate_limiter=rate_limiter,
+            cache=self._cache,
+            retry_policy=self._retry_policy,
+            circuit_breaker=self._circuit_breaker,
+            governor=self._governor
+        )
+
+    async def close(self):
+        await self._async_connector.close()
+        self._shutdown_parse_pool(wait=False)
+
+    def close_sync(self):
+        """Shuts down the parse_workers pool, waiting for its processes. The
+        aiohttp session of the async functions is closed by `close`."""
+        self._shutdown_parse_pool(wait=True)
+
+    def _shutdown_parse_pool(self, wait):
+        with self._parse_executor_lock:
+            parse_executor, self._parse_executor = self._parse_executor, None
+        if parse_executor is not None:
+            parse_executor.shutdown(wait=wait)
+
+    def _parse_pool(self):
+        # Statement HTML is parsed in worker processes when parse_workers is
+        # set. "spawn" keeps the workers clear of the parent's threads and
+        # sockets, and they live as long as the backend.
+        if not self._parse_workers:
+            return None
+
+        with self._parse_executor_lock:
+            if self._parse_executor is None:
+                self._parse_executor = ProcessPoolExecutor(
+                    max_workers=self._parse_workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._parse_executor
+
+    def _submit_parse(self, responses, previous_results):
+        parse_pool = self._parse_pool()
+        return {report: parse_pool.submit(parse_reports, {report: response.text}, previous_results)
+                for report, response in responses.items()}
+
+    def _parsed_report(self, report, result):
+        data, errors = result
+        if errors:
+            raise errors[report]
+        return data[report]
+
+    def _parse_reports(self, responses, previous_results):
+        if self._parse_pool() is None:
+            return GetReportResponse(response=responses, previous_results=previous_results).data()
+
+        return {report: self._parsed_report(report, future.result())
+                for report, future in self._submit_parse(responses, previous_results).items()}
+
+    async def _parse_reports_async(self, responses, previous_results):
+        if self._parse_pool() is None:
+            return GetReportResponse(response=responses, previous_results=previous_results).data()
+
+        futures = self._submit_parse(responses, previous_results)
+        results = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures.values()])
+        return {report: self._parsed_report(report, result)
+                for report, result in zip(futures, results)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close_sync()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def _search_params(
             self,
-            start_date: date = None,
-            end_date: date = None,
-            cod_cvm: list = [],
-            participant_type: list = [1],
-            category: list = None,
-            last_ref_date: bool = False
-    ):
+            start_date,
+            end_date,
+            cod_cvm,
+            participant_type,
+            category,
+            last_ref_date):
 
         if (not category) or (category is None):
-            category = ['EST_-1', 'IPE_-1_-1_-1']
+            category = DEFAULT_SEARCH_CATEGORY
 
         if (not participant_type) or (participant_type is None):
-            participant_type = ['-1']
+            participant_type = DEFAULT_PARTICIPANT_TYPE
 
-        response = self._http_client().get_search_results(
+        return dict(
             cod_cvm=cod_cvm,
             start_date=start_date,
             end_date=end_date,
@@ -52,70 +240,879 @@ class CVMAsyncBackend():
             participant_type=str(
                 ",".join([str(item) for item in participant_type])),
             last_ref_date=last_ref_date)
+
+    def _search_shards(
+            self,
+            start_date,
+            end_date,
+            cod_cvm,
+            shard_days,
+            cod_cvm_shard_size):
+
+        date_ranges = [(start_date, end_date)]
+        # last_ref_date is evaluated by the server over the whole window, so
+        # date sharding is only applied by callers when it is off.
+        if shard_days and start_date:
+            end_date = end_date or date.today()
+            date_ranges = []
+            shard_start = start_date
+            while shard_start <= end_date:
+                shard_end = min(shard_start + timedelta(days=shard_days - 1), end_date)
+                date_ranges.append((shard_start, shard_end))
+                shard_start = shard_end + timedelta(days=1)
+
+        cod_cvm_chunks = [cod_cvm]
+        if cod_cvm_shard_size and len(cod_cvm) > cod_cvm_shard_size:
+            cod_cvm_chunks = [cod_cvm[start:start + cod_cvm_shard_size]
+                              for start in range(0, len(cod_cvm), cod_cvm_shard_size)]
+
+        return [(shard_start, shard_end, chunk)
+                for shard_start, shard_end in date_ranges
+                for chunk in cod_cvm_chunks]
+
+    def _merge_search_results(self, results):
+        # No shards, e.g. start_date after end_date: nothing to search
+        if not results:
+            return GetSearchResponse.empty()
+        if len(results) == 1:
+            return results[0]
+
+        non_empty = [result for result in results if not result.empty]
+        if not non_empty:
+            return results[0]
+
+        return pd.concat(non_empty).drop_duplicates(
+            subset=['numero_seq_documento', 'numSequencia', 'version']
+        ).sort_values('data_entrega', ascending=False).reset_index(drop=True)
+
+    def _get_search_shard(self, http_client, params):
+        response = http_client.get_search_results(**params)
         response_class = GetSearchResponse(response=response)
 
         return response_class.data()
 
+    def _needs_company_index(self, cod_cvm):
+        # Plain CVM codes are sent as they are, names, CNPJs and tickers
+        # are translated through the company index.
+        return any(not (str(item).strip().isdigit() and len(str(item).strip()) <= 6)
+                   for item in cod_cvm)
+
+    def _resolve_cod_cvm(self, company_index, cod_cvm):
+        return list(dict.fromkeys(company_index.resolve(item) for item in cod_cvm))
+
+    def get_company_index(self, refresh: bool = False):
+        with self._company_index_lock:
+            if self._company_index is None or refresh:
+                company_index = self._company_index or CompanyIndex()
+                company_index.update(
+                    cvm_codes=self.get_cvm_codes(),
+                    pesquisa_cia_aberta=self.get_pesquisa_cia_aberta(),
+                    emissor=self.get_emissor())
+                self._company_index = company_index
+
+        return self._company_index
+
+    def get_consulta_externa_cvm_results(
+            self,
+            start_date: date = None,
+            end_date: date = None,
+            cod_cvm: list = [],
+            participant_type: list = [1],
+            category: list = None,
+            last_ref_date: bool = False,
+            shard_days: int = None,
+            cod_cvm_shard_size: int = None,
+            shard_workers: int = 4
+    ):
+
+        if self._needs_company_index(cod_cvm):
+            cod_cvm = self._resolve_cod_cvm(self.get_company_index(), cod_cvm)
+
+        shards = self._search_shards(
+            start_date, end_date, cod_cvm,
+            None if last_ref_date else shard_days, cod_cvm_shard_size)
+        params = [self._search_params(
+            shard_start, shard_end, chunk, participant_type, category, last_ref_date)
+            for shard_start, shard_end, chunk in shards]
+
+        http_client = self._client
+        if not params:
+            return self._merge_search_results([])
+        if len(params) == 1:
+            return self._get_search_shard(http_client, params[0])
+
+        with ThreadPoolExecutor(max_workers=min(shard_workers, len(params))) as executor:
+            results = list(executor.map(
+                lambda shard_params: self._get_search_shard(http_client, shard_params), params))
+
+        return self._merge_search_results(results)
+
+    def _sync_start(self, store, scope, start_date):
+        watermark = store.get_watermark(scope)
+        if watermark is not None:
+            # Searches filter by delivery day, so the watermark day is
+            # searched again and the documents already seen are dropped.
+            return watermark.date()
+
+        if start_date is None:
+            raise ValueError("start_date is required for the first sync of a search")
+        return start_date
+
+    def _finish_sync(self, store, scope, documents, new_documents, reports):
+        synced = new_documents
+        failed = {result.NumeroSequencialDocumento for result in reports if not result.ok}
+        if failed:
+            synced = new_documents[
+                ~new_documents['numero_seq_documento'].astype(str).isin(failed)]
+
+        store.mark_synced(scope, synced)
+
+        # Documents whose reports failed to download stay behind the
+        # watermark, so they are returned again by the next sync.
+        if failed:
+            watermark = new_documents.loc[
+                new_documents['numero_seq_documento'].astype(str).isin(failed),
+                'data_entrega'].min()
+        else:
+            watermark = documents['data_entrega'].max()
+
+        if not pd.isnull(watermark):
+            store.set_watermark(scope, watermark)
+
+        return SyncResult(new_documents.reset_index(drop=True), reports)
+
+    def sync_consulta_externa_cvm_results(
+            self,
+            store: WatermarkStore,
+            start_date: date = None,
+            cod_cvm: list = [],
+            participant_type: list = [1],
+            category: list = None,
+            download_reports: bool = False,
+            reports_list=None,
+            previous_results=False,
+            max_workers: int = 16,
+            max_requests_per_second: float = None,
+            shard_days: int = None):
+
+        scope = sync_scope(
+            category or DEFAULT_SEARCH_CATEGORY,
+            participant_type or DEFAULT_PARTICIPANT_TYPE,
+            cod_cvm)
+
+        documents = self.get_consulta_externa_cvm_results(
+            start_date=self._sync_start(store, scope, start_date),
+            end_date=date.today(),
+            cod_cvm=cod_cvm,
+            participant_type=participant_type,
+            category=category,
+            shard_days=shard_days)
+        new_documents = store.new_documents(scope, documents)
+
+        reports = []
+        if download_reports and not new_documents.empty:
+            reports = list(self.get_reports_bulk(
+                new_documents,
+                reports_list=reports_list,
+                previous_results=previous_results,
+                max_workers=max_workers,
+                max_requests_per_second=max_requests_per_second))
+
+        return self._finish_sync(store, scope, documents, new_documents, reports)
+
     def get_report(
             self,
             NumeroSequencialDocumento,
             CodigoTipoInstituicao,
             reports_list=None,
             previous_results=False):
-        response = self._http_client().get_reports(
+        cached, missing = self._cached_reports(
+            NumeroSequencialDocumento, previous_results, reports_list)
+        if missing == []:
+            return cached
+
+        response, errors = self._client.get_report_pages(
             NumeroSequencialDocumento,
             CodigoTipoInstituicao,
-            reports_list)
-        response_class = GetReportResponse(response=response, previous_results=previous_results)
+            missing)
+        data = self._parse_reports(response, previous_results)
+
+        return self._merge_cached_reports(
+            NumeroSequencialDocumento, previous_results, reports_list, cached, data, errors)
+
+    def get_report_package(
+            self,
+            numSequencia,
+            numVersao,
+            numProtocolo,
+            descTipo,
+            reports_list=None,
+            previous_results=False,
+            consolidated: bool = True):
+        """Statements of an ITR/DFP document from its ZIP package, downloaded
+        in a single request. The columns numSequencia, numVersao,
+        numProtocolo and descTipo come from get_consulta_externa_cvm_results.
+        The DMPL is not part of the package, use get_report for it."""
+
+        # Without a response cache the package is streamed to a spooled file
+        response = self._client.get_document_package(
+            numSequencia, numVersao, numProtocolo, descTipo, stream=self._cache is None)
+        response_class = GetDocumentPackageResponse(
+            response=response,
+            previous_results=previous_results,
+            reports_list=reports_list,
+            consolidated=consolidated)
 
         return response_class.data()
 
+    def _cached_reports(self, NumeroSequencialDocumento, previous_results, reports_list):
+        if self._report_cache is None:
+            return {}, reports_list
+
+        return self._report_cache.get_reports(
+            str(NumeroSequencialDocumento), previous_results, reports_list)
+
+    def _merge_cached_reports(
+            self,
+            NumeroSequencialDocumento,
+            previous_results,
+            reports_list,
+            cached,
+            data,
+            errors=None):
+
+        if self._report_cache is None:
+            return data
+
+        # Statements that failed to download are missing from data, so a
+        # partial result is never stored as the document's statement list
+        self._report_cache.set_reports(
+            str(NumeroSequencialDocumento), previous_results, data,
+            all_statements=reports_list is None and not cached and not errors)
+
+        reports = {**cached, **data}
+        if reports_list is None:
+            return reports
+        return {report: reports[report] for report in reports_list if report in reports}
+
+    def _bulk_documents(self, documents):
+        if isinstance(documents, pd.DataFrame):
+            documents = documents[pd.to_numeric(
+                documents['numero_seq_documento'], errors='coerce').notnull()]
+            documents = zip(
+                documents['numero_seq_documento'], documents['codigo_tipo_instituicao'])
+
+        return list(dict.fromkeys(
+            (str(numero_seq), str(codigo_tipo)) for numero_seq, codigo_tipo in documents))
+
+    def _bulk_pages(self, responses):
+        # Only the HTML is sent to the parse workers
+        return {report: response.text for report, response in responses.items()}
+
+    def _finish_bulk_report(self, document, previous_results, reports_list, result, errors, cached=None):
+        data, parse_errors = result
+        errors.update(parse_errors)
+        self._store_bulk_reports(document, previous_results, reports_list, data, errors, cached)
+
+        if cached:
+            # Only the missing statements were downloaded
+            data = {**cached, **data}
+            if reports_list is not None:
+                data = {report: data[report] for report in reports_list if report in data}
+        return BulkReportResult(*document, data, errors)
+
+    def get_reports_bulk(
+            self,
+            documents,
+            reports_list=None,
+            previous_results=False,
+            max_workers: int = 16,
+            max_requests_per_second: float = None):
+
+        rate_limiter = None
+        if max_requests_per_second:
+            rate_limiter = TokenBucket(rate=max_requests_per_second)
+
+        http_client = self._client
+        if rate_limiter is not None:
+            http_client = self._http_client(rate_limiter=rate_limiter)
+
+        documents = self._bulk_documents(documents)
+        responses = {document: {} for document in documents}
+        errors = {document: {} for document in documents}
+        remaining = {}
+        cached_reports = {}
+        missing_reports = {}
+
+        # Landing pages and statement pages share the same pool, so the
+        # number of requests in flight never exceeds max_workers. With
+        # parse_workers, finished documents are parsed in the process pool
+        # while the threads keep downloading.
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        parse_pool = self._parse_pool()
+        pending = {}
+        try:
+            cached_results = []
+            for document in documents:
+                cached, missing = self._cached_reports(
+                    document[0], previous_results, reports_list)
+                if missing == []:
+                    cached_results.append(BulkReportResult(*document, cached, {}))
+                    continue
+                cached_reports[document] = cached
+                missing_reports[document] = missing
+
+                future = executor.submit(
+                    http_client.get_report_landing_page, *document)
+                pending[future] = (document, None)
+
+            yield from cached_results
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    document, report = pending.pop(future)
+
+                    if report is _PARSING:
+                        try:
+                            result = future.result()
+                        except Exception as exc:
+                            logger.error(f"Failed to parse document {document[0]}", exc_info=exc)
+                            result = {}, {"document": exc}
+                        yield self._finish_bulk_report(
+                            document, previous_results, reports_list, result, errors.pop(document),
+                            cached_reports.pop(document))
+                        continue
+
+                    if report is None:
+                        try:
+                            report_urls = http_client._report_urls(
+                                future.result().text, missing_reports.pop(document))
+                        except Exception as exc:
+                            logger.error(
+                                f"Failed to load document {document[0]}", exc_info=exc)
+                            errors[document]["document"] = exc
+                            report_urls = {}
+
+                        for statement, report_url in report_urls.items():
+                            statement_future = executor.submit(
+                                http_client.get_report_page, report_url)
+                            pending[statement_future] = (document, statement)
+                        remaining[document] = len(report_urls)
+
+                    else:
+                        try:
+                            responses[document][report] = future.result()
+                        except Exception as exc:
+                            logger.error(
+                                f"Failed to download '{report}' for document {document[0]}",
+                                exc_info=exc)
+                            errors[document][report] = exc
+                        remaining[document] -= 1
+
+                    if remaining[document] == 0:
+                        del remaining[document]
+                        pages = self._bulk_pages(responses.pop(document))
+                        if parse_pool is not None:
+                            parse_future = parse_pool.submit(parse_reports, pages, previous_results)
+                            pending[parse_future] = (document, _PARSING)
+                            continue
+
+                        yield self._finish_bulk_report(
+                            document, previous_results, reports_list,
+                            parse_reports(pages, previous_results), errors.pop(document),
+                            cached_reports.pop(document))
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def get_financial_panel(
+            self,
+            documents: "pd.DataFrame",
+            panel: FinancialPanel = None,
+            reports_list=None,
+            max_workers: int = 16,
+            max_requests_per_second: float = None):
+        """Downloads the statements of the documents returned by
+        get_consulta_externa_cvm_results with get_reports_bulk and adds them
+        to `panel`, or to a new FinancialPanel."""
+
+        if panel is None:
+            panel = FinancialPanel()
+
+        panel.add_reports(self.get_reports_bulk(
+            documents,
+            reports_list=reports_list,
+            max_workers=max_workers,
+            max_requests_per_second=max_requests_per_second), documents)
+
+        return panel
+
+    def _store_bulk_reports(self, document, previous_results, reports_list, data, errors, cached=None):
+        if self._report_cache is not None:
+            self._report_cache.set_reports(
+                document[0], previous_results, data,
+                all_statements=reports_list is None and not errors and not cached)
+
+    async def _get_bulk_report_async(
+            self,
+            http_client,
+            document,
+            reports_list,
+            previous_results):
+
+        cached, missing = self._cached_reports(
+            document[0], previous_results, reports_list)
+        if missing == []:
+            return BulkReportResult(*document, cached, {})
+
+        responses = {}
+        errors = {}
+        try:
+            response = await http_client.get_report_landing_page(*document)
+            report_urls = http_client._report_urls(response.text, missing)
+        except Exception as exc:
+            logger.error(f"Failed to load document {document[0]}", exc_info=exc)
+            errors["document"] = exc
+            report_urls = {}
+
+        results = await asyncio.gather(
+            *[http_client.get_report_page(report_url) for report_url in report_urls.values()],
+            return_exceptions=True)
+
+        for report, result in zip(report_urls, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Failed to download '{report}' for document {document[0]}",
+                    exc_info=result)
+                errors[report] = result
+            else:
+                responses[report] = result
+
+        pages = self._bulk_pages(responses)
+        parse_pool = self._parse_pool()
+        if parse_pool is None:
+            result = parse_reports(pages, previous_results)
+        else:
+            try:
+                result = await asyncio.wrap_future(
+                    parse_pool.submit(parse_reports, pages, previous_results))
+            except Exception as exc:
+                logger.error(f"Failed to parse document {document[0]}", exc_info=exc)
+                result = {}, {"document": exc}
+
+        return self._finish_bulk_report(document, previous_results, reports_list, result, errors, cached)
+
+    async def get_reports_bulk_async(
+            self,
+            documents,
+            reports_list=None,
+            previous_results=False,
+            max_requests_per_second: float = None):
+
+        rate_limiter = None
+        if max_requests_per_second:
+            rate_limiter = TokenBucket(rate=max_requests_per_second)
+
+        http_client = self._async_client
+        if rate_limiter is not None:
+            http_client = self._async_http_client(rate_limiter=rate_limiter)
+
+        tasks = [
+            asyncio.ensure_future(self._get_bulk_report_async(
+                http_client, document, reports_list, previous_results))
+            for document in self._bulk_documents(documents)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_financial_panel_async(
+            self,
+            documents: "pd.DataFrame",
+            panel: FinancialPanel = None,
+            reports_list=None,
+            max_requests_per_second: float = None):
+
+        if panel is None:
+            panel = FinancialPanel()
+
+        results = [result async for result in self.get_reports_bulk_async(
+            documents,
+            reports_list=reports_list,
+            max_requests_per_second=max_requests_per_second)]
+        panel.add_reports(results, documents)
+
+        return panel
+
+    def _fresh_metadata(self):
+        if self._metadata is not None and time.monotonic() < self._metadata_expires:
+            return self._metadata
+
+    def _store_metadata(self, response):
+        self._metadata = GetConsultaExternaMetadataResponse(response=response).data()
+        self._metadata_expires = time.monotonic() + self._metadata_ttl
+
+        return self._metadata
+
+    def get_consulta_externa_metadata(self, refresh: bool = False):
+        # The consulta externa page is heavy and rarely changes, so its
+        # companies, categories and participant types are fetched together
+        # and kept in memory for metadata_ttl seconds.
+        with self._metadata_lock:
+            metadata = None if refresh else self._fresh_metadata()
+            if metadata is None:
+                metadata = self._store_metadata(
+                    self._client.get_enet_consulta_externa())
+
+        return metadata
+
     def get_cvm_codes(self):
-        response = self._http_client().get_enet_consulta_externa()
-        response_class = GetCVMCodesResponse(response=response)
+        return dict(self.get_consulta_externa_metadata().cvm_codes)
+
+    def get_consulta_externa_cvm_categories(self):
+        return dict(self.get_consulta_externa_metadata().categories)
+
+    def get_consulta_externa_cvm_tipo_participante(self):
+        return dict(self.get_consulta_externa_metadata().tipo_participante)
+
+    def get_cadastro_instrumentos(
+            self,
+            ref_date: date = None,
+            stream: bool = False,
+            chunksize: int = 100_000,
+            parquet_path: str = None):
+        if ref_date is None:
+            ref_date = date.today()
+
+        # With a snapshot store every ref_date is downloaded once
+        snapshots = self._snapshot_store is not None and not stream and parquet_path is None
+        if snapshots:
+            data = self._stored_snapshot("cadastro_instrumentos", ref_date)
+            if data is not None:
+                return data
+
+        token_response = self._client.get_cadastro_de_instrumentos_token(ref_date=ref_date)
+        token = GetCadastroInstrumentosTokenResponse(
+            response=token_response).data()
+
+        if snapshots:
+            url = self._client.CADASTRO_INSTRUMENTOS_URL.format(token=token)
+            previous_date, headers = self._snapshot_request("cadastro_instrumentos", ref_date, url)
+            response = self._client.get_cadastro_de_instrumentos(token=token, headers=headers)
+            return self._store_snapshot(
+                "cadastro_instrumentos", ref_date, url, previous_date, response,
+                lambda response: GetCadastroInstrumentosResponse(response=response).data())
+
+        response = self._client.get_cadastro_de_instrumentos(
+            token=token, stream=stream or parquet_path is not None)
+        response_class = GetCadastroInstrumentosResponse(response=response)
+
+        if parquet_path is not None:
+            return response_class.to_parquet(parquet_path, chunksize=chunksize)
+        if stream:
+            return response_class.chunks(chunksize=chunksize)
 
         return response_class.data()
 
-    def get_consulta_externa_cvm_categories(self):
-        response = self._http_client().get_enet_consulta_externa()
-        response_class = GetCategoriesResponse(response=response)
+    def get_emissor(self, member: str = GetEmissorResponse.EMISSOR_MEMBER, ref_date: date = None):
+
+        if self._snapshot_store is not None and member == GetEmissorResponse.EMISSOR_MEMBER:
+            ref_date = ref_date or date.today()
+            data = self._stored_snapshot("emissor", ref_date)
+            if data is not None:
+                return data
+            self._check_emissor_date(ref_date)
+
+            url = self._client.EMISSOR_URL
+            previous_date, headers = self._snapshot_request("emissor", ref_date, url)
+            response = self._client.get_emissor(stream=self._cache is None, headers=headers)
+            return self._store_snapshot(
+                "emissor", ref_date, url, previous_date, response,
+                lambda response: GetEmissorResponse(response=response).data())
 
+        # Without a response cache the archive is streamed to a spooled
+        # temporary file instead of being held in memory twice.
+        response = self._client.get_emissor(stream=self._cache is None)
+        response_class = GetEmissorResponse(response=response)
+
+        if member != GetEmissorResponse.EMISSOR_MEMBER:
+            return response_class.read_member(member)
         return response_class.data()
 
-    def get_consulta_externa_cvm_tipo_participante(self):
-        response = self._http_client().get_enet_consulta_externa()
-        response_class = GetTipoParticipanteResponse(response=response)
+    def _check_emissor_date(self, ref_date):
+        # The emissor file only has the current data, so a download cannot
+        # be stored as the snapshot of another day
+        if ref_date != date.today():
+            raise ValueError(
+                f"The emissor file of {ref_date} is not stored and only today's file can be downloaded")
+
+    def _stored_snapshot(self, name, ref_date):
+        data = self._snapshot_store.get(name, ref_date)
+        if data is not None:
+            METRICS.increment("snapshot_requests_total", file=name, result="stored")
+        return data
+
+    def _snapshot_request(self, name, ref_date, url):
+        # Revalidates the latest snapshot before ref_date, if any
+        previous_date = self._snapshot_store.previous_date(name, ref_date)
+        return previous_date, self._snapshot_store.conditional_headers(name, previous_date, url)
+
+    def _store_snapshot(self, name, ref_date, url, previous_date, response, parse):
+        store = self._snapshot_store
+        if response.status_code == 304:
+            # Unchanged since the previous snapshot, which is reused for ref_date
+            response.close()
+            METRICS.increment("snapshot_requests_total", file=name, result="not_modified")
+            data = store.get(name, previous_date)
+            metadata = store.metadata(name, previous_date)
+            validators = {"etag": metadata.get("etag"), "last_modified": metadata.get("last_modified")}
+        else:
+            METRICS.increment("snapshot_requests_total", file=name, result="downloaded")
+            data = parse(response)
+            validators = response_validators(response)
+
+        store.set(name, ref_date, data, url=url, validators=validators)
+        return data
+
+    def _snapshot_changes(self, name, ref_date):
+        if self._snapshot_store is None:
+            raise ValueError("A snapshot_store is required to compare reference files")
+        return self._snapshot_store.diff(name, ref_date)
+
+    def get_cadastro_instrumentos_changes(self, ref_date: date = None):
+        """Instruments added, changed or removed since the previous stored
+        snapshot, downloading the file of `ref_date` if needed."""
+        ref_date = ref_date or date.today()
+        self.get_cadastro_instrumentos(ref_date=ref_date)
+        return self._snapshot_changes("cadastro_instrumentos", ref_date)
+
+    def get_emissor_changes(self, ref_date: date = None):
+        ref_date = ref_date or date.today()
+        self.get_emissor(ref_date=ref_date)
+        return self._snapshot_changes("emissor", ref_date)
+
+    def get_pesquisa_cia_aberta(self):
+
+        response = self._client.get_pesquisa_cia_aberta()
+        response_class = GetPesquisaCiaAbertaResponse(response=response)
 
         return response_class.data()
 
-    def get_consulta_externa_cvm_categories(self):
-        response = self._http_client().get_enet_consulta_externa()
-        response_class = GetCategoriesResponse(response=response)
+    async def _get_search_shard_async(self, http_client, params):
+        response = await http_client.get_search_results(**params)
+        response_class = GetSearchResponse(response=response)
+
+        return response_class.data()
+
+    async def get_company_index_async(self, refresh: bool = False):
+        if self._company_index is None or refresh:
+            cvm_codes, pesquisa_cia_aberta, emissor = await asyncio.gather(
+                self.get_cvm_codes_async(),
+                self.get_pesquisa_cia_aberta_async(),
+                self.get_emissor_async())
+
+            company_index = self._company_index or CompanyIndex()
+            company_index.update(
+                cvm_codes=cvm_codes,
+                pesquisa_cia_aberta=pesquisa_cia_aberta,
+                emissor=emissor)
+            self._company_index = company_index
+
+        return self._company_index
+
+    async def get_consulta_externa_cvm_results_async(
+            self,
+            start_date: date = None,
+            end_date: date = None,
+            cod_cvm: list = [],
+            participant_type: list = [1],
+            category: list = None,
+            last_ref_date: bool = False,
+            shard_days: int = None,
+            cod_cvm_shard_size: int = None
+    ):
+
+        if self._needs_company_index(cod_cvm):
+            cod_cvm = self._resolve_cod_cvm(await self.get_company_index_async(), cod_cvm)
+
+        shards = self._search_shards(
+            start_date, end_date, cod_cvm,
+            None if last_ref_date else shard_days, cod_cvm_shard_size)
+
+        http_client = self._async_client
+        results = await asyncio.gather(*[
+            self._get_search_shard_async(http_client, self._search_params(
+                shard_start, shard_end, chunk, participant_type, category, last_ref_date))
+            for shard_start, shard_end, chunk in shards])
+
+        return self._merge_search_results(results)
+
+    async def sync_consulta_externa_cvm_results_async(
+            self,
+            store: WatermarkStore,
+            start_date: date = None,
+            cod_cvm: list = [],
+            participant_type: list = [1],
+            category: list = None,
+            download_reports: bool = False,
+            reports_list=None,
+            previous_results=False,
+            max_requests_per_second: float = None,
+            shard_days: int = None):
+
+        scope = sync_scope(
+            category or DEFAULT_SEARCH_CATEGORY,
+            participant_type or DEFAULT_PARTICIPANT_TYPE,
+            cod_cvm)
+
+        documents = await self.get_consulta_externa_cvm_results_async(
+            start_date=self._sync_start(store, scope, start_date),
+            end_date=date.today(),
+            cod_cvm=cod_cvm,
+            participant_type=participant_type,
+            category=category,
+            shard_days=shard_days)
+        new_documents = store.new_documents(scope, documents)
+
+        reports = []
+        if download_reports and not new_documents.empty:
+            reports = [result async for result in self.get_reports_bulk_async(
+                new_documents,
+                reports_list=reports_list,
+                previous_results=previous_results,
+                max_requests_per_second=max_requests_per_second)]
+
+        return self._finish_sync(store, scope, documents, new_documents, reports)
+
+    async def get_report_async(
+            self,
+            NumeroSequencialDocumento,
+            CodigoTipoInstituicao,
+            reports_list=None,
+            previous_results=False):
+        cached, missing = self._cached_reports(
+            NumeroSequencialDocumento, previous_results, reports_list)
+        if missing == []:
+            return cached
+
+        response, errors = await self._async_client.get_report_pages(
+            NumeroSequencialDocumento,
+            CodigoTipoInstituicao,
+            missing)
+        data = await self._parse_reports_async(response, previous_results)
+
+        return self._merge_cached_reports(
+            NumeroSequencialDocumento, previous_results, reports_list, cached, data, errors)
+
+    async def get_report_package_async(
+            self,
+            numSequencia,
+            numVersao,
+            numProtocolo,
+            descTipo,
+            reports_list=None,
+            previous_results=False,
+            consolidated: bool = True):
+        response = await self._async_client.get_document_package(
+            numSequencia, numVersao, numProtocolo, descTipo)
+        response_class = GetDocumentPackageResponse(
+            response=response,
+            previous_results=previous_results,
+            reports_list=reports_list,
+            consolidated=consolidated)
 
         return response_class.data()
 
-    def get_cadastro_instrumentos(self, ref_date: date = date.today()):
+    async def get_consulta_externa_metadata_async(self, refresh: bool = False):
+        # Like the aiohttp session, the lock belongs to one event loop
+        loop = asyncio.get_running_loop()
+        if self._metadata_async_lock is None or self._metadata_async_lock[0] is not loop:
+            self._metadata_async_lock = (loop, asyncio.Lock())
+
+        async with self._metadata_async_lock[1]:
+            metadata = None if refresh else self._fresh_metadata()
+            if metadata is None:
+                metadata = self._store_metadata(
+                    await self._async_client.get_enet_consulta_externa())
+
+        return metadata
+
+    async def get_cvm_codes_async(self):
+        return dict((await self.get_consulta_externa_metadata_async()).cvm_codes)
+
+    async def get_consulta_externa_cvm_categories_async(self):
+        return dict((await self.get_consulta_externa_metadata_async()).categories)
+
+    async def get_consulta_externa_cvm_tipo_participante_async(self):
+        return dict((await self.get_consulta_externa_metadata_async()).tipo_participante)
+
+    async def get_cadastro_instrumentos_async(self, ref_date: date = None):
+        if ref_date is None:
+            ref_date = date.today()
 
-        token_response = self._http_client(
-        ).get_cadastro_de_instrumentos_token(ref_date=ref_date)
+        if self._snapshot_store is not None:
+            data = self._stored_snapshot("cadastro_instrumentos", ref_date)
+            if data is not None:
+                return data
+
+        token_response = await self._async_client.get_cadastro_de_instrumentos_token(ref_date=ref_date)
         token = GetCadastroInstrumentosTokenResponse(
             response=token_response).data()
 
-        response = self._http_client().get_cadastro_de_instrumentos(token=token)
+        if self._snapshot_store is not None:
+            url = self._async_client.CADASTRO_INSTRUMENTOS_URL.format(token=token)
+            previous_date, headers = self._snapshot_request("cadastro_instrumentos", ref_date, url)
+            response = await self._async_client.get_cadastro_de_instrumentos(token=token, headers=headers)
+            return self._store_snapshot(
+                "cadastro_instrumentos", ref_date, url, previous_date, response,
+                lambda response: GetCadastroInstrumentosResponse(response=response).data())
+
+        response = await self._async_client.get_cadastro_de_instrumentos(token=token)
         response_class = GetCadastroInstrumentosResponse(response=response)
 
         return response_class.data()
 
-    def get_emissor(self):
+    async def get_emissor_async(self, member: str = GetEmissorResponse.EMISSOR_MEMBER, ref_date: date = None):
+
+        if self._snapshot_store is not None and member == GetEmissorResponse.EMISSOR_MEMBER:
+            ref_date = ref_date or date.today()
+            data = self._stored_snapshot("emissor", ref_date)
+            if data is not None:
+                return data
+            self._check_emissor_date(ref_date)
+
+            url = self._async_client.EMISSOR_URL
+            previous_date, headers = self._snapshot_request("emissor", ref_date, url)
+            response = await self._async_client.get_emissor(headers=headers)
+            return self._store_snapshot(
+                "emissor", ref_date, url, previous_date, response,
+                lambda response: GetEmissorResponse(response=response).data())
 
-        response = self._http_client().get_emissor()
+        response = await self._async_client.get_emissor()
         response_class = GetEmissorResponse(response=response)
 
+        if member != GetEmissorResponse.EMISSOR_MEMBER:
+            return response_class.read_member(member)
         return response_class.data()
 
-    def get_pesquisa_cia_aberta(self):
+    async def get_cadastro_instrumentos_changes_async(self, ref_date: date = None):
+        ref_date = ref_date or date.today()
+        await self.get_cadastro_instrumentos_async(ref_date=ref_date)
+        return self._snapshot_changes("cadastro_instrumentos", ref_date)
+
+    async def get_emissor_changes_async(self, ref_date: date = None):
+        ref_date = ref_date or date.today()
+        await self.get_emissor_async(ref_date=ref_date)
+        return self._snapshot_changes("emissor", ref_date)
+
+    async def get_pesquisa_cia_aberta_async(self):
 
-        response = self._http_client().get_pesquisa_cia_aberta()
+        response = await self._async_client.get_pesquisa_cia_aberta()
         response_class = GetPesquisaCiaAbertaResponse(response=response)
 
         return response_class.data()
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from brfinance._lazy import lazy_import
+from brfinance.http_response import BufferedResponse
+from brfinance.responses import PARSER_VERSION
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+# Filed documents never change for a given NumeroSequencialDocumento, so
+# their pages are kept until evicted by size.
+IMMUTABLE_ENDPOINTS = {"report_landing", "report", "document_package"}
+
+DEFAULT_TTLS = {
+    "search": 60 * 60,
+    "consulta_externa": 24 * 60 * 60,
+    "emissor": 24 * 60 * 60,
+    "pesquisa_cia_aberta": 24 * 60 * 60,
+}
+
+CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+
+class ResponseCache():
+
+    def __init__(
+            self,
+            directory: str,
+            max_size: int = 1024 ** 3,
+            ttls: dict = None) -> None:
+
+        self.directory = directory
+        self.max_size = max_size
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+
+        self._lock = threading.Lock()
+        self._size = None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def is_cacheable(self, endpoint, headers=None):
+        # Conditional requests revalidate a snapshot, which a cached answer
+        # would shadow until its TTL expires
+        if any(header in (headers or {}) for header in CONDITIONAL_HEADERS):
+            return False
+        return endpoint in IMMUTABLE_ENDPOINTS or self.ttls.get(endpoint) is not None
+
+    def key(self, method, url, data=None):
+        raw = f"{method.upper()} {url}\n{data or ''}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + ".json"), os.path.join(folder, key + ".body")
+
+    def get(self, key):
+        meta_path, body_path = self._paths(key)
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                content = body_file.read()
+        except (OSError, ValueError):
+            return None
+
+        if meta["expires"] is not None and meta["expires"] < time.time():
+            self._remove(key)
+            return None
+
+        if hashlib.sha256(content).hexdigest() != meta["sha256"]:
+            logger.warning(f"Discarding corrupted cache entry for {meta['url']}")
+            self._remove(key)
+            return None
+
+        # The metadata mtime tracks the last access for LRU eviction
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        return BufferedResponse(
+            url=meta["url"],
+            status_code=meta["status_code"],
+            headers=meta["headers"],
+            content=content,
+            encoding=meta["encoding"])
+
+    def set(self, key, endpoint, response):
+        if endpoint in IMMUTABLE_ENDPOINTS:
+            expires = None
+        else:
+            expires = time.time() + self.ttls[endpoint]
+
+        content = response.content
+        meta = {
+            "url": str(response.url),
+            "endpoint": endpoint,
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "size": len(content),
+            "expires": expires,
+        }
+
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        with self._lock:
+            previous_size = self._entry_size(key)
+            self._atomic_write(body_path, content)
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+            if self._size is not None:
+                self._size += len(content) - previous_size
+
+        self._evict()
+
+    def _atomic_write(self, path, content):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _entry_size(self, key):
+        try:
+            return os.path.getsize(self._paths(key)[1])
+        except OSError:
+            return 0
+
+    def _remove(self, key):
+        with self._lock:
+            size = self._entry_size(key)
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+            if self._size is not None:
+                self._size -= size
+
+    def _entries(self):
+        for folder, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    meta_path = os.path.join(folder, name)
+                    try:
+                        last_access = os.path.getmtime(meta_path)
+                    except OSError:
+                        continue
+                    key = name[:-len(".json")]
+                    yield last_access, key, self._entry_size(key)
+
+    def size(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            return self._size
+
+    def _evict(self):
+        if self.size() <= self.max_size:
+            return
+
+        for _, key, _ in sorted(self._entries()):
+            if self.size() <= self.max_size:
+                break
+            self._remove(key)
+
+    def clear(self):
+        for _, key, _ in list(self._entries()):
+            self._remove(key)
+
+
+class ParsedReportCache():
+
+    FORMATS = {
+        "parquet": ("read_parquet", "to_parquet"),
+        "feather": ("read_feather", "to_feather"),
+    }
+
+    def __init__(self, directory: str, format: str = "parquet") -> None:
+        if format not in self.FORMATS:
+            raise ValueError(f"format must be one of {list(self.FORMATS)}")
+
+        try:
+            import pyarrow  # NOQA
+        except ImportError:
+            raise ImportError(
+                "ParsedReportCache requires pyarrow. Install it with `pip install brfinance[parquet]`.")
+
+        self.directory = directory
+        self.format = format
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _key(self, *parts):
+        raw = "|".join(str(part) for part in (*parts, PARSER_VERSION))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key[:2], f"{key}.{extension}")
+
+    def get(self, NumeroSequencialDocumento, statement, previous_results):
+        path = self._path(
+            self._key(NumeroSequencialDocumento, statement, bool(previous_results)), self.format)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            return getattr(pd, self.FORMATS[self.format][0])(path)
+        except (OSError, ValueError):
+            # Truncated or corrupted files; pyarrow's ArrowInvalid is a ValueError
+            logger.warning(f"Discarding unreadable parsed report cache entry {path}")
+            os.remove(path)
+            return None
+
+    def set(self, NumeroSequencialDocumento, statement, previous_results, df):
+        path = self._path(
+            self._key(NumeroSequencialDocumento, statement, bool(previous_results)), self.format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            getattr(df.reset_index(drop=True), self.FORMATS[self.format][1])(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_statements(self, NumeroSequencialDocumento, previous_results):
+        path = self._path(
+            self._key(NumeroSequencialDocumento, "statements", bool(previous_results)), "json")
+        try:
+            with open(path, "r", encoding="utf-8") as manifest:
+                return json.load(manifest)
+        except (OSError, ValueError):
+            return None
+
+    def set_statements(self, NumeroSequencialDocumento, previous_results, statements):
+        path = self._path(
+            self._key(NumeroSequencialDocumento, "statements", bool(previous_results)), "json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w", encoding="utf-8") as manifest:
+            json.dump(list(statements), manifest)
+
+    def get_reports(self, NumeroSequencialDocumento, previous_results, reports_list=None):
+        # Returns the cached statements and the ones still missing. Missing is
+        # None when the statements available for the document are unknown.
+        if reports_list is None:
+            reports_list = self.get_statements(NumeroSequencialDocumento, previous_results)
+            if reports_list is None:
+                return {}, None
+
+        reports = {}
+        missing = []
+        for statement in reports_list:
+            df = self.get(NumeroSequencialDocumento, statement, previous_results)
+            if df is None:
+                missing.append(statement)
+            else:
+                reports[statement] = df
+
+        return reports, missing
+
+    def set_reports(self, NumeroSequencialDocumento, previous_results, reports, all_statements=False):
+        for statement, df in reports.items():
+            self.set(NumeroSequencialDocumento, statement, previous_results, df)
+
+        if all_statements:
+            self.set_statements(NumeroSequencialDocumento, previous_results, reports.keys())
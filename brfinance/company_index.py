@@ -0,0 +1,257 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+
+from typing import NamedTuple
+
+from brfinance._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+_RE_NON_DIGITS = re.compile(r"\D+")
+_RE_WHITESPACE = re.compile(r"\s+")
+_RE_CNPJ = re.compile(r"^\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}$")
+
+# get_cvm_codes appends the registration status to the company name
+_RE_REGISTRATION_STATUS = re.compile(r"\s*\([^)]*\)\s*$")
+
+
+class Company(NamedTuple):
+    cod_cvm: str
+    nome: str
+    cnpj: int = None
+    tickers: tuple = ()
+    tipo_participante: str = None
+    situacao_registro: str = None
+
+
+def normalize_cod_cvm(value):
+    if isinstance(value, float):
+        value = int(value)
+    return _RE_NON_DIGITS.sub("", str(value)).zfill(6)
+
+
+def normalize_cnpj(value):
+    if value is None or pd.isnull(value):
+        return None
+    if isinstance(value, float):
+        value = int(value)
+
+    digits = _RE_NON_DIGITS.sub("", str(value))
+    return int(digits) if digits else None
+
+
+def normalize_name(value):
+    value = unicodedata.normalize("NFKD", str(value))
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    return _RE_WHITESPACE.sub(" ", value).strip().upper()
+
+
+def _optional(value):
+    if value is None or pd.isnull(value):
+        return None
+    return str(value)
+
+
+class CompanyIndex():
+    """Lookup of companies by CVM code, CNPJ, ticker and name, built from
+    `get_cvm_codes`, `get_pesquisa_cia_aberta` and `get_emissor`.
+
+    cod_cvm, CNPJ and ticker lookups are dict lookups. Names are kept
+    sorted for prefix search, with `difflib` as the fuzzy fallback."""
+
+    def __init__(self, companies=()) -> None:
+        self._lock = threading.RLock()
+        self._companies = {}
+        self._by_cnpj = {}
+        self._by_ticker = {}
+        self._by_name = {}
+        self._names = None
+
+        for company in companies:
+            self._put(Company(*company) if not isinstance(company, Company) else company)
+
+    def __len__(self):
+        return len(self._companies)
+
+    def __contains__(self, cod_cvm):
+        return normalize_cod_cvm(cod_cvm) in self._companies
+
+    def __iter__(self):
+        return iter(list(self._companies.values()))
+
+    def _put(self, company):
+        previous = self._companies.get(company.cod_cvm)
+        if previous == company:
+            return False
+
+        if previous is not None:
+            self._drop_keys(previous)
+
+        self._companies[company.cod_cvm] = company
+        if company.cnpj is not None:
+            self._by_cnpj[company.cnpj] = company.cod_cvm
+        for ticker in company.tickers:
+            self._by_ticker[ticker] = company.cod_cvm
+        self._by_name.setdefault(normalize_name(company.nome), set()).add(company.cod_cvm)
+        self._names = None
+
+        return True
+
+    def _drop_keys(self, company):
+        if self._by_cnpj.get(company.cnpj) == company.cod_cvm:
+            del self._by_cnpj[company.cnpj]
+        for ticker in company.tickers:
+            if self._by_ticker.get(ticker) == company.cod_cvm:
+                del self._by_ticker[ticker]
+
+        name = normalize_name(company.nome)
+        codes = self._by_name.get(name, set())
+        codes.discard(company.cod_cvm)
+        if not codes:
+            self._by_name.pop(name, None)
+
+    def update(
+            self,
+            cvm_codes: dict = None,
+            pesquisa_cia_aberta: "pd.DataFrame" = None,
+            emissor: "pd.DataFrame" = None):
+        """Merges fresh outputs of the three sources into the index. Any of
+        them can be omitted, and only companies whose data changed are
+        re-indexed. Returns the number of companies added or changed."""
+
+        with self._lock:
+            companies = {cod_cvm: company._asdict() for cod_cvm, company in self._companies.items()}
+
+            for cod_cvm, nome in (cvm_codes or {}).items():
+                cod_cvm = normalize_cod_cvm(cod_cvm)
+                nome = _RE_REGISTRATION_STATUS.sub("", nome)
+                companies.setdefault(cod_cvm, Company(cod_cvm, nome)._asdict())
+
+            if pesquisa_cia_aberta is not None:
+                for row in pesquisa_cia_aberta.itertuples(index=False):
+                    if pd.isnull(row.cod_cvm):
+                        continue
+                    cod_cvm = normalize_cod_cvm(row.cod_cvm)
+                    company = companies.setdefault(cod_cvm, Company(cod_cvm, row.nome)._asdict())
+                    # The registry name is complete, unlike the one in cvm_codes
+                    company.update(
+                        nome=row.nome,
+                        cnpj=normalize_cnpj(row.cnpj),
+                        tipo_participante=_optional(row.tipo_participante),
+                        situacao_registro=_optional(row.situacao_registro))
+
+            if emissor is not None:
+                by_cnpj = {company["cnpj"]: company for company in companies.values()
+                           if company["cnpj"] is not None}
+                tickers = {}
+                for ticker, cnpj in zip(emissor["Asst"], emissor["cnpj"]):
+                    company = by_cnpj.get(normalize_cnpj(cnpj))
+                    if company is not None and isinstance(ticker, str):
+                        tickers.setdefault(company["cod_cvm"], set()).add(ticker.strip().upper())
+                for cod_cvm, company_tickers in tickers.items():
+                    companies[cod_cvm]["tickers"] = tuple(sorted(company_tickers))
+
+            return sum(self._put(Company(**company)) for company in companies.values())
+
+    def get(self, cod_cvm):
+        return self._companies.get(normalize_cod_cvm(cod_cvm))
+
+    def by_cnpj(self, cnpj):
+        cod_cvm = self._by_cnpj.get(normalize_cnpj(cnpj))
+        return self._companies.get(cod_cvm) if cod_cvm is not None else None
+
+    def by_ticker(self, ticker):
+        # Tickers such as PETR4 resolve through their four letter root
+        ticker = str(ticker).strip().upper()
+        cod_cvm = self._by_ticker.get(ticker) or self._by_ticker.get(ticker[:4])
+        return self._companies.get(cod_cvm) if cod_cvm is not None else None
+
+    def search(self, name, limit: int = 10, fuzzy: bool = True):
+        """Companies whose name starts with `name` (accents and case are
+        ignored), completed with the closest names when `fuzzy` is set."""
+
+        name = normalize_name(name)
+        with self._lock:
+            if self._names is None:
+                self._names = sorted(self._by_name)
+            names = self._names
+
+        matches = []
+        position = bisect.bisect_left(names, name)
+        while position < len(names) and names[position].startswith(name) and len(matches) < limit:
+            matches.append(names[position])
+            position += 1
+
+        if fuzzy and len(matches) < limit:
+            matches += [match for match in difflib.get_close_matches(name, names, n=limit, cutoff=0.6)
+                        if match not in matches][:limit - len(matches)]
+
+        return [self._companies[cod_cvm]
+                for match in matches
+                for cod_cvm in sorted(self._by_name.get(match, ()))][:limit]
+
+    def resolve(self, value):
+        """Translates a cod_cvm, CNPJ, ticker or company name to a cod_cvm.
+        Names only resolve when they match a single company exactly (accents
+        and case are ignored) or are the prefix of a single company's name.
+        Raises KeyError otherwise, listing the closest names."""
+
+        text = str(value).strip()
+        if text.isdigit() and len(text) <= 6:
+            return normalize_cod_cvm(text)
+
+        if _RE_CNPJ.match(text) or (text.isdigit() and len(text) <= 14):
+            company = self.by_cnpj(text)
+            if company is None:
+                raise KeyError(f"No company found for {value!r}")
+            return company.cod_cvm
+
+        company = self.by_ticker(text) if len(text) <= 6 else None
+        if company is not None:
+            return company.cod_cvm
+
+        # A fuzzy match could silently pick another company, so it is only
+        # offered in the error message
+        codes = sorted(self._by_name.get(normalize_name(text), ()))
+        if codes:
+            candidates = [self._companies[cod_cvm] for cod_cvm in codes]
+        else:
+            candidates = self.search(text, limit=5, fuzzy=False)
+        if len(candidates) == 1:
+            return candidates[0].cod_cvm
+
+        if candidates:
+            message = f"{value!r} matches more than one company"
+        else:
+            message = f"No company found for {value!r}"
+            candidates = self.search(text, limit=5)
+        if candidates:
+            message += ", did you mean: " + "; ".join(
+                f"{company.nome} ({company.cod_cvm})" for company in candidates)
+        raise KeyError(message)
+
+    def save(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as index_file:
+                json.dump([company._asdict() for company in self], index_file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r", encoding="utf-8") as index_file:
+            return cls(Company(**{**company, "tickers": tuple(company["tickers"])})
+                       for company in json.load(index_file))
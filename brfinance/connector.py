@@ -1,19 +1,275 @@
+import asyncio
+import itertools
+import os
+import re
+import ssl
+import threading
+import warnings
+
+from urllib.parse import urlsplit
+
 from requests import Session
-import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.ssl_ import create_urllib3_context
+
+from brfinance._lazy import lazy_import
+from brfinance.constants import B3_ARQUIVOS_URL, B3_LISTADOS_URL, CVMWEB_URL, RAD_CVM_URL
+from brfinance.throttling import HostLimits, RequestGovernor
+
+aiohttp = lazy_import("aiohttp")
+
+# Some CVM hosts only negotiate ciphers outside the OpenSSL defaults. They are
+# enabled on the library's own adapters and SSL contexts only, leaving the
+# urllib3 globals of the host application untouched.
+TLS_CIPHERS = 'DEFAULT:HIGH:!DH:!aNULL'
+
+_insecure_warnings_filtered = False
+
+
+def _filter_insecure_warnings():
+    # Requests are sent with verify=False, so the unverified HTTPS warnings
+    # are silenced for the CVM and B3 hosts only.
+    global _insecure_warnings_filtered
+    if _insecure_warnings_filtered:
+        return
+
+    hosts = "|".join(
+        re.escape(urlsplit(url).hostname)
+        for url in (RAD_CVM_URL, CVMWEB_URL, B3_ARQUIVOS_URL, B3_LISTADOS_URL))
+    warnings.filterwarnings(
+        "ignore", message=f"Unverified HTTPS request is being made to host '({hosts})'",
+        category=InsecureRequestWarning)
+    _insecure_warnings_filtered = True
+
+
+class CVMHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools use `TLS_CIPHERS`."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("ssl_context", create_urllib3_context(ciphers=TLS_CIPHERS))
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs.setdefault("ssl_context", create_urllib3_context(ciphers=TLS_CIPHERS))
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
 
-requests.packages.urllib3.disable_warnings()
-requests.packages.urllib3.util.ssl_.DEFAULT_CIPHERS += 'HIGH:!DH:!aNULL'
-try:
-    requests.packages.urllib3.contrib.pyopenssl.DEFAULT_SSL_CIPHER_LIST += 'HIGH:!DH:!aNULL'
-except AttributeError:
-    # no pyopenssl support used / needed / available
-    pass
+
+class TimeoutSession(Session):
+    """Session applying a default timeout to requests that set none."""
+
+    def __init__(self, timeout=None) -> None:
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
 
 
 class CVMHttpClientConnector():
+    """Builds and owns the requests sessions used by `CVMHttpClient`.
+
+    `session_scope` is "shared" (one session for every thread), "thread"
+    (one session per thread) or "process" (one session per process, so
+    forked workers never reuse the parent's sockets). `host_pool_maxsize`
+    overrides `pool_maxsize` for specific hosts."""
+
+    SESSION_SCOPES = ("shared", "thread", "process")
+
+    def __init__(
+            self,
+            host_limits: dict = None,
+            default_limits: HostLimits = None,
+            state_path: str = None,
+            pool_connections: int = 10,
+            pool_maxsize: int = 20,
+            pool_block: bool = False,
+            host_pool_maxsize: dict = None,
+            timeout=(10, 60),
+            keep_alive: bool = True,
+            compression: bool = True,
+            session_scope: str = "shared") -> None:
+
+        if session_scope not in self.SESSION_SCOPES:
+            raise ValueError(f"session_scope must be one of {self.SESSION_SCOPES}")
+
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.host_pool_maxsize = host_pool_maxsize or {}
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.compression = compression
+        self.session_scope = session_scope
+
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._sessions = {}
+
+        # Shared by every sync and async client built on this connector
+        self.governor = RequestGovernor(
+            host_limits=host_limits,
+            default_limits=default_limits,
+            state_path=state_path)
+
+    def _adapter(self, pool_maxsize):
+        return CVMHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=self.pool_block)
+
+    def _new_session(self):
+        _filter_insecure_warnings()
+        session = TimeoutSession(timeout=self.timeout)
+
+        adapter = self._adapter(self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        for host, pool_maxsize in self.host_pool_maxsize.items():
+            host_adapter = self._adapter(pool_maxsize)
+            session.mount(f"https://{host}/", host_adapter)
+            session.mount(f"http://{host}/", host_adapter)
 
-    def __init__(self) -> None:
-        self.CONNECTOR = Session()
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        if not self.compression:
+            session.headers["Accept-Encoding"] = "identity"
+
+        return session
+
+    def _session_key(self):
+        if self.session_scope == "thread":
+            # Keyed by an object of the thread local storage rather than the
+            # thread ident, which is reused once a thread ends
+            release = getattr(self._local, "release", None)
+            if release is None or release.pid != os.getpid():
+                release = self._local.release = _SessionRelease(self)
+            return release.key
+        if self.session_scope == "process":
+            return os.getpid()
+        return None
 
     def get_connector(self):
+        key = self._session_key()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._new_session()
+
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.get_connector().request(method, url, **kwargs)
+
+    def _discard(self, key):
+        with self._lock:
+            session = self._sessions.pop(key, None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _SessionRelease():
+    # Stored in the thread local storage of "thread" scoped connectors and
+    # collected when the thread ends, so finished pool threads do not keep
+    # their sessions alive. Its key is never given to another thread.
+
+    _keys = itertools.count()
+
+    def __init__(self, connector) -> None:
+        self.connector = connector
+        self.pid = os.getpid()
+        self.key = (self.pid, next(self._keys))
+
+    def __del__(self):
+        self.connector._discard(self.key)
+
+
+class CVMAsyncHttpClientConnector():
+
+    def __init__(
+            self,
+            max_concurrency: int = 20,
+            limit: int = 100,
+            limit_per_host: int = 10,
+            timeout=(10, 60),
+            keep_alive: bool = True,
+            keepalive_timeout: float = 15,
+            compression: bool = True) -> None:
+        self.max_concurrency = max_concurrency
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.keepalive_timeout = keepalive_timeout
+        self.compression = compression
+
+        self.CONNECTOR = None
+        self.semaphore = None
+        self._loop = None
+
+    def _ssl_context(self):
+        # Same relaxed TLS settings used by the requests based connector
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.set_ciphers(TLS_CIPHERS)
+        return context
+
+    async def get_connector(self):
+        # aiohttp sessions and semaphores are bound to the running event
+        # loop, so they are created on first use and again whenever the
+        # loop changes, e.g. between two asyncio.run calls.
+        loop = asyncio.get_running_loop()
+        if self.CONNECTOR is not None and self._loop is not loop:
+            await self.close()
+
+        if self.CONNECTOR is None or self.CONNECTOR.closed:
+            connect_timeout, read_timeout = (
+                self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout))
+
+            self.CONNECTOR = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    force_close=not self.keep_alive,
+                    keepalive_timeout=self.keepalive_timeout if self.keep_alive else None,
+                    ssl=self._ssl_context()),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+                headers=None if self.compression else {"Accept-Encoding": "identity"})
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
         return self.CONNECTOR
+
+    async def close(self):
+        session, loop = self.CONNECTOR, self._loop
+        self.CONNECTOR = None
+        self.semaphore = None
+        self._loop = None
+
+        if session is None or session.closed:
+            return
+        if loop is asyncio.get_running_loop() or loop.is_closed():
+            # The connections of a closed loop are dropped without I/O
+            await session.close()
+        elif loop.is_running():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        else:
+            # A stopped loop cannot run the close; its connections are left
+            # to it
+            session.detach()
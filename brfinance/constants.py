@@ -1,3 +1,5 @@
+import os
+
 REPORT_TYPE_MAPPER = {
     'ITR': 'EST_3',
     'DFP': 'EST_4'
@@ -8,4 +10,18 @@ BOOL_STRING_MAPPER = {
     False: "false"
 }
 
-ENET_URL = "https://www.rad.cvm.gov.br/ENET/"
+
+def _base_url(variable, default):
+    # BRFINANCE_BASE_URL points every host at a single server, such as the
+    # local mock in benchmarks/mock_server.py
+    url = os.environ.get(variable) or os.environ.get("BRFINANCE_BASE_URL") or default
+    return url.rstrip("/") + "/"
+
+
+RAD_CVM_URL = _base_url("BRFINANCE_RAD_CVM_URL", "https://www.rad.cvm.gov.br/")
+CVMWEB_URL = _base_url("BRFINANCE_CVMWEB_URL", "https://cvmweb.cvm.gov.br/")
+B3_ARQUIVOS_URL = _base_url("BRFINANCE_B3_ARQUIVOS_URL", "https://arquivos.b3.com.br/")
+B3_LISTADOS_URL = _base_url("BRFINANCE_B3_LISTADOS_URL", "https://sistemaswebb3-listados.b3.com.br/")
+
+ENET_URL = f"{RAD_CVM_URL}ENET/"
+ENETCONSULTA_URL = f"{RAD_CVM_URL}ENETCONSULTA/"
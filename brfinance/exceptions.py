@@ -0,0 +1,55 @@
+class BrFinanceError(Exception):
+    """Base class for the errors raised by brfinance."""
+
+
+class HTTPError(BrFinanceError):
+    """A request to CVM or B3 failed. `attempts` is the number of tries made
+    before giving up."""
+
+    def __init__(
+            self,
+            message,
+            url=None,
+            endpoint=None,
+            status_code=None,
+            response=None) -> None:
+        super().__init__(message)
+        self.url = url
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.response = response
+        self.attempts = 1
+
+
+class ConnectionFailedError(HTTPError):
+    """The connection failed or timed out before a response arrived."""
+
+
+class ClientError(HTTPError):
+    """The server answered with a 4xx status."""
+
+
+class ThrottledError(ClientError):
+    """The server answered 429 Too Many Requests."""
+
+    def __init__(self, *args, retry_after=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class ServerError(HTTPError):
+    """The server answered with a 5xx status."""
+
+    def __init__(self, *args, retry_after=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(BrFinanceError):
+    """Requests to `host` are being refused after repeated failures, until
+    `retry_at` (a `time.monotonic()` timestamp)."""
+
+    def __init__(self, host, retry_at) -> None:
+        super().__init__(f"Circuit open for {host}, too many consecutive failures")
+        self.host = host
+        self.retry_at = retry_at
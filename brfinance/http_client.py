@@ -1,27 +1,72 @@
 import logging
+import time
 
-from bs4 import BeautifulSoup
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
+from brfinance.cache import ResponseCache
 from brfinance.connector import CVMHttpClientConnector
-from brfinance.constants import BOOL_STRING_MAPPER, ENET_URL
-from brfinance.utils import extract_substring
+from brfinance.constants import (
+    B3_ARQUIVOS_URL,
+    B3_LISTADOS_URL,
+    BOOL_STRING_MAPPER,
+    CVMWEB_URL,
+    ENET_URL,
+    ENETCONSULTA_URL
+)
+from brfinance.exceptions import ConnectionFailedError
+from brfinance.metrics import METRICS
+from brfinance.parsers import parse_report_landing
+from brfinance.retry import NO_RETRY, CircuitBreaker, RetryPolicy, error_for_response, request_host
+from brfinance.throttling import RequestGovernor, TokenBucket
+from brfinance.utils import get_enet_download_url
 
 logger = logging.getLogger(__name__)
 
-
-class CVMHttpClient():
-    ENETCONSULTA_URL = "https://www.rad.cvm.gov.br/ENETCONSULTA/"
+SEARCH_HEADERS = {
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Connection': 'keep-alive',
+    'Content-Type': 'application/json; charset=UTF-8',
+    'DNT': '1',
+    'sec-ch-ua': '" Not A;Brand";v="99", "Chromium";v="96", "Google Chrome";v="96"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"Windows"',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-origin',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
+    'x-dtpc': '28$428327064_275h18vMIPKIVDJMJWUHHIHJSUAWKKKMKVABKHO-0e0',
+    'X-Requested-With': 'XMLHttpRequest'}
+
+CADASTRO_INSTRUMENTOS_HEADERS = {
+    'authority': 'arquivos.b3.com.br',
+    'accept': 'application/json, text/plain, */*',
+    'accept-encoding': 'gzip, deflate, br',
+    'accept-language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'dnt': '1,',
+    'sec-ch-ua': '" Not A;Brand";v="99", "Chromium";v="96", "Google Chrome";v="96"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': "Windows",
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
+}
+
+
+class BaseCVMHttpClient():
+    ENETCONSULTA_URL = ENETCONSULTA_URL
     LISTAR_DOCUMENTOS_URL = f"{ENET_URL}frmConsultaExternaCVM.aspx/ListarDocumentos"
     ENET_CONSULTA_EXTERNA = f"{ENET_URL}frmConsultaExternaCVM.aspx"
+    CADASTRO_INSTRUMENTOS_TOKEN_URL = f"{B3_ARQUIVOS_URL}api/download/requestname?fileName=InstrumentsConsolidated&date={{ref_date}}"
+    CADASTRO_INSTRUMENTOS_URL = f"{B3_ARQUIVOS_URL}api/download/?token={{token}}"
+    EMISSOR_URL = f"{B3_LISTADOS_URL}isinProxy/IsinCall/GetFileDownload/NTE3ODA="
+    PESQUISA_CIA_ABERTA_URL = f"{CVMWEB_URL}SWB/Sistemas/SCW/CPublica/CiaAb/ResultBuscaParticCiaAb.aspx?CNPJNome=&TipoConsult=C"
 
-    def __init__(
-            self,
-            session: CVMHttpClientConnector):
-
-        self.session = session
-
-    def get_search_results(
+    def _search_results_payload(
             self,
             cod_cvm: list,
             start_date: date,
@@ -55,23 +100,6 @@ class CVMHttpClient():
         categoria = category
         ultimaDtRef = BOOL_STRING_MAPPER[last_ref_date]
 
-        headers = {
-            'Accept': 'application/json, text/javascript, */*; q=0.01',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Connection': 'keep-alive',
-            'Content-Type': 'application/json; charset=UTF-8',
-            'DNT': '1',
-            'sec-ch-ua': '" Not A;Brand";v="99", "Chromium";v="96", "Google Chrome";v="96"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-origin',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36',
-            'x-dtpc': '28$428327064_275h18vMIPKIVDJMJWUHHIHJSUAWKKKMKVABKHO-0e0',
-            'X-Requested-With': 'XMLHttpRequest'}
-
         data = "{" + f"""
                 dataDe: '{dataDe}',
                 dataAte: '{dataAte}' ,
@@ -92,106 +120,255 @@ class CVMHttpClient():
                 versaoCaptcha: ''
                 """ + "}"
 
-        resp = self.session.post(
-            self.LISTAR_DOCUMENTOS_URL, data=data, headers=headers, verify=False)
-        return resp
+        return data
 
-    def get_reports(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
-        url = f"{self.ENETCONSULTA_URL}frmGerenciaPaginaFRE.aspx?NumeroSequencialDocumento={NumeroSequencialDocumento}&CodigoTipoInstituicao={CodigoTipoInstituicao}"
+    def _record_cache(self, endpoint, hit):
+        METRICS.increment(
+            "cache_hits_total" if hit else "cache_misses_total", endpoint=endpoint or "other")
 
-        payload = {}
-        headers = {}
+    def _record_request(self, method, endpoint, status, duration, size=None):
+        labels = dict(endpoint=endpoint or "other", method=method, status=str(status))
+        METRICS.increment("http_requests_total", **labels)
+        METRICS.observe("http_request_duration_seconds", duration, **labels)
+        if size is not None:
+            METRICS.observe("http_response_bytes", size, endpoint=endpoint or "other")
 
-        response = self.session.get(
-            url, headers=headers, data=payload, verify=False)
+    def _record_retry(self, endpoint, error):
+        METRICS.increment(
+            "http_retries_total", endpoint=endpoint or "other",
+            reason=str(error.status_code or "connection"))
 
-        soup = BeautifulSoup(response.text, features="lxml")
-        hdnNumeroSequencialDocumento = soup.find(
-            id='hdnNumeroSequencialDocumento').attrs["value"]
-        hdnCodigoTipoDocumento = soup.find(
-            id='hdnCodigoTipoDocumento').attrs["value"]
-        # hdnCodigoCvm = soup.find(id='hdnCodigoCvm').attrs["value"]
-        # hdnDescricaoDocumento = soup.find(id='hdnDescricaoDocumento').attrs["value"]
-        hdnCodigoInstituicao = soup.find(
-            id='hdnCodigoInstituicao').attrs["value"]
-        hdnHash = soup.find(id='hdnHash').attrs["value"]
+    def _report_landing_url(self, NumeroSequencialDocumento, CodigoTipoInstituicao):
+        return f"{self.ENETCONSULTA_URL}frmGerenciaPaginaFRE.aspx?NumeroSequencialDocumento={NumeroSequencialDocumento}&CodigoTipoInstituicao={CodigoTipoInstituicao}"
 
-        NumeroSequencialRegistroCvm = extract_substring(
-            "NumeroSequencialRegistroCvm=", "&", response.text)
+    def _report_urls(self, html, reports_list=None):
+        with METRICS.timer("parse_duration_seconds", parser="report_landing"):
+            return self._parse_report_urls(html, reports_list)
 
-        end_of_report_url = f"&CodTipoDocumento={hdnCodigoTipoDocumento}&NumeroSequencialDocumento={hdnNumeroSequencialDocumento}&NumeroSequencialRegistroCvm={NumeroSequencialRegistroCvm}&CodigoTipoInstituicao={hdnCodigoInstituicao}&Hash={hdnHash}"
+    def _parse_report_urls(self, html, reports_list=None):
+        fields = parse_report_landing(html)
 
-        reports = {}
-        opt = str(BeautifulSoup(response.text,
-                  features="lxml").find(id='cmbQuadro'))
-        reports_options = BeautifulSoup(opt, features="lxml")
-        reports_options = reports_options.find_all('option')
+        end_of_report_url = f"&CodTipoDocumento={fields['hdnCodigoTipoDocumento']}&NumeroSequencialDocumento={fields['hdnNumeroSequencialDocumento']}&NumeroSequencialRegistroCvm={fields['NumeroSequencialRegistroCvm']}&CodigoTipoInstituicao={fields['hdnCodigoInstituicao']}&Hash={fields['hdnHash']}"
 
+        reports_options = fields["cmbQuadro"]
         if (reports_list is None):
-            reports_list = [item.getText() for item in reports_options]
+            reports_list = [text for _, text in reports_options]
 
-        for item in reports_options:
-            if (item.getText() in reports_list):
-                report_url = self.ENETCONSULTA_URL + \
-                    item.attrs["value"] + end_of_report_url
-                report_html_response = self.session.get(
-                    report_url, headers=headers, verify=False)
-                reports[item.getText()] = report_html_response
+        report_urls = {}
+        for value, text in reports_options:
+            if (text in reports_list):
+                report_urls[text] = self.ENETCONSULTA_URL + value + end_of_report_url
 
-        return reports
+        return report_urls
+
+
+class CVMHttpClient(BaseCVMHttpClient):
+
+    def __init__(
+            self,
+            session: CVMHttpClientConnector,
+            max_workers: int = 8,
+            rate_limiter: TokenBucket = None,
+            cache: ResponseCache = None,
+            retry_policy: RetryPolicy = None,
+            circuit_breaker: CircuitBreaker = None,
+            governor: RequestGovernor = None):
+
+        self.session = session
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.retry_policy = retry_policy or NO_RETRY
+        self.circuit_breaker = circuit_breaker
+        self.governor = governor
+
+    def _send(self, method, url, host, endpoint=None, **kwargs):
+        if self.governor is None:
+            return self._timed_request(method, url, endpoint, **kwargs)
+
+        with self.governor.limit(host):
+            return self._timed_request(method, url, endpoint, **kwargs)
+
+    def _timed_request(self, method, url, endpoint, **kwargs):
+        # Timed after any throttling wait, so it only measures the network
+        start = time.perf_counter()
+        status = "error"
+        size = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            if kwargs.get("stream"):
+                size = response.headers.get("Content-Length")
+                size = int(size) if size and size.isdigit() else None
+            else:
+                size = len(response.content)
+            return response
+        finally:
+            self._record_request(method, endpoint, status, time.perf_counter() - start, size)
+
+    def _attempt(self, method, url, host, endpoint, **kwargs):
+        try:
+            response = self._send(method, url, host, endpoint, **kwargs)
+        except requests.RequestException as exc:
+            error = ConnectionFailedError(
+                f"Request to {url} failed: {exc}", url=url, endpoint=endpoint)
+            error.__cause__ = exc
+            return None, error
+
+        return response, error_for_response(response, endpoint)
+
+    def _request(self, method, url, endpoint=None, idempotent=None, **kwargs):
+        cache_key = None
+        # Streamed bodies are consumed by the caller, so they are never cached
+        if (self.cache is not None and self.cache.is_cacheable(endpoint, kwargs.get("headers"))
+                and not kwargs.get("stream")):
+            cache_key = self.cache.key(method, url, kwargs.get("data"))
+            cached_response = self.cache.get(cache_key)
+            self._record_cache(endpoint, cached_response is not None)
+            if cached_response is not None:
+                return cached_response
+
+        kwargs.setdefault("verify", False)
+        host = request_host(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            trial = self.circuit_breaker is not None and self.circuit_breaker.before_request(host)
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                response, error = self._attempt(method, url, host, endpoint, **kwargs)
+            except BaseException:
+                # Any other error must not leave the circuit half-open forever
+                if trial:
+                    self.circuit_breaker.release_trial(host)
+                raise
+
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record(host, error)
+
+            if error is None:
+                break
+
+            error.attempts = attempt
+            delay = self.retry_policy.retry_delay(method, attempt, error, idempotent)
+            if delay is None:
+                raise error
+
+            if response is not None:
+                response.close()
+            self._record_retry(endpoint, error)
+            logger.warning(f"{error}, retrying in {delay:.1f}s (attempt {attempt})")
+            time.sleep(delay)
+
+        # 304 answers to conditional requests carry no body to cache
+        if cache_key is not None and response.status_code != 304:
+            self.cache.set(cache_key, endpoint, response)
+
+        return response
+
+    def get_search_results(
+            self,
+            cod_cvm: list,
+            start_date: date,
+            end_date: date,
+            participant_type: str,
+            category: str,
+            last_ref_date
+    ):
+        data = self._search_results_payload(
+            cod_cvm=cod_cvm,
+            start_date=start_date,
+            end_date=end_date,
+            participant_type=participant_type,
+            category=category,
+            last_ref_date=last_ref_date)
+
+        # ListarDocumentos is a read-only query, safe to retry despite the POST
+        resp = self._request(
+            "POST", self.LISTAR_DOCUMENTOS_URL, endpoint="search", idempotent=True,
+            data=data, headers=SEARCH_HEADERS)
+        return resp
+
+    def get_report_landing_page(self, NumeroSequencialDocumento, CodigoTipoInstituicao):
+        url = self._report_landing_url(
+            NumeroSequencialDocumento, CodigoTipoInstituicao)
+        return self._request("GET", url, endpoint="report_landing")
+
+    def get_report_page(self, report_url):
+        return self._request("GET", report_url, endpoint="report")
+
+    def get_reports(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
+        return self.get_report_pages(
+            NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list)[0]
+
+    def get_report_pages(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
+        """Returns ({statement: response}, {statement: exception}), so
+        callers can tell a partial download from a complete one."""
+        response = self.get_report_landing_page(
+            NumeroSequencialDocumento, CodigoTipoInstituicao)
+        report_urls = self._report_urls(response.text, reports_list)
+
+        if not report_urls:
+            return {}, {}
+
+        with ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(report_urls))) as executor:
+            futures = {
+                report: executor.submit(self.get_report_page, report_url)
+                for report, report_url in report_urls.items()}
+
+            reports = {}
+            errors = {}
+            for report, future in futures.items():
+                try:
+                    reports[report] = future.result()
+                except Exception as exc:
+                    # A failed statement must not discard the ones already downloaded
+                    logger.exception(
+                        f"Failed to download '{report}' for document {NumeroSequencialDocumento}")
+                    errors[report] = exc
+
+        return reports, errors
+
+    def get_document_package(self, numSequencia, numVersao, numProtocolo, descTipo, stream: bool = False):
+        url = get_enet_download_url(numSequencia, numVersao, numProtocolo, descTipo)
+        return self._request("GET", url, endpoint="document_package", stream=stream)
 
     def get_enet_consulta_externa(self):
-        consulta_enet_response = self.session.get(
-            self.ENET_CONSULTA_EXTERNA, verify=False)
+        consulta_enet_response = self._request(
+            "GET", self.ENET_CONSULTA_EXTERNA, endpoint="consulta_externa")
         return consulta_enet_response
 
     def get_cadastro_de_instrumentos_token(self, ref_date: date):
         ref_date = ref_date.strftime("%Y-%m-%d")
 
-        token_url = f"https://arquivos.b3.com.br/api/download/requestname?fileName=InstrumentsConsolidated&date={ref_date}"
-        response = self.session.get(token_url, verify=False)
+        token_url = self.CADASTRO_INSTRUMENTOS_TOKEN_URL.format(ref_date=ref_date)
+        response = self._request(
+            "GET", token_url, endpoint="cadastro_instrumentos_token")
 
-        if response.ok:
-            return response
+        return response
 
-    def get_cadastro_de_instrumentos(self, token: str):
-        download_url = f"https://arquivos.b3.com.br/api/download/?token={token}"
-
-        headers = {
-            'authority': 'arquivos.b3.com.br',
-            'accept': 'application/json, text/plain, */*',
-            'accept-encoding': 'gzip, deflate, br',
-            'accept-language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'dnt': '1,',
-            'sec-ch-ua': '" Not A;Brand";v="99", "Chromium";v="96", "Google Chrome";v="96"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': "Windows",
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-origin',
-            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
-        }
-
-        data = "{" + f"token: '{token}'" + "}"
-
-        response = self.session.get(
+    def get_cadastro_de_instrumentos(self, token: str, stream: bool = False, headers: dict = None):
+        download_url = self.CADASTRO_INSTRUMENTOS_URL.format(token=token)
+
+        response = self._request(
+            "GET",
             download_url,
-            headers=headers,
-            verify=False)
+            endpoint="cadastro_instrumentos",
+            headers={**CADASTRO_INSTRUMENTOS_HEADERS, **(headers or {})},
+            stream=stream)
 
-        if response.ok:
-            return response
+        return response
 
-    def get_emissor(self):
-        url = f"https://sistemaswebb3-listados.b3.com.br/isinProxy/IsinCall/GetFileDownload/NTE3ODA="
-        response = self.session.get(url, verify=False)
+    def get_emissor(self, stream: bool = False, headers: dict = None):
+        response = self._request(
+            "GET", self.EMISSOR_URL, endpoint="emissor", stream=stream, headers=headers)
 
-        if response.ok:
-            return response
+        return response
 
     def get_pesquisa_cia_aberta(self):
-        url = f"https://cvmweb.cvm.gov.br/SWB/Sistemas/SCW/CPublica/CiaAb/ResultBuscaParticCiaAb.aspx?CNPJNome=&TipoConsult=C"
-        response = self.session.get(url, verify=False)
+        response = self._request(
+            "GET", self.PESQUISA_CIA_ABERTA_URL, endpoint="pesquisa_cia_aberta")
 
-        if response.ok:
-            return response
+        return response
@@ -0,0 +1,36 @@
+import json
+
+
+class BufferedResponse():
+    """Fully read HTTP response exposing the subset of the
+    `requests.Response` interface used by the `Get*Response` parsers."""
+
+    def __init__(self, url, status_code, headers, content, encoding=None) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.headers = dict(headers)
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        if self.encoding:
+            return self.content.decode(self.encoding, errors="replace")
+        try:
+            return self.content.decode("utf-8")
+        except UnicodeDecodeError:
+            return self.content.decode("latin-1")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
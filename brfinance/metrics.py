@@ -0,0 +1,240 @@
+import bisect
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds for durations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+HISTOGRAM_BUCKETS = {
+    "http_response_bytes": SIZE_BUCKETS,
+    "parse_rows": (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+}
+
+# Prometheus requires the same label names on every sample of a metric, so
+# labels that do not apply to a value (such as the report of the search
+# parser) are recorded as "".
+METRIC_LABELS = {
+    "http_requests_total": ("endpoint", "method", "status"),
+    "http_request_duration_seconds": ("endpoint", "method", "status"),
+    "http_response_bytes": ("endpoint",),
+    "http_retries_total": ("endpoint", "reason"),
+    "cache_hits_total": ("endpoint",),
+    "cache_misses_total": ("endpoint",),
+    "parse_duration_seconds": ("parser", "report"),
+    "parse_rows": ("parser", "report"),
+    "snapshot_requests_total": ("file", "result"),
+}
+
+
+def _metric_labels(name, labels):
+    return {**{label: "" for label in METRIC_LABELS.get(name, ())}, **labels}
+
+
+class Histogram():
+
+    def __init__(self, buckets=DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "buckets": dict(zip((*self.buckets, float("inf")), self.bucket_counts)),
+        }
+
+
+class Metrics():
+    """In-process counters and histograms keyed by metric name and labels.
+
+    Hooks are called as `hook(kind, name, value, labels)` for every
+    recorded value, with kind "counter" or "histogram", and are how the
+    Prometheus and OpenTelemetry adapters receive data."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+
+    def add_hook(self, hook):
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def _notify(self, kind, name, value, labels):
+        # A failing exporter must never break the request or parse it measures
+        for hook in self._hooks:
+            try:
+                hook(kind, name, value, labels)
+            except Exception:
+                logger.warning(f"Metrics hook {hook!r} failed for {name}", exc_info=True)
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+
+        labels = _metric_labels(name, labels)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._notify("counter", name, value, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        labels = _metric_labels(name, labels)
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(
+                    HISTOGRAM_BUCKETS.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+        self._notify("histogram", name, value, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Returns {"counters": [...], "histograms": [...]}, each entry with
+        the metric name, its labels and its value(s)."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.as_dict()}
+                    for (name, labels), histogram in sorted(self._histograms.items())],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+METRICS = Metrics()
+
+
+class PrometheusAdapter():
+    """Mirrors the recorded metrics into prometheus_client collectors,
+    prefixed with `namespace`."""
+
+    def __init__(self, metrics: Metrics = METRICS, registry=None, namespace: str = "brfinance") -> None:
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImportError(
+                "PrometheusAdapter requires prometheus_client. Install it with `pip install brfinance[prometheus]`.")
+
+        self._prometheus = prometheus_client
+        self.registry = registry or prometheus_client.REGISTRY
+        self.namespace = namespace
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self.metrics = metrics
+        metrics.add_hook(self)
+
+    def _collector(self, kind, name, labels):
+        # One collector per metric, with the label names of METRIC_LABELS
+        key = (kind, name)
+        with self._lock:
+            collector = self._collectors.get(key)
+            if collector is None:
+                if kind == "counter":
+                    collector = self._prometheus.Counter(
+                        name, name, sorted(labels), namespace=self.namespace, registry=self.registry)
+                else:
+                    collector = self._prometheus.Histogram(
+                        name, name, sorted(labels), namespace=self.namespace, registry=self.registry,
+                        buckets=HISTOGRAM_BUCKETS.get(name, DEFAULT_BUCKETS))
+                self._collectors[key] = collector
+            return collector
+
+    def __call__(self, kind, name, value, labels):
+        collector = self._collector(kind, name, labels)
+        if labels:
+            collector = collector.labels(**{label: str(value) for label, value in labels.items()})
+
+        if kind == "counter":
+            collector.inc(value)
+        else:
+            collector.observe(value)
+
+    def close(self):
+        self.metrics.remove_hook(self)
+
+
+class OpenTelemetryAdapter():
+    """Mirrors the recorded metrics into OpenTelemetry counters and
+    histograms created from `meter` (the global meter provider's by
+    default)."""
+
+    def __init__(self, metrics: Metrics = METRICS, meter=None) -> None:
+        try:
+            from opentelemetry import metrics as otel_metrics
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetryAdapter requires opentelemetry-api. "
+                "Install it with `pip install brfinance[opentelemetry]`.")
+
+        self.meter = meter or otel_metrics.get_meter("brfinance")
+        self._instruments = {}
+        self._lock = threading.Lock()
+        self.metrics = metrics
+        metrics.add_hook(self)
+
+    def _instrument(self, kind, name):
+        with self._lock:
+            instrument = self._instruments.get((kind, name))
+            if instrument is None:
+                if kind == "counter":
+                    instrument = self.meter.create_counter(f"brfinance.{name}")
+                else:
+                    instrument = self.meter.create_histogram(f"brfinance.{name}")
+                self._instruments[(kind, name)] = instrument
+            return instrument
+
+    def __call__(self, kind, name, value, labels):
+        instrument = self._instrument(kind, name)
+        attributes = {label: str(value) for label, value in labels.items()}
+
+        if kind == "counter":
+            instrument.add(value, attributes=attributes)
+        else:
+            instrument.record(value, attributes=attributes)
+
+    def close(self):
+        self.metrics.remove_hook(self)
@@ -0,0 +1,282 @@
+import os
+import threading
+
+from brfinance._lazy import lazy_import
+from brfinance.parsers import DMPL_STATEMENT, TEXT_COLUMNS
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+PANEL_COLUMNS = ["cod_cvm", "ref_date", "statement", "Conta", "Descrição", "Valor",
+                 "currency_unit", "numero_seq_documento", "version"]
+
+# Repeated on every row, stored as categoricals (dictionary encoded in Parquet)
+PANEL_CATEGORIES = ["cod_cvm", "statement", "Conta", "Descrição", "currency_unit",
+                    "numero_seq_documento"]
+
+# A refiled document replaces every row of the statements it carries
+DOCUMENT_KEY = ["cod_cvm", "ref_date", "statement"]
+
+
+def _statement_values(df):
+    # The first value column: "Valor", or the most recent period when the
+    # statement was parsed with previous_results
+    for column in df.columns:
+        if column.strip() not in TEXT_COLUMNS and column != "currency_unit":
+            return df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.full(len(df), np.nan)
+
+
+def _empty_panel():
+    return pd.DataFrame({
+        **{column: pd.Categorical([]) for column in PANEL_CATEGORIES},
+        "ref_date": pd.Series(dtype="datetime64[ns]"),
+        "Valor": pd.Series(dtype="float64"),
+        "version": pd.Series(dtype="int64"),
+    })[PANEL_COLUMNS]
+
+
+def _concat(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return _empty_panel()
+    if len(frames) == 1:
+        return frames[0]
+
+    # Categories are unified first, so the result stays categorical
+    for column in PANEL_CATEGORIES:
+        categories = pd.api.types.union_categoricals(
+            [frame[column] for frame in frames]).categories
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)})
+                  for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _latest(frame, order):
+    # Keeps, for every company, date and statement, the rows of the highest
+    # version, and among equal versions the ones added last
+    if frame.empty:
+        return frame
+
+    frame = frame.assign(_order=order)
+    groups = frame.groupby(DOCUMENT_KEY, observed=True, sort=False)
+    frame = frame[frame["version"] == groups["version"].transform("max")]
+    groups = frame.groupby(DOCUMENT_KEY, observed=True, sort=False)
+    frame = frame[frame["_order"] == groups["_order"].transform("max")]
+
+    return frame.drop(columns="_order").reset_index(drop=True)
+
+
+class FinancialPanel():
+    """Statements of many documents in a single long format table, one row
+    per company, reference date, statement and account. Text columns are
+    categoricals and values float64. Documents can be added as they are
+    downloaded, and the panel saved to a Parquet dataset partitioned by
+    ref_date, which is updated incrementally by `to_parquet`.
+
+    The DMPL has no single value column and is not part of the panel."""
+
+    def __init__(self, data: "pd.DataFrame" = None) -> None:
+        self._data = _empty_panel() if data is None else data[PANEL_COLUMNS]
+        self._pending = []
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def add_document(
+            self,
+            reports: dict,
+            cod_cvm,
+            ref_date,
+            numero_seq_documento=None,
+            version: int = 0):
+        """Adds the statements of one document, as returned by get_report,
+        get_report_package or get_reports_bulk. Returns the number of rows."""
+
+        ref_date = pd.Timestamp(ref_date)
+        columns = {column: [] for column in ("statement", "Conta", "Descrição", "Valor",
+                                             "currency_unit")}
+        for statement, df in reports.items():
+            if statement == DMPL_STATEMENT or df is None or df.empty:
+                continue
+
+            columns["statement"].append(np.full(len(df), statement, dtype=object))
+            columns["Conta"].append(df["Conta"].to_numpy(dtype=object))
+            columns["Descrição"].append(df["Descrição"].to_numpy(dtype=object))
+            columns["Valor"].append(_statement_values(df))
+            columns["currency_unit"].append(
+                df["currency_unit"].to_numpy(dtype=object) if "currency_unit" in df
+                else np.full(len(df), None, dtype=object))
+
+        if not columns["statement"]:
+            return 0
+
+        rows = sum(len(values) for values in columns["Conta"])
+        chunk = {column: np.concatenate(values) for column, values in columns.items()}
+        chunk.update(
+            cod_cvm=str(cod_cvm).zfill(6),
+            ref_date=ref_date,
+            numero_seq_documento=None if pd.isnull(numero_seq_documento) else str(numero_seq_documento),
+            version=int(version) if not pd.isnull(version) else 0,
+            rows=rows)
+
+        with self._lock:
+            self._pending.append(chunk)
+            self._changed.add(ref_date)
+
+        return rows
+
+    def add_reports(self, results, documents: "pd.DataFrame"):
+        """Adds the BulkReportResult items of get_reports_bulk (or the reports
+        of a SyncResult). `documents` is the search result the documents came
+        from, which holds their cod_cvm, ref_date and version. Failed
+        statements are left out. Returns the number of rows added."""
+
+        documents = documents[pd.to_numeric(
+            documents['numero_seq_documento'], errors='coerce').notnull()]
+        metadata = {
+            str(numero_seq): (cod_cvm, ref_date, pd.to_numeric(version, errors='coerce'))
+            for numero_seq, cod_cvm, ref_date, version in zip(
+                documents['numero_seq_documento'], documents['cod_cvm'],
+                documents['ref_date'], documents['version'])}
+
+        rows = 0
+        for result in results:
+            if str(result.NumeroSequencialDocumento) not in metadata:
+                raise KeyError(f"Document {result.NumeroSequencialDocumento} is not in documents")
+
+            cod_cvm, ref_date, version = metadata[str(result.NumeroSequencialDocumento)]
+            rows += self.add_document(
+                result.data, cod_cvm, ref_date, result.NumeroSequencialDocumento, version)
+
+        return rows
+
+    def _build_pending(self, pending):
+        # One categorical per column for every document added since the last
+        # call, instead of a concat of many small object frames
+        repeat = [chunk["rows"] for chunk in pending]
+        data = {
+            column: np.concatenate([chunk[column] for chunk in pending])
+            for column in ("statement", "Conta", "Descrição", "Valor", "currency_unit")}
+        for column in ("statement", "Conta", "Descrição", "currency_unit"):
+            data[column] = pd.Categorical(data[column])
+
+        # Document level values are encoded once per document and repeated
+        for column in ("cod_cvm", "numero_seq_documento"):
+            codes, categories = pd.factorize(
+                np.array([chunk[column] for chunk in pending], dtype=object))
+            data[column] = pd.Categorical.from_codes(np.repeat(codes, repeat), categories)
+        data["ref_date"] = np.repeat(np.array(
+            [chunk["ref_date"].to_datetime64() for chunk in pending], dtype="datetime64[ns]"), repeat)
+        data["version"] = np.repeat(
+            np.array([chunk["version"] for chunk in pending], dtype=np.int64), repeat)
+
+        return pd.DataFrame(data)[PANEL_COLUMNS], np.repeat(np.arange(1, len(pending) + 1), repeat)
+
+    def data(self):
+        with self._lock:
+            if self._pending:
+                new, order = self._build_pending(self._pending)
+                self._data = _latest(
+                    _concat([self._data, new]),
+                    np.concatenate([np.zeros(len(self._data), dtype=np.int64), order]))
+                self._pending = []
+
+            return self._data
+
+    def __len__(self):
+        return len(self.data())
+
+    def to_parquet(self, path: str):
+        """Writes the panel to a Parquet dataset with one directory per
+        ref_date. Only the dates that received documents since the panel was
+        loaded are rewritten, merged with the rows already stored for them."""
+
+        pa, pq, ds = _pyarrow()
+
+        data = self.data()
+        with self._lock:
+            changed = set(self._changed)
+
+        if os.path.exists(path):
+            data = data[data["ref_date"].isin(changed)]
+            if data.empty:
+                return path
+
+            stored = _read_dataset(path, [("ref_date", "in", [date.date() for date in changed])])
+            data = _latest(
+                _concat([stored, data]),
+                np.concatenate([np.zeros(len(stored), dtype=np.int64), np.ones(len(data), dtype=np.int64)]))
+
+        table = pa.Table.from_pandas(data, schema=_parquet_schema(pa), preserve_index=False)
+        pq.write_to_dataset(
+            table, path,
+            partitioning=ds.partitioning(pa.schema([("ref_date", pa.date32())]), flavor="hive"),
+            existing_data_behavior="delete_matching")
+
+        with self._lock:
+            self._changed -= changed
+
+        return path
+
+    @classmethod
+    def read_parquet(
+            cls,
+            path: str,
+            cod_cvm: list = None,
+            start_date=None,
+            end_date=None,
+            statements: list = None):
+        """Loads a dataset written by `to_parquet`. The date filters only
+        open the matching ref_date directories."""
+
+        filters = []
+        if cod_cvm is not None:
+            filters.append(("cod_cvm", "in", [str(code).zfill(6) for code in cod_cvm]))
+        if start_date is not None:
+            filters.append(("ref_date", ">=", pd.Timestamp(start_date).date()))
+        if end_date is not None:
+            filters.append(("ref_date", "<=", pd.Timestamp(end_date).date()))
+        if statements is not None:
+            filters.append(("statement", "in", list(statements)))
+
+        return cls(_read_dataset(path, filters or None))
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "FinancialPanel Parquet datasets require pyarrow. Install it with `pip install brfinance[parquet]`.")
+
+    return pa, pq, ds
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        (column, pa.dictionary(pa.int32(), pa.string()) if column in PANEL_CATEGORIES
+         else pa.date32() if column == "ref_date"
+         else pa.float64() if column == "Valor"
+         else pa.int64())
+        for column in PANEL_COLUMNS])
+
+
+def _read_dataset(path, filters):
+    pa, pq, ds = _pyarrow()
+
+    table = pq.read_table(
+        path,
+        filters=filters,
+        partitioning=ds.partitioning(pa.schema([("ref_date", pa.date32())]), flavor="hive"))
+    data = table.to_pandas()
+
+    for column in PANEL_CATEGORIES:
+        data[column] = data[column].astype("category")
+    data["ref_date"] = pd.to_datetime(data["ref_date"]).astype("datetime64[ns]")
+    data["Valor"] = data["Valor"].astype(np.float64)
+    data["version"] = data["version"].astype(np.int64)
+
+    return data[PANEL_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,401 @@
+import html as html_lib
+import re
+import zipfile
+
+from brfinance._lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+etree = lazy_import("lxml.etree")
+
+# Mirrors the whitespace normalization and table lookup done by pd.read_html,
+# so the fast parser yields the same frames as the previous pandas path.
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+_CELL_TAGS = ("td", "th")
+
+TEXT_COLUMNS = ("Conta", "Descrição")
+
+DFC_STATEMENT = "Demonstração do Fluxo de Caixa"
+DMPL_STATEMENT = "Demonstração das Mutações do Patrimônio Líquido"
+
+# Quoted attribute values may contain ">", so tags are matched attribute by
+# attribute instead of up to the first ">".
+_TAG_ATTRIBUTES = r"""(?:[^>"']|"[^"]*"|'[^']*')*"""
+_RE_FORM_FIELD = re.compile(
+    rf"<input\b(?P<input>{_TAG_ATTRIBUTES})>"
+    rf"|<select\b(?P<select>{_TAG_ATTRIBUTES})>(?P<options>.*?)</select>",
+    re.IGNORECASE | re.DOTALL)
+_RE_ATTRIBUTE = re.compile(
+    r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+_RE_OPTION = re.compile(
+    r"<option\b(?P<attributes>[^>]*)>(?P<text>.*?)(?=</option>|<option\b|</select>|$)",
+    re.IGNORECASE | re.DOTALL)
+_RE_TAG = re.compile(r"<[^>]*>")
+
+
+def _build_doc(html):
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+
+    parser = etree.HTMLParser(recover=True, encoding="utf-8")
+    return etree.fromstring(html, parser=parser)
+
+
+def _is_hidden(element):
+    return "display:none" in element.attrib.get("style", "").replace(" ", "")
+
+
+def _first_text(element):
+    if element.text:
+        return element.text
+    for child in element:
+        if child.tail:
+            return child.tail
+    return ""
+
+
+def _has_text(table):
+    # Same as pandas' "//table//*[re:test(text(), '.+')]" lookup
+    for element in table.iterdescendants():
+        if isinstance(element.tag, str) and _first_text(element).strip("\n"):
+            return True
+    return False
+
+
+def _find_tables(doc):
+    tables = [table for table in doc.iter("table")
+              if _has_text(table) and not _is_hidden(table)]
+
+    for table in tables:
+        for element in table.xpath(".//*[@style]"):
+            if _is_hidden(element) and element.getparent() is not None:
+                element.getparent().remove(element)
+
+    return tables
+
+
+def _cell_text(cell):
+    return _RE_WHITESPACE.sub(" ", "".join(cell.itertext()).strip())
+
+
+def _cells(row):
+    return [cell for cell in row if cell.tag in _CELL_TAGS]
+
+
+def _table_rows(table):
+    for br in table.iter("br"):
+        br.tail = "\n" + (br.tail or "")
+
+    rows = []
+    for thead in table.xpath(".//thead"):
+        rows.extend(thead.xpath("./tr"))
+        if _cells(thead):
+            rows.append(thead)
+
+    rows.extend(table.xpath(".//tbody//tr"))
+    rows.extend(table.xpath("./tr"))
+    rows.extend(table.xpath(".//tfoot//tr"))
+
+    texts = []
+    remainder = []  # (index, text, rows left) for cells with rowspan > 1
+    for row in rows:
+        row_texts = []
+        next_remainder = []
+        index = 0
+
+        for cell in _cells(row):
+            while remainder and remainder[0][0] <= index:
+                prev_index, prev_text, prev_rowspan = remainder.pop(0)
+                row_texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_index, prev_text, prev_rowspan - 1))
+                index += 1
+
+            text = _cell_text(cell)
+            rowspan = int(cell.get("rowspan") or 1)
+            for _ in range(int(cell.get("colspan") or 1)):
+                row_texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+
+        for prev_index, prev_text, prev_rowspan in remainder:
+            row_texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_index, prev_text, prev_rowspan - 1))
+
+        texts.append(row_texts)
+        remainder = next_remainder
+
+    return texts
+
+
+def _column_names(header):
+    names = []
+    seen = {}
+    for index, name in enumerate(header):
+        if name == "":
+            name = f"Unnamed: {index}"
+
+        base = name
+        count = seen.get(base, 0)
+        while name in seen:
+            count += 1
+            name = f"{base}.{count}"
+        seen[base] = count
+        seen[name] = 0
+        names.append(name)
+
+    return names
+
+
+def _attributes(tag):
+    return {name.lower(): html_lib.unescape(double or single or bare)
+            for name, double, single, bare in _RE_ATTRIBUTE.findall(tag)}
+
+
+def parse_options(html):
+    """Returns the (value, text) pairs of the <option> elements in `html`."""
+    return [(_attributes(match.group("attributes")).get("value", ""),
+             html_lib.unescape(_RE_TAG.sub("", match.group("text"))))
+            for match in _RE_OPTION.finditer(html)]
+
+
+def extract_form_fields(html, ids):
+    """Single regex pass over `html` returning, for each element id in
+    `ids`, the value of an <input> or the (value, text) options of a
+    <select>. Scanning stops as soon as every id has been found."""
+    ids = set(ids)
+    fields = {}
+
+    for match in _RE_FORM_FIELD.finditer(html):
+        if match.group("input") is not None:
+            attributes = _attributes(match.group("input"))
+            if attributes.get("id") in ids:
+                fields[attributes["id"]] = attributes.get("value", "")
+        else:
+            attributes = _attributes(match.group("select"))
+            if attributes.get("id") in ids:
+                fields[attributes["id"]] = parse_options(match.group("options"))
+
+        if len(fields) == len(ids):
+            break
+
+    return fields
+
+
+REPORT_LANDING_FIELDS = [
+    "hdnNumeroSequencialDocumento", "hdnCodigoTipoDocumento", "hdnCodigoInstituicao", "hdnHash",
+    "cmbQuadro"]
+_REGISTRO_CVM = "NumeroSequencialRegistroCvm="
+
+
+def parse_report_landing(html):
+    """Hidden fields, statement options (`cmbQuadro`) and
+    NumeroSequencialRegistroCvm of a frmGerenciaPaginaFRE.aspx page, from
+    a single scan of the form fields."""
+
+    fields = extract_form_fields(html, REPORT_LANDING_FIELDS)
+    missing = [field for field in REPORT_LANDING_FIELDS[:-1] if field not in fields]
+    if missing:
+        raise ValueError(f"Fields {missing} not found in the document page")
+    fields.setdefault("cmbQuadro", [])
+
+    # Same as extract_substring: the text after the last occurrence, up to "&"
+    start = html.rfind(_REGISTRO_CVM)
+    start = 0 if start < 0 else start + len(_REGISTRO_CVM)
+    end = html.find("&", start)
+    fields["NumeroSequencialRegistroCvm"] = html[start:end if end >= 0 else len(html)]
+
+    return fields
+
+
+def parse_brazilian_number(value):
+    # "1.234.567,89" -> 1234567.89, anything else -> NaN
+    try:
+        return float(value.replace(".", "").replace(",", "."))
+    except ValueError:
+        return np.nan
+
+
+def parse_statement_html(html, statement, previous_results=False):
+    doc = _build_doc(html)
+
+    currency_unit = "".join(doc.xpath("//*[@id='TituloTabelaSemBorda']")[0].itertext())
+
+    index_moeda = -1
+    if statement == DFC_STATEMENT:
+        index_moeda = -2
+
+    currency_unit = currency_unit.split(
+        " - ")[index_moeda].replace("(", "").replace(")", "")
+
+    table_index = 0
+    if statement == DMPL_STATEMENT:
+        table_index = 1
+
+    tables = _find_tables(doc)
+    if not tables:
+        raise ValueError("No tables found in statement page")
+
+    rows = _table_rows(tables[table_index])
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+
+    header, body = rows[0], rows[1:]
+    columns = _column_names(header)
+
+    if statement != DMPL_STATEMENT and not previous_results:
+        # Keep Conta, Descrição and the first column (most recent data available)
+        columns = columns[:3]
+        columns[-1] = "Valor"
+
+    data = {}
+    for index, column in enumerate(columns):
+        if column.strip() in TEXT_COLUMNS:
+            data[column] = np.array([row[index] for row in body], dtype=object)
+        else:
+            data[column] = np.fromiter(
+                (parse_brazilian_number(row[index]) for row in body),
+                dtype=np.float64,
+                count=len(body))
+
+    df = pd.DataFrame(data, columns=columns)
+    df["currency_unit"] = currency_unit
+
+    return df
+
+
+# ITR/DFP packages downloaded from frmDownloadDocumento.aspx hold the
+# statements in InfoFinaDFin.xml, one InfoFinaDFin element per account.
+# CodigoTipoDemonstracaoFinanceira identifies the statement; the DMPL has
+# no single value column and is only available from the statement pages.
+PACKAGE_STATEMENTS = {
+    2: "Balanço Patrimonial Ativo",
+    3: "Balanço Patrimonial Passivo",
+    4: "Demonstração do Resultado",
+    5: "Demonstração do Resultado Abrangente",
+    6: DFC_STATEMENT,
+    7: DFC_STATEMENT,
+    9: "Demonstração de Valor Adicionado",
+}
+PACKAGE_INFO_MEMBER = "infofinadfin.xml"
+PACKAGE_SUFFIXES = (".itr", ".dfp")
+PACKAGE_CURRENCY_SCALES = {"1": "Reais", "2": "Reais Mil"}
+
+# CodigoTipoInformacaoFinanceira
+INDIVIDUAL_STATEMENTS = "1"
+CONSOLIDATED_STATEMENTS = "2"
+
+_RE_VALOR_CONTA = re.compile(r"ValorConta(\d+)$")
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def package_archive(archive):
+    """Returns the ZipFile holding InfoFinaDFin.xml, opening the .itr/.dfp
+    package nested in the downloaded archive when there is one."""
+
+    names = {name.lower(): name for name in archive.namelist()}
+    if PACKAGE_INFO_MEMBER in names:
+        return archive
+
+    for lower_name, name in names.items():
+        if lower_name.endswith(PACKAGE_SUFFIXES):
+            return zipfile.ZipFile(archive.open(name))
+
+    raise ValueError("No ITR/DFP package found in the document archive")
+
+
+def package_currency_unit(archive, default="Reais Mil"):
+    for name in archive.namelist():
+        if not name.lower().startswith("formulariodemonstracaofinanceira"):
+            continue
+        with archive.open(name) as form_file:
+            for _, element in etree.iterparse(form_file):
+                if _local_name(element.tag).startswith("CodigoEscalaMoeda"):
+                    return PACKAGE_CURRENCY_SCALES.get((element.text or "").strip(), default)
+
+    return default
+
+
+def _package_value(text):
+    if not text:
+        return np.nan
+    try:
+        return float(text)
+    except ValueError:
+        return parse_brazilian_number(text)
+
+
+def parse_package_statements(archive, reports_list=None, previous_results=False, consolidated=True):
+    """Parses the statements of an ITR/DFP package into the same
+    {statement: DataFrame} as parse_statement_html. InfoFinaDFin.xml is
+    streamed, one account at a time.
+
+    With previous_results the value columns are named "Valor 1", "Valor 2",
+    ... after ValorConta1, ValorConta2, ..., in the order of the statement
+    pages. The package only numbers its values, it has no period headers
+    like the ones the pages use as column names."""
+
+    archive = package_archive(archive)
+    info_member = next(name for name in archive.namelist() if name.lower() == PACKAGE_INFO_MEMBER)
+
+    # (CodigoTipoInformacaoFinanceira, statement) -> [(conta, descrição, values)]
+    statements = {}
+    with archive.open(info_member) as info_file:
+        for _, element in etree.iterparse(info_file, tag="{*}InfoFinaDFin"):
+            fields = {}
+            values = {}
+            for child in element.iter():
+                name = _local_name(child.tag)
+                match = _RE_VALOR_CONTA.match(name)
+                if match:
+                    values[int(match.group(1))] = child.text
+                elif name in ("CodigoTipoInformacaoFinanceira", "CodigoTipoDemonstracaoFinanceira",
+                              "NumeroConta", "DescricaoConta1"):
+                    fields[name] = (child.text or "").strip()
+
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+            statement = PACKAGE_STATEMENTS.get(int(fields.get("CodigoTipoDemonstracaoFinanceira") or 0))
+            if statement is None or (reports_list is not None and statement not in reports_list):
+                continue
+
+            statements.setdefault(
+                (fields.get("CodigoTipoInformacaoFinanceira"), statement), []).append(
+                (fields.get("NumeroConta", ""), fields.get("DescricaoConta1", ""), values))
+
+    currency_unit = package_currency_unit(archive)
+    preferred, fallback = (CONSOLIDATED_STATEMENTS, INDIVIDUAL_STATEMENTS) if consolidated \
+        else (INDIVIDUAL_STATEMENTS, CONSOLIDATED_STATEMENTS)
+
+    data = {}
+    for statement in dict.fromkeys(statement for _, statement in statements):
+        rows = statements.get((preferred, statement)) or statements.get((fallback, statement))
+        if not rows:
+            continue
+
+        columns = sorted({index for _, _, values in rows for index in values})
+        if not previous_results:
+            columns = columns[:1]
+
+        frame = {
+            "Conta": np.array([conta for conta, _, _ in rows], dtype=object),
+            "Descrição": np.array([descricao for _, descricao, _ in rows], dtype=object),
+        }
+        for index in columns:
+            name = "Valor" if not previous_results else f"Valor {index}"
+            frame[name] = np.fromiter(
+                (_package_value(values.get(index)) for _, _, values in rows),
+                dtype=np.float64, count=len(rows))
+
+        df = pd.DataFrame(frame)
+        df["currency_unit"] = currency_unit
+        data[statement] = df
+
+    return data
@@ -1,83 +1,174 @@
-import logging
-
-import pandas as pd
-from bs4 import BeautifulSoup
 import json
 import io
+import re
+import tempfile
 import zipfile
 
-from brfinance.utils import extract_substring
-from brfinance.constants import ENET_URL
+from typing import NamedTuple
 
+from brfinance._lazy import lazy_import
+from brfinance.constants import ENET_URL
+from brfinance.http_response import BufferedResponse
+from brfinance.metrics import METRICS
+from brfinance.parsers import (
+    extract_form_fields,
+    parse_options,
+    parse_package_statements,
+    parse_statement_html
+)
 
-class GetSearchResponse():
-    def __init__(self, response) -> None:
-        self.response = response
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
-    def data(self):
-        reponse_json = self.response.json()
-        return self._parse_get_search(reponse_json)
+# Bump whenever a parser changes its output, so cached parsed data is rebuilt
+PARSER_VERSION = 2
 
-    def _parse_get_search(self, reponse_json):
 
-        columns = ['cod_cvm', 'empresa', 'categoria', 'tipo', 'especie', 'ref_date',
-                   'data_entrega', 'status', 'version', 'modalidade', "acoes", "outros"]
-        addtional_columns = ['view_url',
+SEARCH_COLUMNS = ['cod_cvm', 'empresa', 'categoria', 'tipo', 'especie', 'ref_date',
+                  'data_entrega', 'status', 'version', 'modalidade', "acoes", "outros"]
+SEARCH_ADDITIONAL_COLUMNS = ['view_url',
                              'numero_seq_documento', 'codigo_tipo_instituicao']
+SEARCH_DOWNLOAD_COLUMNS = ["numSequencia",
+                           "numVersao", "numProtocolo", "descTipo"]
+
+SPAN_ORDER_END = "</spanOrder>"
+
+# InstrumentsConsolidated columns with few distinct values, stored as
+# categoricals, and numeric columns. Every other column is kept as text so
+# all chunks of a file share the same schema.
+CADASTRO_INSTRUMENTOS_CATEGORIES = [
+    'RptDt', 'Asst', 'AsstDesc', 'SgmtNm', 'MktNm', 'SctyCtgyNm', 'XprtnCd', 'BaseCd',
+    'ConvsCritNm', 'ReqrdConvsInd', 'CFICd', 'OptnTp', 'TradgCcy', 'DlvryTpNm',
+    'RlvrBasePricNm', 'OpngFutrPosDay', 'SdTpCd1', 'SdTpCd2', 'OptnStyle', 'ValTpNm',
+    'PrmUpfrntInd', 'SrsTpNm', 'PrtcnFlg', 'AutomtcExrcInd', 'SpcfctnCd', 'CrpnNm',
+    'CtdyTrtmntTpNm', 'CorpGovnLvlNm']
+CADASTRO_INSTRUMENTOS_NUMERIC = [
+    'CtrctMltplr', 'AsstQtnQty', 'AllcnRndLot', 'WdrwlDays', 'WrkgDays', 'ClnrDays',
+    'PureGoldWght', 'ExrcPric', 'DstrbtnId', 'PricFctr', 'DaysToSttlm', 'MktCptlstn']
+
+RE_VIEW_URL = re.compile(r"OpenPopUpVer\('(.*?)'\)")
+RE_DOWNLOAD = re.compile(r"OpenDownloadDocumentos\('(.*?)'\)")
+RE_NUMERO_SEQ_DOCUMENTO = re.compile(r"NumeroSequencialDocumento=(.*?)&")
+RE_CODIGO_TIPO_INSTITUICAO = re.compile(r"CodigoTipoInstituicao=(.*?)'\)")
+RE_NON_DIGITS = re.compile(r"\D+")
+
+
+def _group(match):
+    if match is None:
+        return np.nan
+    return match.group(1).replace(SPAN_ORDER_END, "")
+
+
+def _ref_date_iso(value):
+    # "20210331" -> "2021-03-31"
+    if len(value) != 8:
+        raise ValueError(value)
+    return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+
+
+def _data_entrega_iso(value):
+    # "31/03/2021 18:29" -> "2021-03-31T18:29"
+    if value is None:
+        return "NaT"
+    if len(value) != 16 or value[2] != "/" or value[5] != "/":
+        raise ValueError(value)
+    return f"{value[6:10]}-{value[3:5]}-{value[:2]}T{value[11:]}"
+
+
+def _to_datetime(values, to_iso, format):
+    # numpy parses ISO strings in C; anything unexpected goes through
+    # pd.to_datetime so invalid values still raise the same way.
+    try:
+        return np.array([to_iso(value) for value in values], dtype="datetime64[ns]")
+    except ValueError:
+        return pd.to_datetime(pd.Series(values, dtype=object), format=format).values
 
-        download_columns = ["numSequencia",
-                            "numVersao", "numProtocolo", "descTipo"]
 
-        response_df = pd.DataFrame(
-            columns=columns+addtional_columns+download_columns)
-
-        dados = reponse_json["d"]["dados"]
-
-        if dados:
-            data = dados.replace("<spanOrder>", "")
-
-            search_results_df = pd.DataFrame(
-                [x.split('$&') for x in data.split('$&&*')], columns=columns).iloc[:, :11]
-
-            search_results_df = search_results_df[pd.notnull(
-                search_results_df['acoes'])]
-
-            if not search_results_df.empty:
-                # Obtem coluna de links
-                search_results_df.loc[
-                    search_results_df['acoes'].str.contains("OpenPopUpVer\('"),
-                    'view_url'] = ENET_URL + search_results_df['acoes'].str.extract('OpenPopUpVer\(\'(.*?)\'\)', expand=False)
+class GetSearchResponse():
+    def __init__(self, response) -> None:
+        self.response = response
 
-                search_results_df[download_columns] = search_results_df['acoes'].str.extract(
-                    'OpenDownloadDocumentos\(\'(.*?)\'\)', expand=False).str.replace("'", "", regex=True).str.split(",", expand=True)
+    def data(self):
+        with METRICS.timer("parse_duration_seconds", parser="search"):
+            reponse_json = self.response.json()
+            data = self._parse_get_search(reponse_json)
+        METRICS.observe("parse_rows", len(data), parser="search")
+        return data
 
-                search_results_df.loc[
-                    search_results_df['acoes'].str.contains("OpenPopUpVer\('"),
-                    'numero_seq_documento'] = search_results_df['acoes'].str.extract('NumeroSequencialDocumento\=(.*?)\&', expand=False)
+    @staticmethod
+    def empty():
+        return pd.DataFrame(columns=SEARCH_COLUMNS + SEARCH_ADDITIONAL_COLUMNS + SEARCH_DOWNLOAD_COLUMNS)
 
-                search_results_df.loc[
-                    search_results_df['acoes'].str.contains("OpenPopUpVer\('"),
-                    'codigo_tipo_instituicao'] = search_results_df['acoes'].str.extract("CodigoTipoInstituicao\=(.*?)\'\)", expand=False)
+    def _parse_get_search(self, reponse_json):
+        all_columns = SEARCH_COLUMNS + SEARCH_ADDITIONAL_COLUMNS + SEARCH_DOWNLOAD_COLUMNS
 
-                new = search_results_df['data_entrega'].str.split(
-                    "</spanOrder>", n=-1, expand=True)
-                search_results_df['data_entrega'] = pd.to_datetime(
-                    new[1].str.strip(), format="%d/%m/%Y %H:%M")
+        dados = reponse_json["d"]["dados"]
+        if not dados:
+            return pd.DataFrame(columns=all_columns)
 
-                new = search_results_df['ref_date'].str.split(
-                    "</spanOrder>", n=-1, expand=True)
-                search_results_df['ref_date'] = pd.to_datetime(
-                    new[0].str.strip(), format="%Y%m%d")
+        # Records are separated by "$&&*" and fields by "$&". Records without
+        # the "acoes" field are padding and are skipped.
+        records = [record.split('$&') for record in dados.replace("<spanOrder>", "").split('$&&*')]
+        index = [position for position, fields in enumerate(records) if len(fields) >= 11]
 
-                search_results_df['cod_cvm'] = search_results_df['cod_cvm'].str.replace(
-                    r'\D+', '', regex=True)
+        if any(len(fields) > len(SEARCH_COLUMNS) for fields in records):
+            raise ValueError(
+                f"{len(SEARCH_COLUMNS)} columns passed, passed data had "
+                f"{max(len(fields) for fields in records)} columns")
 
-                search_results_df = search_results_df.replace(
-                    {'</spanOrder>': ''}, regex=True).sort_values('data_entrega', ascending=False)
+        if not index:
+            return pd.DataFrame(columns=all_columns)
 
-                response_df = response_df.append(search_results_df)
+        (cod_cvm, empresa, categoria, tipo, especie, ref_date, data_entrega,
+         status, version, modalidade, acoes) = zip(*[records[position][:11] for position in index])
 
-        return response_df
+        data = {}
+        for column, values in zip(
+                ['empresa', 'categoria', 'tipo', 'especie', 'status', 'version', 'modalidade', 'acoes'],
+                [empresa, categoria, tipo, especie, status, version, modalidade, acoes]):
+            data[column] = [value.replace(SPAN_ORDER_END, "") for value in values]
+
+        data['cod_cvm'] = [RE_NON_DIGITS.sub('', value) for value in cod_cvm]
+        data['ref_date'] = _to_datetime(
+            [value.split(SPAN_ORDER_END)[0].strip() for value in ref_date],
+            _ref_date_iso, "%Y%m%d")
+        data['data_entrega'] = _to_datetime(
+            [value.split(SPAN_ORDER_END)[1].strip() if SPAN_ORDER_END in value else None
+             for value in data_entrega],
+            _data_entrega_iso, "%d/%m/%Y %H:%M")
+        data['outros'] = np.nan
+
+        has_view = ["OpenPopUpVer('" in value for value in acoes]
+        data['view_url'] = [
+            ENET_URL + url if isinstance(url, str) else url
+            for url in [_group(RE_VIEW_URL.search(value)) if view else np.nan
+                        for value, view in zip(acoes, has_view)]]
+        data['numero_seq_documento'] = [
+            _group(RE_NUMERO_SEQ_DOCUMENTO.search(value)) if view else np.nan
+            for value, view in zip(acoes, has_view)]
+        data['codigo_tipo_instituicao'] = [
+            _group(RE_CODIGO_TIPO_INSTITUICAO.search(value)) if view else np.nan
+            for value, view in zip(acoes, has_view)]
+
+        downloads = []
+        for value in acoes:
+            download = [np.nan] * len(SEARCH_DOWNLOAD_COLUMNS)
+            match = RE_DOWNLOAD.search(value)
+            if match:
+                parts = match.group(1).replace("'", "").replace(SPAN_ORDER_END, "").split(",")
+                download[:len(parts)] = parts[:len(download)]
+            downloads.append(download)
+        for column, values in zip(SEARCH_DOWNLOAD_COLUMNS, zip(*downloads)):
+            data[column] = values
+
+        search_results_df = pd.DataFrame(
+            {column: data[column] if column in ('ref_date', 'data_entrega')
+             else np.array(data[column], dtype=object) if column != 'outros'
+             else np.full(len(index), np.nan, dtype=object)
+             for column in all_columns},
+            index=index)
+
+        return search_results_df.sort_values('data_entrega', ascending=False)
 
 
 class GetReportResponse():
@@ -94,46 +185,51 @@ class GetReportResponse():
         return data
 
     def _parse_get_reports(self, html, report):
-        soup = BeautifulSoup(html, features="lxml")
-        currency_unit = soup.find(id='TituloTabelaSemBorda').getText()
+        with METRICS.timer("parse_duration_seconds", parser="report", report=report):
+            data = parse_statement_html(html, report, self.previous_results)
+        METRICS.observe("parse_rows", len(data), parser="report", report=report)
+        return data
 
-        index_moeda = -1
-        statement = report
-        if statement == "Demonstração do Fluxo de Caixa":
-            index_moeda = -2
 
-        currency_unit = currency_unit.split(
-            " - ")[index_moeda].replace("(", "").replace(")", "")
+def parse_reports(pages, previous_results=False):
+    """Parses {statement: html} into ({statement: DataFrame}, {statement:
+    exception}). Defined at module level so it can run in a process pool."""
 
-        table_index = 0
-        if statement == "Demonstração das Mutações do Patrimônio Líquido":
-            table_index = 1
+    parser = GetReportResponse(response=None, previous_results=previous_results)
+    data = {}
+    errors = {}
+    for report, html in pages.items():
+        try:
+            data[report] = parser._parse_get_reports(html, report)
+        except Exception as exc:
+            errors[report] = exc
 
-        df = pd.read_html(html, header=0, decimal=',')[table_index]
-        converters = {c: lambda x: str(x) for c in df.columns}
-        df = pd.read_html(html, header=0, decimal=',',
-                          converters=converters)[table_index]
+    return data, errors
 
-        for ind, column in enumerate(df.columns):
-            if column.strip() != "Conta" and column.strip() != "Descrição":
-                df[column] = df[column].astype(
-                    str).str.strip().str.replace(".", "", regex=True)
-                df[column] = pd.to_numeric(df[column], errors='coerce')
-            else:
-                df[column] = df[column].astype(str).str.strip().astype(str)
 
-        if statement != "Demonstração das Mutações do Patrimônio Líquido":
-            if not self.previous_results:
-                # Get first column (most recent data available)
-                df = df.iloc[:, 0:3]
-                df.set_axis([*df.columns[:-1], 'Valor'], axis=1, inplace=True)
+class ConsultaExternaMetadata(NamedTuple):
+    cvm_codes: dict
+    categories: dict
+    tipo_participante: dict
 
-        # df["refDate"] = reference_date
-        #df["refDate"] = pd.to_datetime(df["refDate"], errors="coerce")
-        # df["document_version"] = document_version
-        df["currency_unit"] = currency_unit
 
-        return df
+def _parse_cvm_codes(hdnEmpresas):
+    hdnEmpresas = hdnEmpresas.replace('{ key:', '{ "key":')
+    hdnEmpresas = hdnEmpresas.replace(', value:', ', "value":')
+    hdnEmpresas = hdnEmpresas.replace("'", '"')
+    empresas_json = json.loads(hdnEmpresas)
+
+    empresas = {}
+    for empresa in empresas_json:
+        empresa_value = empresa["value"].split(" - ")
+        empresas[empresa_value[0]] = empresa_value[-1]
+    return empresas
+
+
+def _parse_categories(hdnComboCategoriaTipoEspecie):
+    # The hidden field holds the escaped markup of the category <option>s
+    return {value: text.replace(u'\xa0', u'')
+            for value, text in parse_options(hdnComboCategoriaTipoEspecie)}
 
 
 class GetCVMCodesResponse():
@@ -146,19 +242,8 @@ class GetCVMCodesResponse():
         return data
 
     def _parse_get_cvm_codes(self, html):
-        hdnEmpresas = BeautifulSoup(
-            html, features="lxml").find(id='hdnEmpresas')
-        hdnEmpresas = hdnEmpresas.attrs["value"]
-        hdnEmpresas = hdnEmpresas.replace('{ key:', '{ "key":')
-        hdnEmpresas = hdnEmpresas.replace(', value:', ', "value":')
-        hdnEmpresas = hdnEmpresas.replace("'", '"')
-        empresas_json = json.loads(hdnEmpresas)
-
-        empresas = {}
-        for empresa in empresas_json:
-            empresa_value = empresa["value"].split(" - ")
-            empresas[empresa_value[0]] = empresa_value[-1]
-        return empresas
+        fields = extract_form_fields(html, ['hdnEmpresas'])
+        return _parse_cvm_codes(fields['hdnEmpresas'])
 
 
 class GetCategoriesResponse():
@@ -171,20 +256,8 @@ class GetCategoriesResponse():
         return data
 
     def _parse_get_consulta_externa_cvm_categories(self, html):
-        hdnComboCategoriaTipoEspecie = BeautifulSoup(
-            html, features="lxml").find(id='hdnComboCategoriaTipoEspecie')
-        hdnComboCategoriaTipoEspecie = hdnComboCategoriaTipoEspecie.attrs["value"]
-
-        hdnComboCategoriaTipoEspecie = BeautifulSoup(
-            hdnComboCategoriaTipoEspecie, features="lxml").find_all('option')
-
-        categories = {}
-
-        for option in hdnComboCategoriaTipoEspecie:
-            categories[option.attrs["value"]
-                       ] = option.getText().replace(u'\xa0', u'')
-
-        return categories
+        fields = extract_form_fields(html, ['hdnComboCategoriaTipoEspecie'])
+        return _parse_categories(fields['hdnComboCategoriaTipoEspecie'])
 
 
 class GetTipoParticipanteResponse():
@@ -197,18 +270,27 @@ class GetTipoParticipanteResponse():
         return data
 
     def _parse_get_consulta_externa_cvm_tipo_participante(self, html):
-        cboTipoParticipante = BeautifulSoup(
-            html, features="lxml").find(id='cboTipoParticipante')
+        fields = extract_form_fields(html, ['cboTipoParticipante'])
+        return dict(fields['cboTipoParticipante'])
+
 
-        cboTipoParticipante = cboTipoParticipante.find_all('option')
+class GetConsultaExternaMetadataResponse():
+    def __init__(self, response) -> None:
+        self.response = response
 
-        tipo_participante = {}
+    def data(self):
+        with METRICS.timer("parse_duration_seconds", parser="consulta_externa_metadata"):
+            data = self._parse_get_consulta_externa_metadata(self.response.text)
+        return data
 
-        for option in cboTipoParticipante:
-            tipo_participante[option.attrs["value"]
-                              ] = option.getText()
+    def _parse_get_consulta_externa_metadata(self, html):
+        fields = extract_form_fields(
+            html, ['hdnEmpresas', 'hdnComboCategoriaTipoEspecie', 'cboTipoParticipante'])
 
-        return tipo_participante
+        return ConsultaExternaMetadata(
+            cvm_codes=_parse_cvm_codes(fields['hdnEmpresas']),
+            categories=_parse_categories(fields['hdnComboCategoriaTipoEspecie']),
+            tipo_participante=dict(fields['cboTipoParticipante']))
 
 
 class GetCadastroInstrumentosTokenResponse():
@@ -224,43 +306,203 @@ class GetCadastroInstrumentosTokenResponse():
         return json_response["token"]
 
 
+class _IterContentStream(io.RawIOBase):
+    """Read-only file object over the chunks of `Response.iter_content`."""
+
+    def __init__(self, iterator) -> None:
+        self._iterator = iterator
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._iterator)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
 class GetCadastroInstrumentosResponse():
     def __init__(self, response) -> None:
         self.response = response
 
     def data(self):
-        data = self._parse_get_cadastro_instrumentos(self.response.text)
-        return data
-
-    def _parse_get_cadastro_instrumentos(self, csv):
-        ativos = pd.read_csv(io.StringIO(csv), sep=";")
+        chunks = list(self.chunks())
+        if len(chunks) == 1:
+            return chunks[0]
+
+        for column in chunks[0].columns:
+            if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+                categories = pd.api.types.union_categoricals(
+                    [chunk[column] for chunk in chunks]).categories
+                for chunk in chunks:
+                    chunk[column] = chunk[column].cat.set_categories(categories)
+
+        return pd.concat(chunks, ignore_index=True)
+
+    def _stream(self):
+        # Streamed responses are parsed while they are downloaded, buffered
+        # ones (cache hits, async client) straight from their content.
+        # Reading `content` on a live requests.Response would load the body.
+        if isinstance(self.response, BufferedResponse):
+            raw = io.BytesIO(self.response.content)
+        else:
+            raw = io.BufferedReader(_IterContentStream(self.response.iter_content(64 * 1024)))
+
+        return io.TextIOWrapper(raw, encoding=self.response.encoding or "latin-1")
+
+    def chunks(self, chunksize: int = None):
+        try:
+            reader = pd.read_csv(
+                self._stream(),
+                sep=";",
+                dtype=str,
+                keep_default_na=False,
+                na_values=[""],
+                chunksize=chunksize or 100_000)
+
+            for chunk in reader:
+                with METRICS.timer("parse_duration_seconds", parser="cadastro_instrumentos"):
+                    chunk = self._parse_get_cadastro_instrumentos(chunk)
+                METRICS.observe("parse_rows", len(chunk), parser="cadastro_instrumentos")
+                yield chunk
+        finally:
+            self.response.close()
+
+    def _parse_get_cadastro_instrumentos(self, ativos):
+        for column in ativos.columns:
+            if column in CADASTRO_INSTRUMENTOS_NUMERIC:
+                ativos[column] = pd.to_numeric(
+                    ativos[column].str.replace(",", ".", regex=False),
+                    errors="coerce").astype("float64")
+            elif column in CADASTRO_INSTRUMENTOS_CATEGORIES:
+                ativos[column] = ativos[column].astype("category")
 
         return ativos
 
+    def _parquet_schema(self, columns):
+        import pyarrow as pa
+
+        return pa.schema([
+            (column, pa.dictionary(pa.int32(), pa.string())
+             if column in CADASTRO_INSTRUMENTOS_CATEGORIES
+             else pa.float64() if column in CADASTRO_INSTRUMENTOS_NUMERIC
+             else pa.string())
+            for column in columns])
+
+    def to_parquet(self, path: str, chunksize: int = None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Writing Parquet files requires pyarrow. Install it with `pip install brfinance[parquet]`.")
+
+        writer = None
+        try:
+            for chunk in self.chunks(chunksize):
+                if writer is None:
+                    schema = self._parquet_schema(chunk.columns)
+                    writer = pq.ParquetWriter(path, schema)
+                writer.write_table(
+                    pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return path
+
+
+def _spool_response(response, max_size):
+    # Buffered content is wrapped without copying, streamed responses are
+    # written chunk by chunk to a spooled temporary file.
+    if isinstance(response, BufferedResponse):
+        return io.BytesIO(response.content)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for chunk in response.iter_content(64 * 1024):
+            spool.write(chunk)
+    finally:
+        response.close()
+    spool.seek(0)
+
+    return spool
+
 
 class GetEmissorResponse():
+    EMISSOR_MEMBER = 'EMISSOR.TXT'
+    EMISSOR_COLUMNS = ['Asst', 'descricao', 'cnpj', 'outro']
+    EMISSOR_DTYPES = {'Asst': str, 'descricao': str, 'cnpj': 'Int64', 'outro': 'category'}
+
+    # Downloads bigger than this are spooled to a temporary file on disk
+    SPOOL_MAX_SIZE = 32 * 1024 ** 2
+
     def __init__(self, response) -> None:
         self.response = response
+        self._archive = None
 
     def data(self):
-        data = self._parse_get_emissor(self.response.content)
+        with METRICS.timer("parse_duration_seconds", parser="emissor"):
+            data = self._parse_get_emissor(self.archive())
+        METRICS.observe("parse_rows", len(data), parser="emissor")
         return data
 
-    def _parse_get_emissor(self, content):
-        file = zipfile.ZipFile(io.BytesIO(content))
-        emissor_file = file.open('EMISSOR.TXT')
+    def archive(self):
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self._spool())
+        return self._archive
+
+    def _spool(self):
+        return _spool_response(self.response, self.SPOOL_MAX_SIZE)
+
+    def members(self):
+        return self.archive().namelist()
+
+    def read_member(self, name, **kwargs):
+        if name == self.EMISSOR_MEMBER:
+            return self._parse_get_emissor(self.archive())
+
+        with self.archive().open(name) as member_file:
+            return pd.read_csv(member_file, header=None, **kwargs)
+
+    def _parse_get_emissor(self, file):
+        with file.open(self.EMISSOR_MEMBER) as emissor_file:
+            return pd.read_csv(
+                emissor_file, names=self.EMISSOR_COLUMNS, dtype=self.EMISSOR_DTYPES)
+
 
-        header = [
-            'Asst',
-            'descricao',
-            'cnpj',
-            'outro'
-        ]
+class GetDocumentPackageResponse():
+    """ITR/DFP package downloaded from frmDownloadDocumento.aspx, parsed into
+    the same statements as GetReportResponse (except the DMPL)."""
 
-        emissor_file = pd.read_csv(emissor_file, names=header)
-        emissor_file['cnpj'] = pd.to_numeric(emissor_file['cnpj'])
+    SPOOL_MAX_SIZE = 32 * 1024 ** 2
+
+    def __init__(self, response, previous_results=False, reports_list=None, consolidated=True) -> None:
+        self.response = response
+        self.previous_results = previous_results
+        self.reports_list = reports_list
+        self.consolidated = consolidated
+
+    def data(self):
+        with zipfile.ZipFile(_spool_response(self.response, self.SPOOL_MAX_SIZE)) as archive:
+            with METRICS.timer("parse_duration_seconds", parser="document_package"):
+                data = self._parse_get_document_package(archive)
+
+        for report, df in data.items():
+            METRICS.observe("parse_rows", len(df), parser="document_package", report=report)
+        return data
 
-        return emissor_file
+    def _parse_get_document_package(self, archive):
+        return parse_package_statements(
+            archive, self.reports_list, self.previous_results, self.consolidated)
 
 
 class GetPesquisaCiaAbertaResponse():
@@ -268,7 +510,9 @@ class GetPesquisaCiaAbertaResponse():
         self.response = response
 
     def data(self):
-        data = self._parse_get_pesquisa_cia_aberta(self.response.text)
+        with METRICS.timer("parse_duration_seconds", parser="pesquisa_cia_aberta"):
+            data = self._parse_get_pesquisa_cia_aberta(self.response.text)
+        METRICS.observe("parse_rows", len(data), parser="pesquisa_cia_aberta")
         return data
 
     def _parse_get_pesquisa_cia_aberta(self, content):
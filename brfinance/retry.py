@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from brfinance.exceptions import (
+    CircuitOpenError,
+    ClientError,
+    ConnectionFailedError,
+    ServerError,
+    ThrottledError
+)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def error_for_response(response, endpoint=None):
+    """Returns the typed error for a failed response, or None if it is ok."""
+    if response.ok:
+        return None
+
+    status_code = response.status_code
+    message = f"{status_code} error for {response.url}"
+    kwargs = dict(url=str(response.url), endpoint=endpoint, status_code=status_code, response=response)
+
+    if status_code == 429:
+        return ThrottledError(
+            message, retry_after=parse_retry_after(response.headers.get("Retry-After")), **kwargs)
+    if status_code >= 500:
+        return ServerError(
+            message, retry_after=parse_retry_after(response.headers.get("Retry-After")), **kwargs)
+    return ClientError(message, **kwargs)
+
+
+def request_host(url):
+    return urlsplit(url).hostname or ""
+
+
+class RetryPolicy():
+    """Exponential backoff with full jitter. Only idempotent requests are
+    retried unless `retry_non_idempotent` is set. A Retry-After header
+    overrides the computed delay, up to `max_retry_after` seconds."""
+
+    def __init__(
+            self,
+            max_attempts: int = 4,
+            backoff_factor: float = 0.5,
+            max_backoff: float = 30.0,
+            jitter: bool = True,
+            retry_statuses=RETRY_STATUSES,
+            retry_connection_errors: bool = True,
+            retry_non_idempotent: bool = False,
+            respect_retry_after: bool = True,
+            max_retry_after: float = 120.0) -> None:
+
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_connection_errors = retry_connection_errors
+        self.retry_non_idempotent = retry_non_idempotent
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def is_retryable(self, method, error, idempotent=None):
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        if not (idempotent or self.retry_non_idempotent):
+            return False
+
+        if isinstance(error, ConnectionFailedError):
+            return self.retry_connection_errors
+        return error.status_code in self.retry_statuses
+
+    def backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def retry_delay(self, method, attempt, error, idempotent=None):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt >= self.max_attempts or not self.is_retryable(method, error, idempotent):
+            return None
+
+        retry_after = getattr(error, "retry_after", None)
+        if self.respect_retry_after and retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+class CircuitBreaker():
+    """Per host circuit breaker. After `failure_threshold` consecutive
+    transient failures the host is refused for `recovery_timeout` seconds,
+    then a single trial request decides whether it closes again."""
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._open_until = {}
+        self._trial = set()
+
+    def before_request(self, host):
+        """Raises CircuitOpenError while `host` is refused. Returns True
+        when the request is the trial of a half-open circuit."""
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return False
+
+            now = time.monotonic()
+            if now < open_until or host in self._trial:
+                raise CircuitOpenError(host, max(open_until, now))
+            self._trial.add(host)
+            return True
+
+    def release_trial(self, host):
+        # The trial ended without an answer from the host (cancelled, or
+        # failed in the library), so the next request becomes the trial
+        with self._lock:
+            self._trial.discard(host)
+
+    def record_success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._trial.discard(host)
+
+    def record_failure(self, host):
+        with self._lock:
+            self._trial.discard(host)
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+
+            if failures >= self.failure_threshold:
+                self._open_until[host] = time.monotonic() + self.recovery_timeout
+
+    def is_open(self, host):
+        with self._lock:
+            open_until = self._open_until.get(host)
+            return open_until is not None and time.monotonic() < open_until
+
+    def record(self, host, error):
+        # Only connection errors, throttling and 5xx count as failures; a 4xx
+        # means the host is up and answering.
+        if error is None or (isinstance(error, ClientError) and not isinstance(error, ThrottledError)):
+            self.record_success(host)
+        else:
+            self.record_failure(host)
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import tempfile
+import time
+
+from datetime import date
+
+from brfinance._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+# Columns identifying a row of each reference file, and columns left out of
+# the comparison because they change every day without the row changing.
+SNAPSHOT_KEYS = {
+    "cadastro_instrumentos": (["TckrSymb"], ["RptDt"]),
+    "emissor": (["Asst"], []),
+}
+
+_RE_SNAPSHOT = re.compile(r"^(\d{4}-\d{2}-\d{2})\.parquet$")
+
+
+def response_validators(response):
+    """ETag and Last-Modified headers of a response, used to revalidate the
+    snapshot built from it."""
+    headers = response.headers
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+    }
+
+
+def diff_snapshots(previous: "pd.DataFrame", current: "pd.DataFrame", key: list, ignore: list = ()):
+    """Rows of `current` added or changed since `previous`, and rows of
+    `previous` removed from it, with a `change` column set to "added",
+    "changed" or "removed". Rows are compared by `key`, ignoring the
+    `ignore` columns."""
+
+    columns = [column for column in current.columns
+               if column not in ignore and column not in key and column in previous.columns]
+    previous = previous.drop_duplicates(key, keep="last")
+    current = current.drop_duplicates(key, keep="last")
+
+    # Rows are compared through a hash of their values, which does not
+    # depend on the categories of categorical columns
+    previous_hashes = pd.Series(
+        pd.util.hash_pandas_object(previous[columns], index=False).to_numpy(),
+        index=pd.MultiIndex.from_frame(previous[key]))
+    current_hashes = pd.Series(
+        pd.util.hash_pandas_object(current[columns], index=False).to_numpy(),
+        index=pd.MultiIndex.from_frame(current[key]))
+
+    in_previous = current_hashes.index.isin(previous_hashes.index)
+    changed = in_previous & (
+        current_hashes.to_numpy() != previous_hashes.reindex(current_hashes.index).to_numpy())
+    removed = ~previous_hashes.index.isin(current_hashes.index)
+
+    changes = [
+        current[~in_previous].assign(change="added"),
+        current[changed].assign(change="changed"),
+        previous[removed].assign(change="removed"),
+    ]
+    # Empty parts would change the dtypes of the result
+    return pd.concat([part for part in changes if not part.empty] or changes[:1], ignore_index=True)
+
+
+class ReferenceSnapshotStore():
+    """Dated snapshots of the B3 reference files (InstrumentsConsolidated
+    and the IsinCall emissor file), one Parquet file per `ref_date`. Each
+    snapshot keeps the URL, ETag and Last-Modified of its download, so the
+    next download can be made conditional."""
+
+    def __init__(self, directory: str) -> None:
+        try:
+            import pyarrow  # NOQA
+        except ImportError:
+            raise ImportError(
+                "ReferenceSnapshotStore requires pyarrow. Install it with `pip install brfinance[parquet]`.")
+
+        self.directory = directory
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, name, ref_date, extension):
+        return os.path.join(self.directory, name, f"{ref_date.isoformat()}.{extension}")
+
+    def dates(self, name):
+        try:
+            files = os.listdir(os.path.join(self.directory, name))
+        except OSError:
+            return []
+
+        return sorted(date.fromisoformat(match.group(1))
+                      for match in map(_RE_SNAPSHOT.match, files) if match)
+
+    def previous_date(self, name, ref_date: date):
+        """Date of the latest snapshot before `ref_date`, or None."""
+        dates = [snapshot_date for snapshot_date in self.dates(name) if snapshot_date < ref_date]
+        return dates[-1] if dates else None
+
+    def get(self, name, ref_date: date):
+        path = self._path(name, ref_date, "parquet")
+        if not os.path.exists(path):
+            return None
+
+        return pd.read_parquet(path)
+
+    def metadata(self, name, ref_date: date):
+        try:
+            with open(self._path(name, ref_date, "json"), "r", encoding="utf-8") as metadata_file:
+                return json.load(metadata_file)
+        except (OSError, ValueError):
+            return {}
+
+    def set(self, name, ref_date: date, df, url: str = None, validators: dict = None):
+        path = self._path(name, ref_date, "parquet")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        metadata = {"url": url, **(validators or {}), "rows": len(df), "stored_at": time.time()}
+        self._atomic_write(path, lambda tmp_path: df.reset_index(drop=True).to_parquet(tmp_path))
+        self._atomic_write(
+            self._path(name, ref_date, "json"),
+            lambda tmp_path: _write_json(tmp_path, metadata))
+
+    def _atomic_write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def conditional_headers(self, name, ref_date: date, url: str):
+        """If-None-Match and If-Modified-Since headers for downloading `url`
+        against the snapshot of `ref_date`. Last-Modified is only sent for
+        the same URL, while a strong ETag identifies the content itself."""
+
+        if ref_date is None:
+            return {}
+
+        metadata = self.metadata(name, ref_date)
+        headers = {}
+        etag = metadata.get("etag")
+        if etag and (metadata.get("url") == url or not etag.startswith("W/")):
+            headers["If-None-Match"] = etag
+        if metadata.get("last_modified") and metadata.get("url") == url:
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+        return headers
+
+    def diff(self, name, ref_date: date, previous_date: date = None, key: list = None, ignore: list = None):
+        """Rows changed between the snapshot of `ref_date` and the previous
+        one (or `previous_date`), see diff_snapshots. Every row is "added"
+        when there is no earlier snapshot."""
+
+        current = self.get(name, ref_date)
+        if current is None:
+            raise KeyError(f"No {name} snapshot for {ref_date}")
+
+        default_key, default_ignore = SNAPSHOT_KEYS.get(name, (None, []))
+        key = key or default_key
+        if key is None:
+            raise ValueError(f"key is required to compare {name} snapshots")
+
+        previous_date = previous_date or self.previous_date(name, ref_date)
+        previous = self.get(name, previous_date) if previous_date is not None else None
+        if previous is None:
+            return current.assign(change="added")
+
+        return diff_snapshots(
+            previous, current, key, default_ignore if ignore is None else ignore)
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file)
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+
+from contextlib import closing
+from datetime import datetime
+
+from brfinance._lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    scope TEXT PRIMARY KEY,
+    data_entrega TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    scope TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    data_entrega TEXT,
+    PRIMARY KEY (scope, document_id, version)
+);
+"""
+
+
+def sync_scope(category, participant_type, cod_cvm):
+    # The same search filters always map to the same scope, regardless of
+    # the order the values were given in.
+    return "|".join(
+        ",".join(sorted(str(item) for item in values))
+        for values in (category, participant_type, cod_cvm))
+
+
+def document_keys(documents: "pd.DataFrame"):
+    # numSequencia identifies every delivered document, including the ones
+    # without a report page. numero_seq_documento and view_url are
+    # fallbacks for rows without a download link.
+    document_id = documents['numSequencia'].where(
+        documents['numSequencia'].notnull(), documents['numero_seq_documento'])
+    document_id = document_id.where(document_id.notnull(), documents['view_url'])
+    version = documents['numVersao'].where(
+        documents['numVersao'].notnull(), documents['version'])
+
+    return document_id.astype(str), version.astype(str)
+
+
+class WatermarkStore():
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_watermark(self, scope):
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT data_entrega FROM watermarks WHERE scope = ?", (scope,)).fetchone()
+
+        if row is None:
+            return None
+        return datetime.fromisoformat(row[0])
+
+    def set_watermark(self, scope, data_entrega):
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO watermarks (scope, data_entrega, updated_at) VALUES (?, ?, ?)",
+                (scope, pd.Timestamp(data_entrega).isoformat(), datetime.now().isoformat()))
+
+    def new_documents(self, scope, documents: "pd.DataFrame"):
+        # Returns the rows not synced yet, with a sync_status column telling
+        # brand new documents ("new") from new versions of known ones
+        # ("updated").
+        if documents.empty:
+            return documents.assign(sync_status=pd.Series(dtype=object))
+
+        document_ids, versions = document_keys(documents)
+
+        with closing(self._connect()) as connection:
+            seen = set()
+            known = set()
+            unique_ids = list(dict.fromkeys(document_ids))
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(unique_ids), 500):
+                chunk = unique_ids[start:start + 500]
+                rows = connection.execute(
+                    "SELECT document_id, version FROM documents WHERE scope = ? "
+                    f"AND document_id IN ({','.join('?' * len(chunk))})",
+                    (scope, *chunk)).fetchall()
+                seen.update(rows)
+                known.update(document_id for document_id, _ in rows)
+
+        is_new = [(document_id, version) not in seen
+                  for document_id, version in zip(document_ids, versions)]
+        new_documents = documents[is_new].copy()
+        new_documents['sync_status'] = [
+            "updated" if document_id in known else "new"
+            for document_id in document_ids[is_new]]
+
+        return new_documents
+
+    def mark_synced(self, scope, documents: "pd.DataFrame"):
+        if documents.empty:
+            return
+
+        document_ids, versions = document_keys(documents)
+        data_entrega = [None if pd.isnull(value) else pd.Timestamp(value).isoformat()
+                        for value in documents['data_entrega']]
+
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO documents (scope, document_id, version, data_entrega) "
+                "VALUES (?, ?, ?, ?)",
+                [(scope, *values) for values in zip(document_ids, versions, data_entrega)])
+
+    def reset(self, scope=None):
+        with self._lock, closing(self._connect()) as connection, connection:
+            if scope is None:
+                connection.execute("DELETE FROM watermarks")
+                connection.execute("DELETE FROM documents")
+            else:
+                connection.execute("DELETE FROM watermarks WHERE scope = ?", (scope,))
+                connection.execute("DELETE FROM documents WHERE scope = ?", (scope,))
@@ -0,0 +1,366 @@
+import asyncio
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+from contextlib import asynccontextmanager, closing, contextmanager
+from typing import NamedTuple
+
+
+class TokenBucket():
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be a positive number of requests per second")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens=1):
+        # Takes the tokens right away (possibly going negative) and returns
+        # how long the caller has to wait before using them.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= tokens
+
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ConcurrencyLimiter():
+    """Caps the number of requests in flight. Threads and asyncio tasks
+    wait in the same FIFO queue, so one limiter can be shared by the sync
+    and async clients."""
+
+    def __init__(self, max_in_flight: int) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, waiter):
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def acquire(self):
+        event = threading.Event()
+        if not self._try_acquire(event):
+            event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._try_acquire((loop, future)):
+            return
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = (loop, future) in self._waiters
+                if queued:
+                    self._waiters.remove((loop, future))
+            # A slot already handed over to a cancelled task is given back
+            if not queued and future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _wake(self, future):
+        if future.done():
+            # Cancelled while the slot was being handed over
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self):
+        # Slots are handed straight to the next waiter, so the in flight
+        # count only drops when nobody is waiting.
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+
+                loop, future = waiter
+                if not future.done():
+                    loop.call_soon_threadsafe(self._wake, future)
+                    return
+            self._in_flight -= 1
+
+    async def release_async(self):
+        self.release()
+
+
+class _SQLiteState():
+    # Shares limiter state between processes through a SQLite file. Every
+    # update runs in an IMMEDIATE transaction, which takes the file lock.
+
+    SCHEMA = ""
+
+    def __init__(self, path: str, key: str) -> None:
+        self.path = path
+        self.key = key
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    async def _run_async(self, function, *args):
+        # Waiting on the SQLite lock (up to `timeout`) would block the event
+        # loop, so the queries run in the default executor.
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+class SQLiteTokenBucket(_SQLiteState, TokenBucket):
+    """TokenBucket whose tokens are shared by every process using the same
+    SQLite file and key."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS token_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        last_refill REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, key: str, rate: float, capacity: float = None) -> None:
+        TokenBucket.__init__(self, rate, capacity)
+        _SQLiteState.__init__(self, path, key)
+
+    def _reserve(self, tokens=1):
+        with self._transaction() as connection:
+            now = time.time()
+            row = connection.execute(
+                "SELECT tokens, last_refill FROM token_buckets WHERE key = ?", (self.key,)).fetchone()
+            available = self.capacity if row is None else min(
+                self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            available -= tokens
+
+            connection.execute(
+                "INSERT OR REPLACE INTO token_buckets (key, tokens, last_refill) VALUES (?, ?, ?)",
+                (self.key, available, now))
+
+        if available >= 0:
+            return 0.0
+        return -available / self.rate
+
+    async def acquire_async(self, tokens=1):
+        wait = await self._run_async(self._reserve, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SQLiteConcurrencyLimiter(_SQLiteState):
+    """ConcurrencyLimiter shared by every process using the same SQLite
+    file and key. Slots are leases that expire after `lease_timeout`
+    seconds, so a crashed process cannot hold them forever. Waiters poll
+    every `poll_interval` seconds."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leases (
+        key TEXT NOT NULL,
+        lease TEXT NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (key, lease)
+    );
+    """
+
+    def __init__(
+            self,
+            path: str,
+            key: str,
+            max_in_flight: int,
+            lease_timeout: float = 300.0,
+            poll_interval: float = 0.05) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+        super().__init__(path, key)
+        self.max_in_flight = max_in_flight
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._leases = []
+        self._counter = 0
+
+    def _try_acquire(self):
+        with self._lock:
+            self._counter += 1
+            lease = f"{os.getpid()}-{id(self)}-{self._counter}"
+
+        with self._transaction() as connection:
+            now = time.time()
+            connection.execute(
+                "DELETE FROM leases WHERE key = ? AND expires < ?", (self.key, now))
+            in_flight = connection.execute(
+                "SELECT COUNT(*) FROM leases WHERE key = ?", (self.key,)).fetchone()[0]
+            if in_flight >= self.max_in_flight:
+                return False
+
+            connection.execute(
+                "INSERT INTO leases (key, lease, expires) VALUES (?, ?, ?)",
+                (self.key, lease, now + self.lease_timeout))
+
+        with self._lock:
+            self._leases.append(lease)
+        return True
+
+    def acquire(self):
+        while not self._try_acquire():
+            time.sleep(self.poll_interval)
+
+    async def acquire_async(self):
+        while True:
+            attempt = asyncio.ensure_future(self._run_async(self._try_acquire))
+            try:
+                acquired = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # The lease taken by an attempt that finishes after the
+                # cancellation is given back
+                attempt.add_done_callback(self._release_cancelled)
+                raise
+            if acquired:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def _release_cancelled(self, attempt):
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result():
+            asyncio.get_running_loop().run_in_executor(None, self.release)
+
+    async def release_async(self):
+        await self._run_async(self.release)
+
+    def release(self):
+        with self._lock:
+            lease = self._leases.pop() if self._leases else None
+        if lease is None:
+            return
+
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM leases WHERE key = ? AND lease = ?", (self.key, lease))
+
+
+class HostLimits(NamedTuple):
+    rate: float = None
+    capacity: float = None
+    max_in_flight: int = None
+
+
+# Conservative defaults for the hosts used by the library
+DEFAULT_HOST_LIMITS = {
+    "www.rad.cvm.gov.br": HostLimits(rate=10, max_in_flight=10),
+    "arquivos.b3.com.br": HostLimits(rate=5, max_in_flight=4),
+    "sistemaswebb3-listados.b3.com.br": HostLimits(rate=5, max_in_flight=4),
+    "cvmweb.cvm.gov.br": HostLimits(rate=5, max_in_flight=4),
+}
+
+
+class RequestGovernor():
+    """Per host token bucket and in flight limit. Hosts missing from
+    `host_limits` use `default_limits`. With `state_path` the limits are
+    enforced across every process sharing that SQLite file."""
+
+    def __init__(
+            self,
+            host_limits: dict = None,
+            default_limits: HostLimits = None,
+            state_path: str = None) -> None:
+
+        self.host_limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+        self.default_limits = default_limits or HostLimits()
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._limiters = {}
+
+    def _limiters_for(self, host):
+        with self._lock:
+            if host not in self._limiters:
+                limits = self.host_limits.get(host, self.default_limits)
+                self._limiters[host] = (self._bucket(host, limits), self._concurrency(host, limits))
+            return self._limiters[host]
+
+    def _bucket(self, host, limits):
+        if not limits.rate:
+            return None
+        if self.state_path:
+            return SQLiteTokenBucket(self.state_path, host, limits.rate, limits.capacity)
+        return TokenBucket(limits.rate, limits.capacity)
+
+    def _concurrency(self, host, limits):
+        if not limits.max_in_flight:
+            return None
+        if self.state_path:
+            return SQLiteConcurrencyLimiter(self.state_path, host, limits.max_in_flight)
+        return ConcurrencyLimiter(limits.max_in_flight)
+
+    @contextmanager
+    def limit(self, host):
+        bucket, concurrency = self._limiters_for(host)
+
+        if concurrency is not None:
+            concurrency.acquire()
+        try:
+            if bucket is not None:
+                bucket.acquire()
+            yield
+        finally:
+            if concurrency is not None:
+                concurrency.release()
+
+    @asynccontextmanager
+    async def limit_async(self, host):
+        bucket, concurrency = self._limiters_for(host)
+
+        if concurrency is not None:
+            await concurrency.acquire_async()
+        try:
+            if bucket is not None:
+                await bucket.acquire_async()
+            yield
+        finally:
+            if concurrency is not None:
+                await concurrency.release_async()
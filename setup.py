@@ -16,6 +16,12 @@ install_requires = [
     'lxml'
 ]
 
+extras_require = {
+    'parquet': ['pyarrow'],
+    'prometheus': ['prometheus_client'],
+    'opentelemetry': ['opentelemetry-api'],
+}
+
 
 setuptools.setup(
     name='brfinance',
@@ -33,6 +39,7 @@ setuptools.setup(
     url='https://github.com/eudesrodrigo/brFinance',
     download_url='https://github.com/eudesrodrigo/brFinance/archive/refs/tags/0.0.5.tar.gz',
     install_requires=install_requires,
+    extras_require=extras_require,
     classifiers=[
         'License :: OSI Approved :: Apache Software License',
         'Programming Language :: Python',
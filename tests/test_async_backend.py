@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from brfinance.backend import CVMAsyncBackend
+
+CONSULTA_EXTERNA_PAGE = (
+    "<html><body>"
+    '<input type="hidden" name="hdnEmpresas" id="hdnEmpresas" '
+    "value=\"[{ key:'021610', value:'021610 - B3 S.A. (REGISTRO ATIVO)'}]\" />"
+    '<input type="hidden" name="hdnComboCategoriaTipoEspecie" id="hdnComboCategoriaTipoEspecie" '
+    "value=\"&lt;option value='EST_4'&gt;&amp;nbsp;DFP&lt;/option&gt;\" />"
+    '<select name="cboTipoParticipante" id="cboTipoParticipante">'
+    '<option value="1">Companhia Aberta</option></select>'
+    "</body></html>").encode("utf-8")
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(CONSULTA_EXTERNA_PAGE)))
+        self.end_headers()
+        self.wfile.write(CONSULTA_EXTERNA_PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+class SequentialEventLoopsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), PageHandler)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # metadata_ttl=0 downloads the page on every call
+        self.backend = CVMAsyncBackend(metadata_ttl=0)
+        self.backend._async_client.ENET_CONSULTA_EXTERNA = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def test_backend_survives_a_new_event_loop(self):
+        first = asyncio.run(self.backend.get_cvm_codes_async())
+        first_session = self.backend._async_connector.CONNECTOR
+
+        second = asyncio.run(self.backend.get_cvm_codes_async())
+        second_session = self.backend._async_connector.CONNECTOR
+
+        self.assertEqual(first, {"021610": "B3 S.A. (REGISTRO ATIVO)"})
+        self.assertEqual(second, first)
+        self.assertIsNot(second_session, first_session)
+        # The session of the closed loop is not left open
+        self.assertTrue(first_session.closed)
+
+        asyncio.run(self.backend.close())
+        self.assertTrue(second_session.closed)
+
+    def test_concurrent_calls_in_each_loop(self):
+        async def metadata():
+            return await asyncio.gather(*[
+                self.backend.get_consulta_externa_metadata_async() for _ in range(5)])
+
+        for _ in range(2):
+            results = asyncio.run(metadata())
+            self.assertEqual([dict(result.tipo_participante) for result in results],
+                             [{"1": "Companhia Aberta"}] * 5)
+        asyncio.run(self.backend.close())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+import asyncio
+import tempfile
+from datetime import date
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pandas as pd
+
+from brfinance.backend import CVMAsyncBackend
+from brfinance.cache import ParsedReportCache
+from tests.test_parsers import ROWS, STATEMENT, statement_page
+
+STATEMENTS = ["Balanço Patrimonial Ativo", "Demonstração do Resultado"]
+
+
+def statement_frame(value):
+    return pd.DataFrame({"Conta": ["1"], "Descrição": ["Total"], "Valor": [value]})
+
+
+class FakeClient():
+    """Downloads every statement of the landing page, except the ones in
+    `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.requested = []
+
+    def get_report_pages(self, NumeroSequencialDocumento, CodigoTipoInstituicao, reports_list=None):
+        self.requested.append(reports_list)
+        statements = STATEMENTS if reports_list is None else reports_list
+        reports = {statement: statement_frame(1.0)
+                   for statement in statements if statement not in self.failing}
+        errors = {statement: ConnectionError(statement)
+                  for statement in statements if statement in self.failing}
+        return reports, errors
+
+
+class FakeAsyncClient(FakeClient):
+
+    async def get_report_pages(self, *args, **kwargs):
+        return FakeClient.get_report_pages(self, *args, **kwargs)
+
+
+class GetReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.backend = CVMAsyncBackend(report_cache=ParsedReportCache(self.directory.name))
+        # Responses are already parsed by the fake clients
+        self.backend._parse_reports = lambda responses, previous_results: responses
+
+        async def parse_reports_async(responses, previous_results):
+            return responses
+        self.backend._parse_reports_async = parse_reports_async
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_partial_download_is_not_stored_as_complete(self):
+        self.backend._client = FakeClient(failing=[STATEMENTS[1]])
+        self.assertEqual(list(self.backend.get_report(1, 2)), [STATEMENTS[0]])
+        self.assertIsNone(self.backend._report_cache.get_statements("1", False))
+
+        # The next call asks the landing page again and gets the statement
+        self.backend._client = FakeClient()
+        self.assertEqual(list(self.backend.get_report(1, 2)), STATEMENTS)
+        self.assertEqual(self.backend._report_cache.get_statements("1", False), STATEMENTS)
+
+        self.backend._client = FakeClient()
+        self.assertEqual(list(self.backend.get_report(1, 2)), STATEMENTS)
+        self.assertEqual(self.backend._client.requested, [])
+
+    def test_partial_download_is_not_stored_as_complete_async(self):
+        self.backend._async_client = FakeAsyncClient(failing=[STATEMENTS[0]])
+        reports = asyncio.run(self.backend.get_report_async(1, 2))
+
+        self.assertEqual(list(reports), [STATEMENTS[1]])
+        self.assertIsNone(self.backend._report_cache.get_statements("1", False))
+
+
+def fake_parse_reports(pages, previous_results):
+    return {report: statement_frame(2.0) for report in pages}, {}
+
+
+class FakeBulkClient():
+    """Landing and statement pages of every document, recording the
+    statements requested."""
+
+    def __init__(self, statements=STATEMENTS):
+        self.statements = statements
+        self.landing_pages = 0
+        self.pages = []
+
+    def get_report_landing_page(self, NumeroSequencialDocumento, CodigoTipoInstituicao):
+        self.landing_pages += 1
+        return SimpleNamespace(text="landing")
+
+    def _report_urls(self, html, reports_list=None):
+        return {statement: statement for statement in self.statements
+                if reports_list is None or statement in reports_list}
+
+    def get_report_page(self, report_url):
+        self.pages.append(report_url)
+        return SimpleNamespace(text=report_url)
+
+
+class FakeAsyncBulkClient(FakeBulkClient):
+
+    async def get_report_landing_page(self, *args):
+        return FakeBulkClient.get_report_landing_page(self, *args)
+
+    async def get_report_page(self, report_url):
+        return FakeBulkClient.get_report_page(self, report_url)
+
+
+@mock.patch("brfinance.backend.parse_reports", fake_parse_reports)
+class BulkReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ParsedReportCache(self.directory.name)
+        self.backend = CVMAsyncBackend(report_cache=self.cache)
+        # Statement 0 of document 1 is cached, document 2 has both
+        self.cache.set("1", STATEMENTS[0], False, statement_frame(1.0))
+        self.cache.set_reports("2", False, {statement: statement_frame(1.0) for statement in STATEMENTS},
+                               all_statements=True)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check_results(self, results, client):
+        results = {result.NumeroSequencialDocumento: result for result in results}
+
+        # Only the missing statement of document 1 is downloaded
+        self.assertEqual(client.landing_pages, 1)
+        self.assertEqual(client.pages, [STATEMENTS[1]])
+        self.assertEqual(list(results["1"].data), STATEMENTS)
+        self.assertEqual(results["1"].data[STATEMENTS[0]]["Valor"].item(), 1.0)
+        self.assertEqual(results["1"].data[STATEMENTS[1]]["Valor"].item(), 2.0)
+        self.assertEqual(list(results["2"].data), STATEMENTS)
+        self.assertEqual(self.cache.get("1", STATEMENTS[1], False)["Valor"].item(), 2.0)
+
+    def test_sync_bulk_downloads_missing_statements_only(self):
+        client = self.backend._client = FakeBulkClient()
+        self.check_results(list(self.backend.get_reports_bulk(
+            [("1", 1), ("2", 1)], reports_list=STATEMENTS)), client)
+
+    def test_async_bulk_downloads_missing_statements_only(self):
+        client = self.backend._async_client = FakeAsyncBulkClient()
+
+        async def main():
+            return [result async for result in self.backend.get_reports_bulk_async(
+                [("1", 1), ("2", 1)], reports_list=STATEMENTS)]
+
+        self.check_results(asyncio.run(main()), client)
+
+
+class ParseWorkersTest(unittest.TestCase):
+
+    def test_same_output_as_in_process_parse(self):
+        responses = {STATEMENT: SimpleNamespace(text=statement_page(ROWS))}
+        expected = CVMAsyncBackend()._parse_reports(responses, True)
+
+        with CVMAsyncBackend(parse_workers=2) as backend:
+            actual = backend._parse_reports(responses, True)
+            processes = list(backend._parse_executor._processes.values())
+
+        self.assertEqual(list(actual), [STATEMENT])
+        pd.testing.assert_frame_equal(actual[STATEMENT], expected[STATEMENT])
+        # Leaving the block shuts the pool down
+        self.assertIsNone(backend._parse_executor)
+        self.assertTrue(processes)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def test_close_sync_without_a_pool(self):
+        backend = CVMAsyncBackend(parse_workers=2)
+        backend.close_sync()
+        self.assertIsNone(backend._parse_executor)
+
+
+def search_results(rows):
+    # (numero_seq_documento, version, data_entrega) rows of a search
+    return pd.DataFrame({
+        "numero_seq_documento": [numero for numero, _, _ in rows],
+        "numSequencia": [numero for numero, _, _ in rows],
+        "version": [version for _, version, _ in rows],
+        "data_entrega": pd.to_datetime([data_entrega for _, _, data_entrega in rows]),
+    })
+
+
+class NoSearchClient():
+
+    def get_search_results(self, **params):
+        raise AssertionError("no search was expected")
+
+
+class SearchShardsTest(unittest.TestCase):
+
+    def test_date_boundaries(self):
+        shards = CVMAsyncBackend()._search_shards(date(2021, 1, 1), date(2021, 1, 10), [], 4, None)
+
+        self.assertEqual(shards, [
+            (date(2021, 1, 1), date(2021, 1, 4), []),
+            (date(2021, 1, 5), date(2021, 1, 8), []),
+            (date(2021, 1, 9), date(2021, 1, 10), []),
+        ])
+
+    def test_single_day(self):
+        shards = CVMAsyncBackend()._search_shards(date(2021, 1, 1), date(2021, 1, 1), [], 1, None)
+        self.assertEqual(shards, [(date(2021, 1, 1), date(2021, 1, 1), [])])
+
+    def test_cod_cvm_chunks(self):
+        shards = CVMAsyncBackend()._search_shards(
+            date(2021, 1, 1), date(2021, 1, 2), ["1", "2", "3"], 1, 2)
+
+        self.assertEqual(shards, [
+            (date(2021, 1, 1), date(2021, 1, 1), ["1", "2"]),
+            (date(2021, 1, 1), date(2021, 1, 1), ["3"]),
+            (date(2021, 1, 2), date(2021, 1, 2), ["1", "2"]),
+            (date(2021, 1, 2), date(2021, 1, 2), ["3"]),
+        ])
+
+    def test_without_sharding(self):
+        backend = CVMAsyncBackend()
+        self.assertEqual(backend._search_shards(date(2021, 1, 1), None, ["1"], None, None),
+                         [(date(2021, 1, 1), None, ["1"])])
+        self.assertEqual(backend._search_shards(None, None, ["1"], 30, None), [(None, None, ["1"])])
+
+    def test_start_after_end(self):
+        backend = CVMAsyncBackend()
+        backend._client = NoSearchClient()
+        backend._async_client = NoSearchClient()
+
+        self.assertEqual(backend._search_shards(date(2021, 2, 1), date(2021, 1, 1), [], 30, None), [])
+        results = backend.get_consulta_externa_cvm_results(
+            start_date=date(2021, 2, 1), end_date=date(2021, 1, 1), shard_days=30)
+        self.assertTrue(results.empty)
+        self.assertIn("numero_seq_documento", results.columns)
+
+        results = asyncio.run(backend.get_consulta_externa_cvm_results_async(
+            start_date=date(2021, 2, 1), end_date=date(2021, 1, 1), shard_days=30))
+        self.assertTrue(results.empty)
+
+    def test_merge_drops_duplicates(self):
+        merged = CVMAsyncBackend()._merge_search_results([
+            search_results([("1", "1", "2021-01-05"), ("2", "1", "2021-01-10")]),
+            search_results([]),
+            # A document delivered on a shard boundary comes in both shards
+            search_results([("2", "1", "2021-01-10"), ("2", "2", "2021-01-12"), ("3", "1", "2021-01-11")]),
+        ])
+
+        self.assertEqual(list(zip(merged["numero_seq_documento"], merged["version"])),
+                         [("2", "2"), ("3", "1"), ("2", "1"), ("1", "1")])
+        self.assertEqual(list(merged.index), [0, 1, 2, 3])
+
+    def test_merge_empty_results(self):
+        backend = CVMAsyncBackend()
+        empty = search_results([])
+
+        self.assertIs(backend._merge_search_results([empty]), empty)
+        self.assertTrue(backend._merge_search_results([empty, search_results([])]).empty)
+        self.assertTrue(backend._merge_search_results([]).empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
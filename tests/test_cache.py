@@ -0,0 +1,138 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from brfinance.cache import ParsedReportCache, ResponseCache
+from brfinance.http_client import CVMHttpClient
+from brfinance.http_response import BufferedResponse
+
+
+def response(content, url="http://cvm/page"):
+    return BufferedResponse(url, 200, {"Content-Type": "text/html"}, content, "utf-8")
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name, max_size=250, ttls={"search": 60})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def set(self, name, endpoint="report", last_access=None):
+        key = self.cache.key("GET", f"http://cvm/{name}")
+        self.cache.set(key, endpoint, response(name.encode("utf-8") * (100 // len(name))))
+        if last_access is not None:
+            os.utime(self.cache._paths(key)[0], (last_access, last_access))
+        return key
+
+    def test_round_trip(self):
+        key = self.set("a")
+        cached = self.cache.get(key)
+
+        self.assertEqual(cached.content, b"a" * 100)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.headers["Content-Type"], "text/html")
+        self.assertEqual(cached.text, "a" * 100)
+        self.assertIsNone(self.cache.get(self.cache.key("POST", "http://cvm/a")))
+
+    def test_ttl_expiry(self):
+        with mock.patch("brfinance.cache.time.time", return_value=1000.0):
+            search = self.set("search", endpoint="search")
+            report = self.set("report")
+
+        with mock.patch("brfinance.cache.time.time", return_value=1059.0):
+            self.assertIsNotNone(self.cache.get(search))
+        with mock.patch("brfinance.cache.time.time", return_value=1061.0):
+            self.assertIsNone(self.cache.get(search))
+            # Filed documents do not expire
+            self.assertIsNotNone(self.cache.get(report))
+
+        self.assertFalse(os.path.exists(self.cache._paths(search)[1]))
+        self.assertEqual(self.cache.size(), 96)
+
+    def test_lru_eviction(self):
+        now = time.time()
+        first = self.set("a", last_access=now - 30)
+        second = self.set("b", last_access=now - 20)
+        # Reading an entry makes it the most recently used
+        self.assertIsNotNone(self.cache.get(first))
+
+        third = self.set("c")
+
+        self.assertIsNone(self.cache.get(second))
+        self.assertIsNotNone(self.cache.get(first))
+        self.assertIsNotNone(self.cache.get(third))
+        self.assertEqual(self.cache.size(), 200)
+
+    def test_corrupted_entry_is_discarded(self):
+        key = self.set("a")
+        with open(self.cache._paths(key)[1], "wb") as body:
+            body.write(b"b" * 100)
+
+        with self.assertLogs("brfinance.cache", "WARNING"):
+            self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(self.cache._paths(key)[0]))
+
+    def test_unreadable_metadata_is_a_miss(self):
+        key = self.set("a")
+        with open(self.cache._paths(key)[0], "w") as meta:
+            meta.write("{")
+
+        self.assertIsNone(self.cache.get(key))
+
+    def test_conditional_requests_bypass_the_cache(self):
+        self.assertTrue(self.cache.is_cacheable("emissor"))
+        self.assertFalse(self.cache.is_cacheable("emissor", {"If-None-Match": '"v1"'}))
+        self.assertFalse(self.cache.is_cacheable("report", {"If-Modified-Since": "Mon, 03 Jan 2022 08:00:00 GMT"}))
+
+        session = mock.Mock()
+        session.request.side_effect = [
+            BufferedResponse(CVMHttpClient.EMISSOR_URL, 200, {"ETag": '"v1"'}, b"zip"),
+            BufferedResponse(CVMHttpClient.EMISSOR_URL, 304, {"ETag": '"v1"'}, b""),
+        ]
+        client = CVMHttpClient(session, cache=self.cache)
+
+        self.assertEqual(client.get_emissor().status_code, 200)
+        # The revalidation reaches the host instead of the cached 200
+        self.assertEqual(client.get_emissor(headers={"If-None-Match": '"v1"'}).status_code, 304)
+        self.assertEqual(client.get_emissor().content, b"zip")
+        self.assertEqual(session.request.call_count, 2)
+
+
+class ParsedReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ParsedReportCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        df = pd.DataFrame({"Conta": ["1", "1.01"], "Valor": [10.0, 2.5]})
+        self.cache.set("123", "Balanço Patrimonial Ativo", False, df)
+
+        pd.testing.assert_frame_equal(self.cache.get("123", "Balanço Patrimonial Ativo", False), df)
+        # A second read must still hit
+        self.assertIsNotNone(self.cache.get("123", "Balanço Patrimonial Ativo", False))
+        self.assertIsNone(self.cache.get("123", "Balanço Patrimonial Ativo", True))
+
+    def test_corrupted_entry_is_discarded(self):
+        df = pd.DataFrame({"Conta": ["1"], "Valor": [1.0]})
+        self.cache.set("123", "DRE", False, df)
+        path = self.cache._path(self.cache._key("123", "DRE", False), "parquet")
+        with open(path, "wb") as entry:
+            entry.write(b"not parquet")
+
+        self.assertIsNone(self.cache.get("123", "DRE", False))
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
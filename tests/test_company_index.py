@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from brfinance.company_index import Company, CompanyIndex
+
+COMPANIES = [
+    Company("009512", "PETRÓLEO BRASILEIRO S.A. - PETROBRAS", 33000167000101, ("PETR",)),
+    Company("021610", "B3 S.A. - BRASIL, BOLSA, BALCÃO", 9346601000125, ("B3SA",)),
+    Company("004170", "VALE S.A.", 33592510000154, ("VALE",)),
+    Company("019348", "BANCO BRADESCO S.A.", 60746948000112, ("BBDC",)),
+    Company("001023", "BANCO DO BRASIL S.A.", 191, ("BBAS",)),
+]
+
+
+class CompanyIndexResolveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CompanyIndex(COMPANIES)
+
+    def test_codes_cnpjs_and_tickers(self):
+        self.assertEqual(self.index.resolve("21610"), "021610")
+        self.assertEqual(self.index.resolve(9512), "009512")
+        self.assertEqual(self.index.resolve("33.000.167/0001-01"), "009512")
+        self.assertEqual(self.index.resolve("33000167000101"), "009512")
+        self.assertEqual(self.index.resolve("petr4"), "009512")
+        self.assertEqual(self.index.resolve("VALE3"), "004170")
+
+        with self.assertRaises(KeyError):
+            self.index.resolve("11.111.111/0001-11")
+
+    def test_exact_and_normalized_names(self):
+        self.assertEqual(self.index.resolve("VALE S.A."), "004170")
+        self.assertEqual(self.index.resolve("  petroleo   brasileiro s.a. - petrobras "), "009512")
+
+    def test_unique_prefix(self):
+        self.assertEqual(self.index.resolve("Petróleo Bras"), "009512")
+        self.assertEqual(self.index.resolve("banco do"), "001023")
+
+    def test_ambiguous_prefix(self):
+        with self.assertRaises(KeyError) as raised:
+            self.index.resolve("Banco")
+
+        message = str(raised.exception)
+        self.assertIn("more than one company", message)
+        self.assertIn("BANCO BRADESCO S.A. (019348)", message)
+        self.assertIn("BANCO DO BRASIL S.A. (001023)", message)
+
+    def test_typo_is_not_resolved(self):
+        # difflib would pick VALE S.A., which is only suggested
+        with self.assertRaises(KeyError) as raised:
+            self.index.resolve("VALLE S.A.")
+
+        self.assertIn("No company found for 'VALLE S.A.'", str(raised.exception))
+        self.assertIn("VALE S.A. (004170)", str(raised.exception))
+
+        with self.assertRaises(KeyError) as raised:
+            self.index.resolve("Nenhuma Empresa Parecida")
+        self.assertNotIn("did you mean", str(raised.exception))
+
+    def test_duplicated_name_is_ambiguous(self):
+        index = CompanyIndex(COMPANIES + [Company("099999", "VALE S.A.")])
+        with self.assertRaises(KeyError) as raised:
+            index.resolve("Vale S.A.")
+        self.assertIn("099999", str(raised.exception))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "empresas.json")
+            self.index.save(path)
+            loaded = CompanyIndex.load(path)
+
+        self.assertEqual(sorted(loaded, key=lambda company: company.cod_cvm),
+                         sorted(COMPANIES, key=lambda company: company.cod_cvm))
+        self.assertEqual(loaded.resolve("b3sa3"), "021610")
+
+
+if __name__ == "__main__":
+    unittest.main()
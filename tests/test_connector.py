@@ -0,0 +1,78 @@
+import gc
+import threading
+import unittest
+
+from brfinance.connector import CVMHttpClientConnector
+
+
+def in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+class ThreadScopedSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = CVMHttpClientConnector(session_scope="thread")
+        self.addCleanup(self.connector.close)
+
+    def test_one_session_per_thread(self):
+        session = self.connector.get_connector()
+        self.assertIs(self.connector.get_connector(), session)
+        self.assertIsNot(in_thread(self.connector.get_connector), session)
+
+    def test_session_dropped_with_its_thread(self):
+        in_thread(self.connector.get_connector)
+        gc.collect()
+        self.assertEqual(self.connector._sessions, {})
+
+    def test_reused_thread_ident(self):
+        # The release of a finished thread may be collected late, after a
+        # new thread with the same ident got its own session
+        def first():
+            session = self.connector.get_connector()
+            return threading.get_ident(), session, self.connector._local.release
+
+        first_ident, first_session, release = in_thread(first)
+
+        started = threading.Event()
+        finish = threading.Event()
+        second = []
+
+        def second_thread():
+            if threading.get_ident() == first_ident:
+                second.append(self.connector.get_connector())
+                started.set()
+                finish.wait()
+
+        # Finished thread idents are usually handed to the next threads
+        for _ in range(100):
+            thread = threading.Thread(target=second_thread)
+            thread.start()
+            thread.join(0.1)
+            if thread.is_alive():
+                started.wait()
+                break
+        else:
+            self.skipTest("No thread ident was reused")
+
+        try:
+            self.assertIsNot(second[0], first_session)
+            del release, first_session
+            gc.collect()
+            self.assertEqual(list(self.connector._sessions.values()), second)
+        finally:
+            finish.set()
+            thread.join()
+
+    def test_shared_scope(self):
+        connector = CVMHttpClientConnector()
+        self.addCleanup(connector.close)
+        self.assertIs(in_thread(connector.get_connector), connector.get_connector())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from brfinance.async_http_client import CVMAsyncHttpClient
+from brfinance.exceptions import ServerError
+from brfinance.http_client import BaseCVMHttpClient, CVMHttpClient
+from brfinance.http_response import BufferedResponse
+from tests.test_parsers import landing_page
+
+ATIVO = "Balanço Patrimonial Ativo"
+DRE = "Demonstração do Resultado"
+
+
+def page(url, text):
+    return BufferedResponse(url, 200, {"Content-Type": "text/html"}, text.encode("utf-8"))
+
+
+def report_page(report_url):
+    # The Ativo statement (Demonstracao=2) fails, the others are returned
+    if "Demonstracao=2&" in report_url:
+        raise ServerError(f"Request to {report_url} failed", status_code=503, url=report_url)
+    return page(report_url, DRE)
+
+
+async def report_page_async(report_url):
+    return report_page(report_url)
+
+
+class ReportPagesTest(unittest.TestCase):
+
+    def test_failed_statement_is_isolated(self):
+        client = CVMHttpClient(session=None)
+        client.get_report_landing_page = mock.Mock(return_value=page("http://cvm/landing", landing_page()))
+        client.get_report_page = mock.Mock(side_effect=report_page)
+
+        with self.assertLogs("brfinance.http_client", "ERROR"):
+            reports, errors = client.get_report_pages(112233, 1)
+
+        self.assertEqual(list(reports), [DRE])
+        self.assertEqual(reports[DRE].text, DRE)
+        self.assertEqual(list(errors), [ATIVO])
+        self.assertIsInstance(errors[ATIVO], ServerError)
+        self.assertEqual(client.get_report_page.call_count, 2)
+
+        with self.assertLogs("brfinance.http_client", "ERROR"):
+            self.assertEqual(list(client.get_reports(112233, 1)), [DRE])
+
+    def test_failed_statement_is_isolated_async(self):
+        client = CVMAsyncHttpClient(session=None)
+        landing = page("http://cvm/landing", landing_page())
+
+        async def get_report_landing_page(*args):
+            return landing
+
+        client.get_report_landing_page = get_report_landing_page
+        client.get_report_page = report_page_async
+
+        with self.assertLogs("brfinance.async_http_client", "ERROR"):
+            reports, errors = asyncio.run(client.get_report_pages(112233, 1))
+
+        self.assertEqual(list(reports), [DRE])
+        self.assertEqual(list(errors), [ATIVO])
+        self.assertIsInstance(errors[ATIVO], ServerError)
+
+        with self.assertLogs("brfinance.async_http_client", "ERROR"):
+            self.assertEqual(list(asyncio.run(client.get_reports(112233, 1))), [DRE])
+
+    def test_only_requested_statements(self):
+        client = CVMHttpClient(session=None)
+        client.get_report_landing_page = mock.Mock(return_value=page("http://cvm/landing", landing_page()))
+        client.get_report_page = mock.Mock(side_effect=report_page)
+
+        reports, errors = client.get_report_pages(112233, 1, [DRE])
+
+        self.assertEqual((list(reports), errors), ([DRE], {}))
+        self.assertEqual(client.get_report_page.call_count, 1)
+
+
+class ReportUrlsTest(unittest.TestCase):
+
+    def test_statement_urls(self):
+        report_urls = BaseCVMHttpClient()._report_urls(landing_page())
+
+        # The hidden fields are appended to every statement option
+        query = ("&CodTipoDocumento=3&NumeroSequencialDocumento=112233&NumeroSequencialRegistroCvm=1914"
+                 "&CodigoTipoInstituicao=1&Hash=a&b\"c")
+        self.assertEqual(report_urls, {
+            ATIVO: BaseCVMHttpClient.ENETCONSULTA_URL
+            + "frmDemonstracaoFinanceiraITR.aspx?Informacao=2&Demonstracao=2" + query,
+            DRE: BaseCVMHttpClient.ENETCONSULTA_URL
+            + "frmDemonstracaoFinanceiraITR.aspx?Informacao=2&Demonstracao=4" + query,
+        })
+
+    def test_reports_list(self):
+        client = BaseCVMHttpClient()
+
+        self.assertEqual(list(client._report_urls(landing_page(), [DRE])), [DRE])
+        # Statements the document does not have are left out
+        self.assertEqual(list(client._report_urls(landing_page(), [DRE, "Demonstração do Valor Adicionado"])),
+                         [DRE])
+        self.assertEqual(client._report_urls(landing_page(), []), {})
+
+    def test_missing_hidden_field(self):
+        with self.assertRaises(ValueError):
+            BaseCVMHttpClient()._report_urls(landing_page({"hdnCodigoInstituicao": None}))
+
+
+if __name__ == "__main__":
+    unittest.main()
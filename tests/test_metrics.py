@@ -0,0 +1,64 @@
+import unittest
+
+from brfinance.metrics import Metrics, PrometheusAdapter
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_labels_are_completed(self):
+        metrics = Metrics()
+        metrics.observe("parse_rows", 10, parser="search")
+        metrics.observe("parse_rows", 5, parser="report", report="DRE")
+
+        labels = [histogram["labels"] for histogram in metrics.snapshot()["histograms"]]
+        self.assertEqual(labels, [
+            {"parser": "report", "report": "DRE"},
+            {"parser": "search", "report": ""}])
+
+    def test_failing_hook_does_not_raise(self):
+        metrics = Metrics()
+        calls = []
+
+        def failing_hook(*args):
+            raise RuntimeError("exporter down")
+
+        metrics.add_hook(failing_hook)
+        metrics.add_hook(lambda *args: calls.append(args))
+        with self.assertLogs("brfinance.metrics", level="WARNING"):
+            metrics.increment("http_retries_total", endpoint="search", reason="503")
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(metrics.snapshot()["counters"][0]["value"], 1)
+
+
+@unittest.skipIf(prometheus_client is None, "prometheus_client is not installed")
+class PrometheusAdapterTest(unittest.TestCase):
+
+    def test_parsers_with_and_without_report(self):
+        registry = prometheus_client.CollectorRegistry()
+        metrics = Metrics()
+        adapter = PrometheusAdapter(metrics, registry=registry)
+        self.addCleanup(adapter.close)
+
+        with metrics.timer("parse_duration_seconds", parser="search"):
+            pass
+        metrics.observe("parse_rows", 10, parser="search")
+        with metrics.timer("parse_duration_seconds", parser="report", report="DRE"):
+            pass
+        metrics.observe("parse_rows", 5, parser="report", report="DRE")
+
+        self.assertEqual(registry.get_sample_value(
+            "brfinance_parse_rows_sum", {"parser": "search", "report": ""}), 10)
+        self.assertEqual(registry.get_sample_value(
+            "brfinance_parse_rows_sum", {"parser": "report", "report": "DRE"}), 5)
+        self.assertEqual(registry.get_sample_value(
+            "brfinance_parse_duration_seconds_count", {"parser": "report", "report": "DRE"}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+
+import pandas as pd
+
+from brfinance.panel import FinancialPanel
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+Result = namedtuple("Result", ["NumeroSequencialDocumento", "data"])
+
+
+def statement(values, currency_unit="Reais Mil"):
+    return pd.DataFrame({
+        "Conta": [f"1.0{index}" for index in range(len(values))],
+        "Descrição": [f"Conta {index}" for index in range(len(values))],
+        "Valor": values,
+        "currency_unit": currency_unit,
+    })
+
+
+def values(panel, cod_cvm, ref_date, name):
+    data = panel.data()
+    rows = data[(data["cod_cvm"] == cod_cvm) & (data["ref_date"] == pd.Timestamp(ref_date))
+                & (data["statement"] == name)]
+    return list(rows["Valor"]), set(rows["version"])
+
+
+class FinancialPanelTest(unittest.TestCase):
+
+    def test_newer_version_replaces_the_statement(self):
+        panel = FinancialPanel()
+        panel.add_document({"DRE": statement([1.0, 2.0, 3.0]), "BPA": statement([10.0])},
+                           21610, "2021-03-31", 100, version=1)
+        panel.add_document({"DRE": statement([1.0, 2.0, 3.0])}, 9512, "2021-03-31", 101, version=1)
+        self.assertEqual(len(panel), 7)
+
+        # The refiled document has fewer rows, none of the old ones are kept
+        panel.add_document({"DRE": statement([5.0, 6.0])}, 21610, "2021-03-31", 102, version=2)
+
+        self.assertEqual(values(panel, "021610", "2021-03-31", "DRE"), ([5.0, 6.0], {2}))
+        # Statements missing from the new version stay, as do other companies
+        self.assertEqual(values(panel, "021610", "2021-03-31", "BPA"), ([10.0], {1}))
+        self.assertEqual(values(panel, "009512", "2021-03-31", "DRE"), ([1.0, 2.0, 3.0], {1}))
+
+    def test_older_version_is_ignored(self):
+        panel = FinancialPanel()
+        panel.add_document({"DRE": statement([5.0])}, 21610, "2021-03-31", 102, version=2)
+        panel.data()
+        panel.add_document({"DRE": statement([1.0, 2.0])}, 21610, "2021-03-31", 100, version=1)
+
+        self.assertEqual(values(panel, "021610", "2021-03-31", "DRE"), ([5.0], {2}))
+
+    def test_same_version_keeps_the_last_added(self):
+        panel = FinancialPanel()
+        panel.add_document({"DRE": statement([1.0])}, 21610, "2021-03-31", 100, version=1)
+        panel.add_document({"DRE": statement([2.0])}, 21610, "2021-03-31", 100, version=1)
+
+        self.assertEqual(values(panel, "021610", "2021-03-31", "DRE"), ([2.0], {1}))
+
+    def test_dtypes(self):
+        panel = FinancialPanel()
+        panel.add_document({"DRE": statement([1.0]),
+                            "Demonstração das Mutações do Patrimônio Líquido": statement([1.0])},
+                           21610, "2021-03-31", 100)
+        data = panel.data()
+
+        self.assertEqual(list(data["statement"]), ["DRE"])
+        self.assertEqual(data["cod_cvm"].dtype, "category")
+        self.assertEqual(data["Valor"].dtype, "float64")
+
+    def test_add_reports(self):
+        documents = pd.DataFrame({
+            "numero_seq_documento": ["100", "102", None],
+            "cod_cvm": ["21610", "21610", "21610"],
+            "ref_date": ["2021-03-31", "2021-03-31", "2021-03-31"],
+            "version": ["1", "2", "3"],
+        })
+        panel = FinancialPanel()
+        panel.add_reports([Result(102, {"DRE": statement([5.0])}),
+                           Result(100, {"DRE": statement([1.0])})], documents)
+
+        self.assertEqual(values(panel, "021610", "2021-03-31", "DRE"), ([5.0], {2}))
+        with self.assertRaises(KeyError):
+            panel.add_reports([Result(999, {})], documents)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet_replaces_the_stored_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "panel")
+            panel = FinancialPanel()
+            panel.add_document({"DRE": statement([1.0, 2.0])}, 21610, "2021-03-31", 100, version=1)
+            panel.add_document({"DRE": statement([3.0])}, 21610, "2021-06-30", 101, version=1)
+            panel.to_parquet(path)
+
+            # A new session refiles one date only
+            panel = FinancialPanel()
+            panel.add_document({"DRE": statement([9.0])}, 21610, "2021-03-31", 102, version=2)
+            panel.to_parquet(path)
+
+            loaded = FinancialPanel.read_parquet(path)
+            self.assertEqual(values(loaded, "021610", "2021-03-31", "DRE"), ([9.0], {2}))
+            self.assertEqual(values(loaded, "021610", "2021-06-30", "DRE"), ([3.0], {1}))
+
+            filtered = FinancialPanel.read_parquet(path, start_date="2021-04-01")
+            self.assertEqual(list(filtered.data()["Valor"]), [3.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+import io
+import unittest
+import zipfile
+
+import numpy as np
+
+from brfinance.parsers import (
+    DFC_STATEMENT,
+    DMPL_STATEMENT,
+    extract_form_fields,
+    parse_package_statements,
+    parse_report_landing,
+    parse_statement_html
+)
+from brfinance.utils import extract_substring
+
+STATEMENT = "Demonstração do Resultado"
+
+# (conta, descrição, current period, previous period)
+ROWS = [("3.01", "Receita de Venda de Bens e/ou Serviços", 1500.0, 1200.0),
+        ("3.02", "Custo dos Bens e/ou Serviços Vendidos", -900.0, np.nan)]
+
+
+def statement_page(rows):
+    header = "".join(f'<td class="ColunaTitulo">{column}</td>' for column in [
+        "Conta", "Descrição", "01/01/2021 à 31/03/2021", "01/01/2020 à 31/03/2020"])
+    body = "".join(
+        f"<tr><td>{conta}</td><td>{descricao}</td>"
+        + "".join(f'<td align="right">{"" if np.isnan(value) else f"{value:.0f}"}</td>'
+                  for value in values)
+        + "</tr>"
+        for conta, descricao, *values in rows)
+    return (
+        f'<html><body><div id="TituloTabelaSemBorda">DFs Consolidadas - {STATEMENT} - (Reais Mil)</div>'
+        f'<table id="ctl00_cphPopUp_tbDados"><tr>{header}</tr>{body}</table></body></html>')
+
+
+def table(rows):
+    return "<table>" + "".join(
+        "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows) + "</table>"
+
+
+def page(title, *tables):
+    return (f'<html><body><div id="TituloTabelaSemBorda">{title}</div>'
+            + "".join(tables) + "</body></html>")
+
+
+def landing_page(hidden=None):
+    # frmGerenciaPaginaFRE.aspx with its hidden fields and statement options
+    hidden = {
+        "hdnNumeroSequencialDocumento": "112233",
+        "hdnCodigoTipoDocumento": "3",
+        "hdnCodigoInstituicao": "1",
+        "hdnHash": "a&amp;b&quot;c",
+        **(hidden or {})}
+    inputs = "".join(f'<input type="hidden" name="{name}" id="{name}" value="{value}" />'
+                     for name, value in hidden.items() if value is not None)
+    return (
+        "<html><body><form>"
+        '<script>var url = "frmDemonstracaoFinanceiraITR.aspx?NumeroSequencialRegistroCvm=9&Grupo=x";'
+        'var fre = "frmGerenciaPaginaFRE.aspx?NumeroSequencialRegistroCvm=1914&CodigoTipoInstituicao=1";'
+        "</script>"
+        f"{inputs}"
+        '<select name="cmbQuadro" id="cmbQuadro" onchange="a > b">'
+        '<option value="frmDemonstracaoFinanceiraITR.aspx?Informacao=2&amp;Demonstracao=2">'
+        "Balanço Patrimonial Ativo</option>"
+        '<option selected="selected" value="frmDemonstracaoFinanceiraITR.aspx?Informacao=2&amp;Demonstracao=4">'
+        "Demonstração do Resultado"
+        "</select></form></body></html>")
+
+
+def document_package(rows):
+    records = "".join(
+        "<InfoFinaDFin><PlanoConta><VersaoPlanoConta>"
+        "<CodigoTipoInformacaoFinanceira>2</CodigoTipoInformacaoFinanceira>"
+        "<CodigoTipoDemonstracaoFinanceira>4</CodigoTipoDemonstracaoFinanceira>"
+        f"</VersaoPlanoConta><NumeroConta>{conta}</NumeroConta></PlanoConta>"
+        f"<DescricaoConta1>{descricao}</DescricaoConta1>"
+        + "".join(f"<ValorConta{index}>{'' if np.isnan(value) else f'{value:.2f}'}</ValorConta{index}>"
+                  for index, value in enumerate(values, start=1))
+        + "</InfoFinaDFin>"
+        for conta, descricao, *values in rows)
+
+    package = io.BytesIO()
+    with zipfile.ZipFile(package, "w") as package_file:
+        package_file.writestr(
+            "InfoFinaDFin.xml", f"<ArrayOfInfoFinaDFin>{records}</ArrayOfInfoFinaDFin>".encode("utf-8"))
+        package_file.writestr(
+            "FormularioDemonstracaoFinanceiraITR.xml",
+            "<FormularioDemonstracaoFinanceiraITR><CodigoEscalaMoedaNacional>2"
+            "</CodigoEscalaMoedaNacional></FormularioDemonstracaoFinanceiraITR>")
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as archive_file:
+        archive_file.writestr("100000.itr", package.getvalue())
+    return zipfile.ZipFile(archive)
+
+
+class ParseStatementHtmlTest(unittest.TestCase):
+
+    def test_values(self):
+        df = parse_statement_html(statement_page(ROWS), STATEMENT, previous_results=True)
+
+        self.assertEqual(list(df.columns), [
+            "Conta", "Descrição", "01/01/2021 à 31/03/2021", "01/01/2020 à 31/03/2020", "currency_unit"])
+        self.assertEqual(list(df["Conta"]), ["3.01", "3.02"])
+        np.testing.assert_array_equal(df["01/01/2020 à 31/03/2020"], [1200.0, np.nan])
+        self.assertEqual(set(df["currency_unit"]), {"Reais Mil"})
+
+    def test_negative_and_formatted_values(self):
+        html = page("DFs Consolidadas - Demonstração do Resultado - (Reais)", table([
+            ("Conta", "Descrição", "01/01/2021 à 31/03/2021"),
+            ("3.01", "Receita", "1.234.567"),
+            ("3.02", "Custo", "-987.654"),
+            ("3.99.01.01", "ON", "0,12345"),
+            ("3.99.01.02", "PN", "-0,5"),
+            ("3.10", "Outros", "-"),
+        ]))
+        df = parse_statement_html(html, STATEMENT)
+
+        self.assertEqual(list(df.columns), ["Conta", "Descrição", "Valor", "currency_unit"])
+        np.testing.assert_array_equal(df["Valor"], [1234567.0, -987654.0, 0.12345, -0.5, np.nan])
+        self.assertEqual(df["Valor"].dtype, np.float64)
+        self.assertEqual(set(df["currency_unit"]), {"Reais"})
+
+    def test_dfc_currency_unit(self):
+        # The DFC title ends with the method, so the unit is second to last
+        html = page(
+            f"DFs Consolidadas - {DFC_STATEMENT} - (Reais Mil) - Método Indireto",
+            table([("Conta", "Descrição", "01/01/2021 à 31/03/2021"), ("6.01", "Caixa", "10")]))
+        df = parse_statement_html(html, DFC_STATEMENT)
+
+        self.assertEqual(set(df["currency_unit"]), {"Reais Mil"})
+        self.assertEqual(list(df["Valor"]), [10.0])
+
+    def test_dmpl_reads_the_second_table(self):
+        html = page(
+            f"DFs Consolidadas - {DMPL_STATEMENT} - 01/01/2021 à 31/03/2021 - (Reais Mil)",
+            table([("Período", "01/01/2021 à 31/03/2021")]),
+            table([
+                ("Conta", "Descrição", "Capital Social", "Reservas de Lucro", "Patrimônio Líquido"),
+                ("5.01", "Saldos Iniciais", "1.000", "200", "1.200"),
+                ("5.04", "Dividendos", "", "-50", "-50"),
+            ]))
+        df = parse_statement_html(html, DMPL_STATEMENT)
+
+        # Every column is kept, even without previous_results
+        self.assertEqual(list(df.columns), [
+            "Conta", "Descrição", "Capital Social", "Reservas de Lucro", "Patrimônio Líquido",
+            "currency_unit"])
+        np.testing.assert_array_equal(df["Capital Social"], [1000.0, np.nan])
+        np.testing.assert_array_equal(df["Patrimônio Líquido"], [1200.0, -50.0])
+        self.assertEqual(set(df["currency_unit"]), {"Reais Mil"})
+
+    def test_empty_table(self):
+        html = page(f"DFs Consolidadas - {STATEMENT} - (Reais Mil)",
+                    table([("Conta", "Descrição", "01/01/2021 à 31/03/2021")]))
+        df = parse_statement_html(html, STATEMENT)
+
+        self.assertTrue(df.empty)
+        self.assertEqual(list(df.columns), ["Conta", "Descrição", "Valor", "currency_unit"])
+        self.assertEqual(df["Valor"].dtype, np.float64)
+
+    def test_page_without_tables(self):
+        with self.assertRaises(ValueError):
+            parse_statement_html(page(f"DFs Consolidadas - {STATEMENT} - (Reais Mil)"), STATEMENT)
+
+
+class ReportLandingTest(unittest.TestCase):
+
+    def test_fields(self):
+        html = landing_page()
+        fields = parse_report_landing(html)
+
+        self.assertEqual(fields["hdnNumeroSequencialDocumento"], "112233")
+        self.assertEqual(fields["hdnCodigoTipoDocumento"], "3")
+        self.assertEqual(fields["hdnCodigoInstituicao"], "1")
+        # Attribute values are unescaped
+        self.assertEqual(fields["hdnHash"], 'a&b"c')
+        self.assertEqual(fields["cmbQuadro"], [
+            ("frmDemonstracaoFinanceiraITR.aspx?Informacao=2&Demonstracao=2", "Balanço Patrimonial Ativo"),
+            ("frmDemonstracaoFinanceiraITR.aspx?Informacao=2&Demonstracao=4", "Demonstração do Resultado"),
+        ])
+        self.assertEqual(fields["NumeroSequencialRegistroCvm"], "1914")
+        self.assertEqual(fields["NumeroSequencialRegistroCvm"],
+                         extract_substring("NumeroSequencialRegistroCvm=", "&", html))
+
+    def test_missing_fields(self):
+        with self.assertRaisesRegex(ValueError, "hdnHash"):
+            parse_report_landing(landing_page({"hdnHash": None}))
+
+        # A page without statements has no options
+        html = landing_page().split("<select")[0] + "</form></body></html>"
+        self.assertEqual(parse_report_landing(html)["cmbQuadro"], [])
+
+    def test_extract_form_fields(self):
+        html = landing_page()
+
+        self.assertEqual(extract_form_fields(html, ["hdnCodigoTipoDocumento", "hdnMissing"]),
+                         {"hdnCodigoTipoDocumento": "3"})
+        self.assertEqual(extract_form_fields(html, []), {})
+        self.assertEqual(
+            extract_form_fields("<input id='single' value='it&#39;s'><input id=bare value=1>", ["single", "bare"]),
+            {"single": "it's", "bare": "1"})
+        self.assertEqual(extract_form_fields('<input id="empty">', ["empty"]), {"empty": ""})
+
+
+class PackageParityTest(unittest.TestCase):
+
+    def test_same_statement_as_the_page(self):
+        expected = parse_statement_html(statement_page(ROWS), STATEMENT)
+        with document_package(ROWS) as archive:
+            actual = parse_package_statements(archive)[STATEMENT]
+
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        for column in ("Conta", "Descrição", "currency_unit"):
+            self.assertEqual(list(actual[column]), list(expected[column]))
+        np.testing.assert_array_equal(actual["Valor"], expected["Valor"])
+
+    def test_previous_results_columns_follow_the_page_order(self):
+        expected = parse_statement_html(statement_page(ROWS), STATEMENT, previous_results=True)
+        with document_package(ROWS) as archive:
+            actual = parse_package_statements(archive, previous_results=True)[STATEMENT]
+
+        # The package has no period headers, its values are numbered
+        self.assertEqual(list(actual.columns),
+                         ["Conta", "Descrição", "Valor 1", "Valor 2", "currency_unit"])
+        np.testing.assert_array_equal(actual["Valor 1"], expected["01/01/2021 à 31/03/2021"])
+        np.testing.assert_array_equal(actual["Valor 2"], expected["01/01/2020 à 31/03/2020"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import io
+import json
+import unittest
+import zipfile
+
+import pandas as pd
+import requests
+
+from brfinance.constants import ENET_URL
+from brfinance.http_response import BufferedResponse
+from brfinance.responses import (
+    GetCadastroInstrumentosResponse,
+    GetEmissorResponse,
+    GetSearchResponse,
+    _spool_response
+)
+
+
+def streamed_response(body, encoding=None):
+    # requests.Response reading from `raw` as it does for stream=True
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    response.encoding = encoding
+    return response
+
+
+def instruments_csv(rows):
+    lines = ["RptDt;TckrSymb;SgmtNm;ExrcPric"]
+    lines += [f"2022-01-03;TICK{row};CASH;{row},5" for row in range(rows)]
+    return "\n".join(lines).encode("latin-1")
+
+
+class GetCadastroInstrumentosResponseTest(unittest.TestCase):
+
+    def test_streamed_chunks_do_not_load_the_body(self):
+        body = instruments_csv(200_000)
+        response = streamed_response(body, encoding="latin-1")
+
+        chunks = GetCadastroInstrumentosResponse(response).chunks(chunksize=1000)
+        first = next(chunks)
+
+        self.assertEqual(len(first), 1000)
+        self.assertFalse(response._content)
+        self.assertLess(response.raw.tell(), len(body))
+        self.assertEqual(sum(len(chunk) for chunk in chunks) + len(first), 200_000)
+
+    def test_buffered_response(self):
+        response = BufferedResponse("http://b3", 200, {}, instruments_csv(10), encoding="latin-1")
+        data = GetCadastroInstrumentosResponse(response).data()
+
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data["ExrcPric"].dtype, "float64")
+        self.assertEqual(data["SgmtNm"].dtype, "category")
+
+
+def emissor_zip(rows):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr("EMISSOR.TXT", "".join(
+            f'"A{row:03d}","EMPRESA {row}","{row:014d}","20160101"\n' for row in range(rows)))
+    return archive.getvalue()
+
+
+class SpoolResponseTest(unittest.TestCase):
+
+    def test_large_streamed_body_goes_to_disk(self):
+        body = b"x" * (256 * 1024)
+        response = streamed_response(body)
+
+        spool = _spool_response(response, max_size=64 * 1024)
+        self.addCleanup(spool.close)
+
+        self.assertFalse(response._content)
+        self.assertTrue(spool._rolled)
+        self.assertEqual(spool.read(), body)
+
+    def test_small_streamed_body_stays_in_memory(self):
+        spool = _spool_response(streamed_response(b"abc"), max_size=64 * 1024)
+        self.addCleanup(spool.close)
+
+        self.assertFalse(spool._rolled)
+        self.assertEqual(spool.read(), b"abc")
+
+    def test_emissor_from_streamed_response(self):
+        response = streamed_response(emissor_zip(5000))
+        emissor = GetEmissorResponse(response)
+        emissor.SPOOL_MAX_SIZE = 1024
+
+        data = emissor.data()
+        self.addCleanup(emissor.archive().fp.close)
+
+        self.assertFalse(response._content)
+        self.assertTrue(emissor.archive().fp._rolled)
+        self.assertEqual(len(data), 5000)
+        self.assertEqual(str(data["cnpj"].dtype), "Int64")
+
+
+VIEW = ("<i class='fi-page-search' onclick=\"OpenPopUpVer("
+        "'frmGerenciaPaginaFRE.aspx?NumeroSequencialDocumento={numero}&CodigoTipoInstituicao=1')\"></i>")
+DOWNLOAD = "<i class='fi-download' onclick=\"OpenDownloadDocumentos('{numero}','2','{numero}0','IPE')\"></i>"
+
+
+def search_record(cod_cvm, ref_date, data_entrega, version, acoes=None):
+    # A ListarDocumentos record; padding records stop before acoes
+    fields = [cod_cvm, "EMPRESA S.A.", "ITR", "-", "-",
+              f"<spanOrder>{ref_date}</spanOrder> {ref_date[6:]}/{ref_date[4:6]}/{ref_date[:4]}",
+              f"<spanOrder>x</spanOrder> {data_entrega}", "Ativo", version, "AP"]
+    if acoes is not None:
+        fields += [acoes, ""]
+    return "$&".join(fields)
+
+
+def search_response(records):
+    payload = {"d": {"dados": "$&&*".join(records)}}
+    return BufferedResponse("http://cvm/search", 200, {}, json.dumps(payload).encode("utf-8"))
+
+
+class GetSearchResponseTest(unittest.TestCase):
+
+    def test_get_search_results_payload(self):
+        response = search_response([
+            search_record("00906-1", "20210331", "10/05/2021 18:29", "1",
+                          VIEW.format(numero=100) + DOWNLOAD.format(numero=100)),
+            # Records without acoes are padding and are dropped, as before
+            search_record("00907-1", "20210331", "11/05/2021 09:00", "1"),
+            search_record("01023-1", "20201231", "12/05/2021 08:05", "2", DOWNLOAD.format(numero=101)),
+            search_record("01024-1", "20201231", "09/05/2021 10:00", "1", ""),
+            "",
+        ])
+
+        df = GetSearchResponse(response).data()
+
+        self.assertEqual(list(df.columns), [
+            "cod_cvm", "empresa", "categoria", "tipo", "especie", "ref_date", "data_entrega", "status",
+            "version", "modalidade", "acoes", "outros", "view_url", "numero_seq_documento",
+            "codigo_tipo_instituicao", "numSequencia", "numVersao", "numProtocolo", "descTipo"])
+        # Sorted by data_entrega, keeping the position of each record
+        self.assertEqual(list(df.index), [2, 0, 3])
+        self.assertEqual(list(df["cod_cvm"]), ["010231", "009061", "010241"])
+        self.assertEqual(list(df["version"]), ["2", "1", "1"])
+        self.assertEqual(list(df["data_entrega"]), list(pd.to_datetime(
+            ["2021-05-12 08:05", "2021-05-10 18:29", "2021-05-09 10:00"])))
+        self.assertEqual(list(df["ref_date"]), list(pd.to_datetime(["2020-12-31", "2021-03-31", "2020-12-31"])))
+
+        first = df.loc[0]
+        self.assertEqual(first["view_url"], ENET_URL + (
+            "frmGerenciaPaginaFRE.aspx?NumeroSequencialDocumento=100&CodigoTipoInstituicao=1"))
+        self.assertEqual((first["numero_seq_documento"], first["codigo_tipo_instituicao"]), ("100", "1"))
+        self.assertEqual([first[column] for column in ("numSequencia", "numVersao", "numProtocolo", "descTipo")],
+                         ["100", "2", "1000", "IPE"])
+
+        # Without OpenPopUpVer there is no document to view
+        download_only = df.loc[2]
+        self.assertTrue(pd.isna(download_only["view_url"]))
+        self.assertTrue(pd.isna(download_only["numero_seq_documento"]))
+        self.assertEqual(download_only["numSequencia"], "101")
+
+        empty_acoes = df.loc[3]
+        self.assertTrue(all(pd.isna(empty_acoes[column]) for column in (
+            "view_url", "numero_seq_documento", "numSequencia", "descTipo", "outros")))
+
+    def test_empty_results(self):
+        all_columns = list(GetSearchResponse.empty().columns)
+
+        self.assertTrue(GetSearchResponse(search_response([])).data().empty)
+        padding = search_record("00907-1", "20210331", "11/05/2021 09:00", "1")
+        df = GetSearchResponse(search_response([padding])).data()
+        self.assertTrue(df.empty)
+        self.assertEqual(list(df.columns), all_columns)
+
+    def test_malformed_dates_raise(self):
+        response = search_response([search_record("00906-1", "20211350", "10/05/2021 18:29", "1", "")])
+        with self.assertRaises(ValueError):
+            GetSearchResponse(response).data()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+from brfinance.exceptions import (
+    CircuitOpenError,
+    ClientError,
+    ConnectionFailedError,
+    ServerError,
+    ThrottledError
+)
+from brfinance.async_http_client import CVMAsyncHttpClient
+from brfinance.http_client import CVMHttpClient
+from brfinance.http_response import BufferedResponse
+from brfinance.retry import CircuitBreaker, RetryPolicy, error_for_response, parse_retry_after
+
+
+def response(status, headers=None):
+    return BufferedResponse("http://cvm/page", status, headers or {}, b"", None)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertEqual(parse_retry_after("-3"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_http_date(self):
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+        self.assertAlmostEqual(parse_retry_after(format_datetime(retry_at, usegmt=True)), 60, delta=2)
+
+        past = datetime.now(timezone.utc) - timedelta(seconds=60)
+        self.assertEqual(parse_retry_after(format_datetime(past, usegmt=True)), 0.0)
+
+    def test_typed_errors(self):
+        self.assertIsNone(error_for_response(response(200)))
+
+        throttled = error_for_response(response(429, {"Retry-After": "5"}))
+        self.assertIsInstance(throttled, ThrottledError)
+        self.assertEqual(throttled.retry_after, 5.0)
+
+        server = error_for_response(response(503, {"Retry-After": "2"}))
+        self.assertIsInstance(server, ServerError)
+        self.assertEqual(server.retry_after, 2.0)
+
+        self.assertIsInstance(error_for_response(response(404)), ClientError)
+
+    def test_retry_after_overrides_backoff(self):
+        policy = RetryPolicy(max_retry_after=10)
+        self.assertEqual(policy.retry_delay("GET", 1, ThrottledError("", status_code=429, retry_after=3)), 3)
+        # Capped at max_retry_after
+        self.assertEqual(policy.retry_delay("GET", 1, ThrottledError("", status_code=429, retry_after=60)), 10)
+
+        ignoring = RetryPolicy(jitter=False, respect_retry_after=False)
+        self.assertEqual(ignoring.retry_delay("GET", 1, ServerError("", status_code=503, retry_after=60)),
+                         ignoring.backoff_factor)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_backoff_without_jitter(self):
+        policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+        self.assertEqual([policy.backoff(attempt) for attempt in range(1, 6)], [0.5, 1, 2, 3, 3])
+
+    def test_jitter_bounds(self):
+        policy = RetryPolicy(backoff_factor=0.5, max_backoff=3)
+        for attempt in range(1, 6):
+            ceiling = min(3, 0.5 * 2 ** (attempt - 1))
+            delays = [policy.backoff(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+            # Full jitter spreads the delays over the whole interval
+            self.assertLess(min(delays), ceiling / 4)
+            self.assertGreater(max(delays), ceiling * 3 / 4)
+
+    def test_gives_up(self):
+        policy = RetryPolicy(max_attempts=3)
+        error = ServerError("", status_code=502)
+        self.assertIsNotNone(policy.retry_delay("GET", 2, error))
+        self.assertIsNone(policy.retry_delay("GET", 3, error))
+        # Not idempotent, and not a retryable status
+        self.assertIsNone(policy.retry_delay("POST", 1, error))
+        self.assertIsNotNone(policy.retry_delay("POST", 1, error, idempotent=True))
+        self.assertIsNone(policy.retry_delay("GET", 1, ClientError("", status_code=404)))
+        self.assertIsNotNone(policy.retry_delay("GET", 1, ConnectionFailedError("")))
+
+
+@mock.patch("brfinance.retry.time.monotonic")
+class CircuitBreakerTest(unittest.TestCase):
+
+    def open_breaker(self, monotonic):
+        monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+        for _ in range(3):
+            breaker.before_request("cvm")
+            breaker.record("cvm", ServerError("", status_code=503))
+        return breaker
+
+    def test_opens_after_consecutive_failures(self, monotonic):
+        monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+        for _ in range(2):
+            breaker.record("cvm", ConnectionFailedError(""))
+        # A success resets the count, and a 4xx is a success
+        breaker.record("cvm", ClientError("", status_code=404))
+        for _ in range(2):
+            breaker.record("cvm", ThrottledError("", status_code=429))
+        self.assertFalse(breaker.is_open("cvm"))
+
+        breaker.record("cvm", ServerError("", status_code=500))
+        self.assertTrue(breaker.is_open("cvm"))
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.before_request("cvm")
+        self.assertEqual(raised.exception.retry_at, 130.0)
+        # Other hosts are not affected
+        breaker.before_request("b3")
+
+    def test_half_open_trial_closes(self, monotonic):
+        breaker = self.open_breaker(monotonic)
+
+        monotonic.return_value = 131.0
+        self.assertFalse(breaker.is_open("cvm"))
+        breaker.before_request("cvm")
+        # A single trial request at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request("cvm")
+
+        breaker.record("cvm", None)
+        breaker.before_request("cvm")
+        breaker.before_request("cvm")
+
+    def test_half_open_trial_reopens(self, monotonic):
+        breaker = self.open_breaker(monotonic)
+
+        monotonic.return_value = 131.0
+        breaker.before_request("cvm")
+        breaker.record("cvm", ServerError("", status_code=503))
+
+        self.assertTrue(breaker.is_open("cvm"))
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.before_request("cvm")
+        self.assertEqual(raised.exception.retry_at, 161.0)
+
+
+@mock.patch("brfinance.retry.time.monotonic", return_value=100.0)
+class TrialRequestTest(unittest.TestCase):
+    """A trial request failing outside the HTTP layer must give the trial
+    back instead of keeping the host refused forever."""
+
+    def half_open_breaker(self, monotonic):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30)
+        breaker.record("cvm", ServerError("", status_code=503))
+        monotonic.return_value = 131.0
+        return breaker
+
+    def test_sync_trial_failing_in_the_library(self, monotonic):
+        breaker = self.half_open_breaker(monotonic)
+        client = CVMHttpClient(session=None, circuit_breaker=breaker)
+
+        with mock.patch.object(client, "_send", side_effect=UnicodeDecodeError("utf-8", b"", 0, 1, "bad")):
+            with self.assertRaises(UnicodeDecodeError):
+                client._request("GET", "http://cvm/page")
+
+        # The next request is the new trial, and closes the circuit
+        with mock.patch.object(client, "_send", return_value=response(200)):
+            self.assertEqual(client._request("GET", "http://cvm/page").status_code, 200)
+        self.assertFalse(breaker.is_open("cvm"))
+        breaker.before_request("cvm")
+
+    def test_sync_trial_interrupted(self, monotonic):
+        breaker = self.half_open_breaker(monotonic)
+        client = CVMHttpClient(session=None, circuit_breaker=breaker)
+
+        with mock.patch.object(client, "_send", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                client._request("GET", "http://cvm/page")
+
+        self.assertTrue(breaker.before_request("cvm"))
+
+    def test_async_trial_cancelled(self, monotonic):
+        breaker = self.half_open_breaker(monotonic)
+        client = CVMAsyncHttpClient(session=None, circuit_breaker=breaker)
+
+        async def main():
+            started = asyncio.Event()
+
+            async def send(*args, **kwargs):
+                started.set()
+                await asyncio.sleep(60)
+
+            with mock.patch.object(client, "_send", send):
+                request = asyncio.ensure_future(client._request("GET", "http://cvm/page"))
+                await started.wait()
+                request.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await request
+
+        asyncio.run(main())
+        self.assertTrue(breaker.before_request("cvm"))
+
+    def test_only_the_trial_is_released(self, monotonic):
+        breaker = self.half_open_breaker(monotonic)
+        self.assertTrue(breaker.before_request("cvm"))
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request("cvm")
+
+        breaker.release_trial("cvm")
+        self.assertTrue(breaker.before_request("cvm"))
+
+
+if __name__ == "__main__":
+    unittest.main()
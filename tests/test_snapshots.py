@@ -0,0 +1,156 @@
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+import pandas as pd
+
+from brfinance.backend import CVMAsyncBackend
+from brfinance.http_response import BufferedResponse
+from brfinance.snapshots import ReferenceSnapshotStore, diff_snapshots
+from tests.test_responses import emissor_zip
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def instruments(rows, rpt_dt="2022-01-03"):
+    # (TckrSymb, ExrcPric) rows of InstrumentsConsolidated
+    return pd.DataFrame({
+        "RptDt": pd.Categorical([rpt_dt] * len(rows)),
+        "TckrSymb": [ticker for ticker, _ in rows],
+        "ExrcPric": [price for _, price in rows],
+    })
+
+
+class DiffSnapshotsTest(unittest.TestCase):
+
+    def test_rows_added_changed_and_removed(self):
+        previous = instruments([("PETR4", 1.0), ("VALE3", 2.0), ("OIBR3", 3.0)], "2022-01-03")
+        current = instruments([("PETR4", 1.0), ("VALE3", 2.5), ("B3SA3", 4.0)], "2022-01-04")
+
+        changes = diff_snapshots(previous, current, ["TckrSymb"], ["RptDt"])
+
+        self.assertEqual(
+            sorted(zip(changes["TckrSymb"], changes["change"])),
+            [("B3SA3", "added"), ("OIBR3", "removed"), ("VALE3", "changed")])
+        self.assertEqual(changes.loc[changes["TckrSymb"] == "VALE3", "ExrcPric"].item(), 2.5)
+
+    def test_ignored_and_categorical_columns(self):
+        previous = instruments([("PETR4", 1.0), ("VALE3", 2.0)], "2022-01-03")
+        current = instruments([("VALE3", 2.0), ("PETR4", 1.0)], "2022-01-04")
+        current["RptDt"] = current["RptDt"].cat.add_categories(["2099-01-01"])
+
+        self.assertTrue(diff_snapshots(previous, current, ["TckrSymb"], ["RptDt"]).empty)
+        self.assertEqual(len(diff_snapshots(previous, current, ["TckrSymb"])), 2)
+
+
+class FakeEmissorClient():
+    """Answers 304 when the request revalidates `etag`."""
+
+    EMISSOR_URL = "http://b3/emissor.zip"
+
+    def __init__(self, content, etag):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get_emissor(self, stream=False, headers=None):
+        self.requests.append(headers or {})
+        if (headers or {}).get("If-None-Match") == self.etag:
+            return BufferedResponse(self.EMISSOR_URL, 304, {"ETag": self.etag}, b"")
+        return BufferedResponse(self.EMISSOR_URL, 200, {
+            "ETag": self.etag, "Last-Modified": "Mon, 03 Jan 2022 08:00:00 GMT"}, self.content)
+
+
+def today(day):
+    # Patches date.today() in the backend, which stamps the emissor snapshots
+    fixed = mock.Mock(wraps=date)
+    fixed.today.return_value = day
+    return mock.patch("brfinance.backend.date", fixed)
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class ReferenceSnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ReferenceSnapshotStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_diff_with_the_previous_snapshot(self):
+        self.store.set("cadastro_instrumentos", date(2022, 1, 3), instruments([("PETR4", 1.0)]))
+        self.assertEqual(list(self.store.diff("cadastro_instrumentos", date(2022, 1, 3))["change"]), ["added"])
+
+        self.store.set("cadastro_instrumentos", date(2022, 1, 4),
+                       instruments([("PETR4", 1.5), ("VALE3", 2.0)], "2022-01-04"))
+        self.store.set("cadastro_instrumentos", date(2022, 1, 5),
+                       instruments([("PETR4", 1.5)], "2022-01-05"))
+
+        self.assertEqual(self.store.previous_date("cadastro_instrumentos", date(2022, 1, 5)), date(2022, 1, 4))
+        changes = self.store.diff("cadastro_instrumentos", date(2022, 1, 5))
+        self.assertEqual(list(zip(changes["TckrSymb"], changes["change"])), [("VALE3", "removed")])
+        changes = self.store.diff("cadastro_instrumentos", date(2022, 1, 5), previous_date=date(2022, 1, 3))
+        self.assertEqual(list(zip(changes["TckrSymb"], changes["change"])), [("PETR4", "changed")])
+
+        with self.assertRaises(KeyError):
+            self.store.diff("cadastro_instrumentos", date(2022, 1, 6))
+
+    def test_conditional_headers(self):
+        df = instruments([("PETR4", 1.0)])
+        self.store.set("emissor", date(2022, 1, 3), df, url="http://b3/a",
+                       validators={"etag": '"abc"', "last_modified": "Mon, 03 Jan 2022 08:00:00 GMT"})
+        self.store.set("cadastro_instrumentos", date(2022, 1, 3), df, url="http://b3/a",
+                       validators={"etag": 'W/"abc"', "last_modified": None})
+
+        self.assertEqual(self.store.conditional_headers("emissor", date(2022, 1, 3), "http://b3/a"), {
+            "If-None-Match": '"abc"', "If-Modified-Since": "Mon, 03 Jan 2022 08:00:00 GMT"})
+        # A new URL (a new token) only keeps the strong ETag
+        self.assertEqual(self.store.conditional_headers("emissor", date(2022, 1, 3), "http://b3/b"),
+                         {"If-None-Match": '"abc"'})
+        self.assertEqual(
+            self.store.conditional_headers("cadastro_instrumentos", date(2022, 1, 3), "http://b3/b"), {})
+        self.assertEqual(self.store.conditional_headers("emissor", None, "http://b3/a"), {})
+
+    def test_not_modified_reuses_the_previous_snapshot(self):
+        backend = CVMAsyncBackend(snapshot_store=self.store)
+        backend._client = FakeEmissorClient(emissor_zip(3), '"v1"')
+
+        with today(date(2022, 1, 3)):
+            first = backend.get_emissor()
+        self.assertEqual(len(first), 3)
+        self.assertEqual(backend._client.requests, [{}])
+
+        with today(date(2022, 1, 4)):
+            second = backend.get_emissor()
+        self.assertEqual(backend._client.requests[-1]["If-None-Match"], '"v1"')
+        pd.testing.assert_frame_equal(second, first)
+        # The reused snapshot keeps the validators of the download
+        self.assertEqual(self.store.metadata("emissor", date(2022, 1, 4))["etag"], '"v1"')
+        self.assertTrue(backend.get_emissor_changes(date(2022, 1, 4)).empty)
+
+        # Stored dates are not requested again
+        backend.get_emissor(ref_date=date(2022, 1, 4))
+        self.assertEqual(len(backend._client.requests), 2)
+
+    def test_emissor_of_a_past_date_is_not_downloaded(self):
+        backend = CVMAsyncBackend(snapshot_store=self.store)
+        backend._client = FakeEmissorClient(emissor_zip(3), '"v1"')
+
+        with today(date(2022, 1, 5)):
+            backend.get_emissor()
+            # Today's file would be stored as the snapshot of another day
+            with self.assertRaises(ValueError):
+                backend.get_emissor(ref_date=date(2022, 1, 4))
+            self.assertEqual(len(backend.get_emissor(ref_date=date(2022, 1, 5))), 3)
+
+        self.assertEqual(len(backend._client.requests), 1)
+        self.assertIsNone(self.store.get("emissor", date(2022, 1, 4)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from brfinance.sync import WatermarkStore, sync_scope
+
+
+def documents(rows):
+    # (numSequencia, numVersao, numero_seq_documento, data_entrega) rows of
+    # a search result
+    return pd.DataFrame({
+        "numSequencia": [row[0] for row in rows],
+        "numVersao": [row[1] for row in rows],
+        "numero_seq_documento": [row[2] for row in rows],
+        "version": [row[1] for row in rows],
+        "view_url": [f"http://cvm/{row[0]}" for row in rows],
+        "data_entrega": pd.to_datetime([row[3] for row in rows]),
+    })
+
+
+class WatermarkStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = WatermarkStore(os.path.join(self.directory.name, "sync.sqlite"))
+        self.scope = sync_scope(["EST_4"], ["1"], ["21610"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_scope_ignores_order(self):
+        self.assertEqual(sync_scope(["EST_4", "EST_3"], ["1"], ["2", "1"]),
+                         sync_scope(["EST_3", "EST_4"], ["1"], ["1", "2"]))
+
+    def test_dedupe_across_versions(self):
+        first = documents([("100", "1", "500", "2021-05-10"),
+                           ("101", "1", "501", "2021-05-11")])
+        new = self.store.new_documents(self.scope, first)
+        self.assertEqual(list(new["sync_status"]), ["new", "new"])
+        self.store.mark_synced(self.scope, new)
+
+        # The same documents plus a refiled version of 100 and a new one
+        second = documents([("100", "1", "500", "2021-05-10"),
+                            ("100", "2", "502", "2021-06-01"),
+                            ("101", "1", "501", "2021-05-11"),
+                            ("102", "1", "503", "2021-06-02")])
+        new = self.store.new_documents(self.scope, second)
+        self.assertEqual(list(zip(new["numSequencia"], new["numVersao"], new["sync_status"])),
+                         [("100", "2", "updated"), ("102", "1", "new")])
+        self.store.mark_synced(self.scope, new)
+
+        self.assertTrue(self.store.new_documents(self.scope, second).empty)
+        # Scopes are independent
+        self.assertEqual(len(self.store.new_documents("other", second)), 4)
+
+    def test_documents_without_download_link(self):
+        rows = documents([(np.nan, np.nan, "500", "2021-05-10")])
+        rows["version"] = "1"
+        self.store.mark_synced(self.scope, rows)
+
+        self.assertTrue(self.store.new_documents(self.scope, rows).empty)
+        rows["version"] = "2"
+        self.assertEqual(list(self.store.new_documents(self.scope, rows)["sync_status"]), ["updated"])
+
+    def test_watermark(self):
+        self.assertIsNone(self.store.get_watermark(self.scope))
+        self.store.set_watermark(self.scope, "2021-06-02 10:30")
+        self.assertEqual(self.store.get_watermark(self.scope), datetime(2021, 6, 2, 10, 30))
+
+        self.store.reset(self.scope)
+        self.assertIsNone(self.store.get_watermark(self.scope))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,329 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from brfinance.throttling import (
+    ConcurrencyLimiter, HostLimits, RequestGovernor, SQLiteConcurrencyLimiter, SQLiteTokenBucket, TokenBucket)
+
+
+def free_slots(limiter):
+    # Takes every free slot without waiting, and gives them back
+    slots = 0
+    while slots < limiter.max_in_flight:
+        with limiter._lock:
+            if limiter._in_flight >= limiter.max_in_flight or limiter._waiters:
+                break
+            limiter._in_flight += 1
+        slots += 1
+    for _ in range(slots):
+        limiter.release()
+    return slots
+
+
+class ConcurrencyLimiterTest(unittest.TestCase):
+
+    def test_threads_and_tasks_share_the_queue(self):
+        limiter = ConcurrencyLimiter(2)
+        order = []
+        in_flight = []
+        current = [0]
+        lock = threading.Lock()
+
+        def enter(name):
+            with lock:
+                current[0] += 1
+                in_flight.append(current[0])
+                order.append(name)
+
+        def leave():
+            with lock:
+                current[0] -= 1
+            limiter.release()
+
+        def thread_worker(name):
+            limiter.acquire()
+            enter(name)
+            time.sleep(0.01)
+            leave()
+
+        async def task_worker(name):
+            await limiter.acquire_async()
+            enter(name)
+            await asyncio.sleep(0.01)
+            leave()
+
+        async def tasks():
+            await asyncio.gather(*[task_worker(f"task {index}") for index in range(10)])
+
+        threads = [threading.Thread(target=thread_worker, args=(f"thread {index}",)) for index in range(10)]
+        threads.append(threading.Thread(target=asyncio.run, args=(tasks(),)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(order), 20)
+        self.assertLessEqual(max(in_flight), 2)
+        self.assertEqual(free_slots(limiter), 2)
+
+    def test_fifo_across_threads_and_tasks(self):
+        limiter = ConcurrencyLimiter(1)
+        limiter.acquire()
+        order = []
+
+        async def task():
+            await limiter.acquire_async()
+            order.append("task")
+            limiter.release()
+
+        def thread_worker():
+            limiter.acquire()
+            order.append("thread")
+            limiter.release()
+
+        task_thread = threading.Thread(target=asyncio.run, args=(task(),))
+        task_thread.start()
+        while not limiter._waiters:
+            time.sleep(0.001)
+        worker = threading.Thread(target=thread_worker)
+        worker.start()
+        while len(limiter._waiters) < 2:
+            time.sleep(0.001)
+
+        limiter.release()
+        task_thread.join(5)
+        worker.join(5)
+
+        self.assertEqual(order, ["task", "thread"])
+        self.assertEqual(free_slots(limiter), 1)
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        limiter = ConcurrencyLimiter(1)
+
+        async def main():
+            await limiter.acquire_async()
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.assertEqual(len(limiter._waiters), 0)
+            limiter.release()
+
+        asyncio.run(main())
+        self.assertEqual(free_slots(limiter), 1)
+
+    def test_cancelled_before_the_handoff(self):
+        limiter = ConcurrencyLimiter(1)
+
+        async def main():
+            await limiter.acquire_async()
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            # The slot is handed to the waiter, which is cancelled before
+            # the hand over runs on the loop
+            limiter.release()
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+        self.assertEqual(free_slots(limiter), 1)
+
+    def test_cancelled_after_the_handoff(self):
+        limiter = ConcurrencyLimiter(1)
+
+        async def main():
+            await limiter.acquire_async()
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            limiter.release()
+            # The hand over runs and the waiter owns the slot, but is
+            # cancelled before it resumes
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(main())
+        self.assertEqual(free_slots(limiter), 1)
+
+    def test_slot_handed_from_a_thread_to_a_task(self):
+        limiter = ConcurrencyLimiter(1)
+        limiter.acquire()
+
+        async def main():
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0)
+            await asyncio.get_running_loop().run_in_executor(None, limiter.release)
+            await asyncio.wait_for(waiter, 5)
+            limiter.release()
+
+        asyncio.run(main())
+        self.assertEqual(free_slots(limiter), 1)
+
+
+def limited_request(path):
+    # Runs in a separate process: three requests through limiters shared
+    # with the other processes. Returns when each one started and ended.
+    bucket = SQLiteTokenBucket(path, "host", rate=20, capacity=1)
+    concurrency = SQLiteConcurrencyLimiter(path, "host", 1, poll_interval=0.005)
+    intervals = []
+    for _ in range(3):
+        concurrency.acquire()
+        bucket.acquire()
+        start = time.time()
+        time.sleep(0.02)
+        intervals.append((start, time.time()))
+        concurrency.release()
+    return intervals
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([bucket._reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket._reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket._reserve(), 0.2, delta=0.01)
+
+    def test_acquire_waits_for_the_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_acquire_async_waits_for_the_rate(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+
+        async def main():
+            start = time.monotonic()
+            await asyncio.gather(*[bucket.acquire_async() for _ in range(6)])
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.09)
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(rate=100, capacity=2)
+        time.sleep(0.05)
+        self.assertEqual([bucket._reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(bucket._reserve(), 0)
+
+
+class SQLiteLimitersTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "limits.sqlite")
+
+    def test_buckets_share_the_tokens(self):
+        first = SQLiteTokenBucket(self.path, "host", rate=10, capacity=2)
+        second = SQLiteTokenBucket(self.path, "host", rate=10, capacity=2)
+        other = SQLiteTokenBucket(self.path, "other host", rate=10, capacity=2)
+
+        self.assertEqual(first._reserve(), 0.0)
+        self.assertEqual(second._reserve(), 0.0)
+        self.assertAlmostEqual(first._reserve(), 0.1, delta=0.01)
+        self.assertEqual(other._reserve(), 0.0)
+
+    def test_limiters_share_the_slots(self):
+        first = SQLiteConcurrencyLimiter(self.path, "host", 1)
+        second = SQLiteConcurrencyLimiter(self.path, "host", 1)
+
+        self.assertTrue(first._try_acquire())
+        self.assertFalse(second._try_acquire())
+        first.release()
+        self.assertTrue(second._try_acquire())
+        second.release()
+
+    def test_expired_leases_are_dropped(self):
+        first = SQLiteConcurrencyLimiter(self.path, "host", 1, lease_timeout=0.01)
+        second = SQLiteConcurrencyLimiter(self.path, "host", 1)
+
+        self.assertTrue(first._try_acquire())
+        time.sleep(0.02)
+        self.assertTrue(second._try_acquire())
+
+    def test_async_queries_run_off_the_event_loop(self):
+        governor = RequestGovernor(
+            host_limits={"host": HostLimits(rate=10, max_in_flight=1)}, state_path=self.path)
+        bucket, concurrency = governor._limiters_for("host")
+        threads = []
+
+        def recorded(function):
+            def wrapper(*args):
+                threads.append(threading.get_ident())
+                return function(*args)
+            return wrapper
+
+        bucket._reserve = recorded(bucket._reserve)
+        concurrency._try_acquire = recorded(concurrency._try_acquire)
+        concurrency.release = recorded(concurrency.release)
+
+        async def main():
+            async with governor.limit_async("host"):
+                pass
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(main())
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_cancelled_acquire_gives_the_lease_back(self):
+        limiter = SQLiteConcurrencyLimiter(self.path, "host", 1)
+        other = SQLiteConcurrencyLimiter(self.path, "host", 1)
+        started = threading.Event()
+        proceed = threading.Event()
+        acquired = []
+        try_acquire = limiter._try_acquire
+
+        def slow_try_acquire():
+            started.set()
+            proceed.wait(5)
+            acquired.append(try_acquire())
+            return acquired[-1]
+
+        limiter._try_acquire = slow_try_acquire
+
+        async def main():
+            waiter = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            # The query finishes after the cancellation and takes the lease
+            proceed.set()
+            for _ in range(100):
+                if acquired and not limiter._leases:
+                    break
+                await asyncio.sleep(0.01)
+
+        asyncio.run(main())
+        self.assertEqual(acquired, [True])
+        self.assertTrue(other._try_acquire())
+
+    def test_limits_across_processes(self):
+        SQLiteTokenBucket(self.path, "host", rate=20, capacity=1)
+        SQLiteConcurrencyLimiter(self.path, "host", 1)
+
+        with multiprocessing.get_context("spawn").Pool(3) as pool:
+            results = pool.map(limited_request, [self.path] * 3)
+
+        intervals = sorted(interval for result in results for interval in result)
+        self.assertEqual(len(intervals), 9)
+        for (start, end), (next_start, _) in zip(intervals, intervals[1:]):
+            # One request in flight at a time
+            self.assertLessEqual(end, next_start)
+        # 20 requests per second, with a burst of one
+        self.assertGreaterEqual(intervals[-1][0] - intervals[0][0], 8 / 20 - 0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()